@@ -0,0 +1,85 @@
+#!/usr/bin/env python2
+
+# This script is meant to be executed from the root directory of the project
+#  as `./dev/benchmark_history.py [ROWS [ROWS ...]]`
+# It measures how many history rows per second can be inserted in a single
+#  group, like when pasting or deleting a large subtree, both trimming the
+#  history after every row and only once per group; the history is
+#  pre-populated with as many groups as the default soft limit
+
+import sys
+import os.path
+import imp
+import sqlite3
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src',
+                                                                'outspline')
+SIZES = (100, 1000, 10000)
+# The default limits in the History section of the core configuration
+LIMITS = (60, 15, 120)
+OLD_GROUPS = 60
+OLD_GROUP_ROWS = 100
+
+core = imp.load_source('core_queries', os.path.join(SRC, 'core',
+                                                                'queries.py'))
+
+
+def populate():
+    conn = sqlite3.connect(':memory:')
+    cur = conn.cursor()
+
+    cur.execute(core.history_create)
+    cur.execute(core.history_create_index_group)
+    cur.execute(core.history_create_index_status)
+
+    for group in xrange(1, OLD_GROUPS + 1):
+        cur.executemany(core.history_insert, ((group, id_, 'insert',
+                        'Insert item', '[0,0,"Item"]', '[0,"Item"]')
+                        for id_ in xrange(OLD_GROUP_ROWS)))
+
+    conn.commit()
+    return conn
+
+
+def insert_trim_row(cur, group, rows):
+    for id_ in xrange(rows):
+        cur.execute(core.history_insert, (group, id_, 'delete',
+                                'Delete subtree', '[0,"Item"]', '[0,0,"Item"]'))
+        cur.execute(core.history_delete_union, LIMITS)
+
+
+def insert_trim_group(cur, group, rows):
+    for id_ in xrange(rows):
+        cur.execute(core.history_insert, (group, id_, 'delete',
+                                'Delete subtree', '[0,"Item"]', '[0,0,"Item"]'))
+
+    cur.execute(core.history_delete_union, LIMITS)
+
+
+def measure(insert, rows):
+    conn = populate()
+    cur = conn.cursor()
+
+    start = time.time()
+    insert(cur, OLD_GROUPS + 1, rows)
+    elapsed = time.time() - start
+
+    conn.close()
+    return rows / elapsed
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+
+    print('History rows inserted per second in a single group')
+    print('{:>10}{:>18}{:>18}'.format('Rows', 'Trim per row',
+                                                            'Trim per group'))
+
+    for size in sizes:
+        print('{:>10}{:>18.0f}{:>18.0f}'.format(size,
+                                        measure(insert_trim_row, size),
+                                        measure(insert_trim_group, size)))
+
+if __name__ == '__main__':
+    main()
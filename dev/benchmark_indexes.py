@@ -0,0 +1,130 @@
+#!/usr/bin/env python2
+
+# This script is meant to be executed from the root directory of the project
+#  as `./dev/benchmark_indexes.py [SIZE [SIZE ...]]`
+# It measures the average time of the lookup queries that are filtered on
+#  non-primary-key columns, both on tables with and without the indexes
+#  created by core and the extensions; with the indexes, the lookup cost
+#  should stay flat while the number of items grows
+
+import sys
+import os.path
+import imp
+import sqlite3
+import random
+import timeit
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src',
+                                                                'outspline')
+SIZES = (1000, 10000, 50000, 200000)
+LOOKUPS = 200
+
+
+def load_queries(name, path):
+    # Load the queries modules directly, they do not import anything, and
+    #  this way the benchmark does not need to start Outspline
+    return imp.load_source(name, os.path.join(SRC, *path))
+
+
+core = load_queries('core_queries', ('core', 'queries.py'))
+alarms = load_queries('alarms_queries', ('extensions', 'organism_alarms',
+                                                                'queries.py'))
+links = load_queries('links_queries', ('extensions', 'links', 'queries.py'))
+
+INDEXES = (core.items_create_index_parent,
+           core.items_create_index_previous,
+           core.history_create_index_group,
+           core.history_create_index_status,
+           alarms.alarms_create_index_item,
+           links.links_create_index_id,
+           links.links_create_index_target)
+
+# (label, query, function returning the parameters for a random lookup)
+LOOKUP_QUERIES = (
+    ('Items I_previous', 'SELECT I_id FROM Items WHERE I_previous=? LIMIT 1',
+                                            lambda size: (rand_id(size), )),
+    ('Items I_parent', 'SELECT I_id FROM Items WHERE I_parent=?',
+                                            lambda size: (rand_id(size), )),
+    ('Items I_parent+I_previous', 'SELECT I_id FROM Items WHERE I_parent=? '
+                                                'AND I_previous=? LIMIT 1',
+                                            lambda size: (rand_id(size), 0)),
+    ('History H_group', 'SELECT H_id, H_item, H_type, H_undo FROM History '
+                                        'WHERE H_group=? ORDER BY H_id DESC',
+                                            lambda size: (rand_id(size), )),
+    ('History H_status', core.history_select_status_undo,
+                                            lambda size: ()),
+    ('Alarms A_item', alarms.alarms_select_item,
+                                            lambda size: (rand_id(size), )),
+    ('Links L_id', links.links_select_id, lambda size: (rand_id(size), )),
+    ('Links L_target', links.links_select_target,
+                                            lambda size: (rand_id(size), )),
+)
+
+
+def rand_id(size):
+    return random.randint(1, size)
+
+
+def populate(size, indexed):
+    conn = sqlite3.connect(':memory:')
+    cur = conn.cursor()
+
+    cur.execute(core.items_create)
+    cur.execute(core.history_create)
+    cur.execute(alarms.alarms_create)
+    cur.execute(links.links_create)
+
+    if indexed:
+        for query in INDEXES:
+            cur.execute(query)
+
+    # Build a tree where every item has up to 10 children
+    cur.executemany(core.items_insert, ((id_, (id_ - 1) // 10,
+                    id_ - 1 if (id_ - 1) % 10 else 0, 'Item {}'.format(id_))
+                    for id_ in xrange(1, size + 1)))
+    cur.executemany('INSERT INTO History (H_id, H_group, H_status, H_item, '
+                    'H_type, H_tstamp, H_description, H_redo, H_undo) '
+                    'VALUES (NULL, ?, 5, ?, "insert", 0, "", "", "")',
+                    ((id_, id_) for id_ in xrange(1, size + 1)))
+    cur.executemany(alarms.alarms_insert, ((id_, 0, None, 0, None)
+                    for id_ in xrange(1, size + 1, 10)))
+    cur.executemany(links.links_insert, ((id_, rand_id(size))
+                    for id_ in xrange(1, size + 1, 10)))
+
+    conn.commit()
+    return conn
+
+
+def measure(conn, query, make_params, size):
+    params = [make_params(size) for n in xrange(LOOKUPS)]
+    cur = conn.cursor()
+
+    def run():
+        for p in params:
+            cur.execute(query, p).fetchall()
+
+    return min(timeit.repeat(run, repeat=3, number=1)) / LOOKUPS * 1e6
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+    random.seed(0)
+
+    print('Average lookup time in microseconds')
+    print('{:<28}{:>10}{:>14}{:>14}'.format('Query', 'Items', 'No index',
+                                                                'Indexed'))
+
+    for size in sizes:
+        plain = populate(size, False)
+        indexed = populate(size, True)
+
+        for label, query, make_params in LOOKUP_QUERIES:
+            print('{:<28}{:>10}{:>14.1f}{:>14.1f}'.format(label, size,
+                                measure(plain, query, make_params, size),
+                                measure(indexed, query, make_params, size)))
+
+        plain.close()
+        indexed.close()
+
+if __name__ == '__main__':
+    main()
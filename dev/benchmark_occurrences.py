@@ -0,0 +1,225 @@
+#!/usr/bin/env python2
+
+# This script is meant to be executed from the root directory of the project
+#  as `./dev/benchmark_occurrences.py [OCCURRENCES [OCCURRENCES ...]]`
+# It compares organism's compact OccurrencesTable with the previous
+#  representation, a dictionary for every occurrence stored in
+#  {filename: {id_: [occ, ...]}} lists: it measures the memory used by the
+#  occurrences of a search window, and the time needed to add them, to apply
+#  except rules, to find the next completion time (also again after excepting
+#  one more occurrence) and to list them
+
+import sys
+import os
+import gc
+import time
+import random
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+SIZES = (10000, 100000)
+ITEMS = 100
+# Number of except windows applied to every item
+EXCEPTS = 50
+INTERVAL = 300
+DURATION = 600
+FILENAME = 'benchmark'
+
+items = None
+
+
+class DictOccurrences(object):
+    # The occurrence storage of OccurrencesRange before OccurrencesTable
+    def __init__(self):
+        self.dict_ = {}
+
+    def add(self, occ):
+        filename = occ['filename']
+        id_ = occ['id_']
+
+        try:
+            self.dict_[filename][id_]
+        except KeyError:
+            try:
+                self.dict_[filename]
+            except KeyError:
+                self.dict_[filename] = {}
+
+            self.dict_[filename][id_] = []
+
+        self.dict_[filename][id_].append(occ)
+
+    def except_(self, filename, id_, windows, inclusive):
+        for start, end in windows:
+            try:
+                dc = self.dict_[filename][id_][:]
+            except KeyError:
+                pass
+            else:
+                for o in dc:
+                    if start <= o['start'] <= end or \
+                                (inclusive and o['start'] <= start < o['end']):
+                        self.dict_[filename][id_].remove(o)
+                        if not self.dict_[filename][id_]:
+                            del self.dict_[filename][id_]
+                            if not self.dict_[filename]:
+                                del self.dict_[filename]
+
+    def get_next_completion_time(self):
+        ctime = None
+        for f in self.dict_:
+            for i in self.dict_[f]:
+                for o in self.dict_[f][i]:
+                    t = max((o['end'], o['start'], o['alarm']))
+                    if t and (not ctime or t < ctime):
+                        ctime = t
+        return ctime
+
+    def get_list(self):
+        occsl = []
+        for f in self.dict_:
+            for i in self.dict_[f]:
+                for o in self.dict_[f][i]:
+                    occsl.append(o)
+        return occsl
+
+
+def import_organism():
+    global items
+
+    sys.path.insert(0, SRC)
+
+    # The organism modules read the configuration when imported
+    from outspline.coreaux import configuration
+    configuration.load_components_info()
+    configuration.load_default_config()
+
+    import outspline.extensions.organism.items as items
+
+
+def get_size(obj, seen):
+    # Approximate the memory used by obj and all the objects it refers to,
+    #  counting every object only once
+    if id(obj) in seen:
+        return 0
+
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+
+    if isinstance(obj, dict):
+        for key, value in obj.iteritems():
+            size += get_size(key, seen) + get_size(value, seen)
+    elif isinstance(obj, (list, tuple, set)):
+        for value in obj:
+            size += get_size(value, seen)
+    elif hasattr(obj, '__slots__'):
+        for name in obj.__slots__:
+            size += get_size(getattr(obj, name), seen)
+    elif hasattr(obj, '__dict__'):
+        size += get_size(obj.__dict__, seen)
+
+    return size
+
+
+def make_columns(size):
+    # Every item gets the same number of consecutive occurrences, with
+    #  overlapping durations and an alarm before every start time
+    columns = []
+    now = int(time.time())
+
+    for id_ in xrange(ITEMS):
+        starts = [now + k * INTERVAL for k in xrange(size // ITEMS)]
+        ends = [start + DURATION for start in starts]
+        alarms = [start - INTERVAL for start in starts]
+        columns.append((id_, starts, ends, alarms))
+
+    return columns
+
+
+def make_windows(columns):
+    rnd = random.Random(0)
+    windows = {}
+
+    for id_, starts, ends, alarms in columns:
+        windows[id_] = [(start, start + DURATION) for start in
+                                    rnd.sample(starts, min((EXCEPTS,
+                                                            len(starts))))]
+
+    return windows
+
+
+def fill_dicts(columns):
+    occs = DictOccurrences()
+
+    for id_, starts, ends, alarms in columns:
+        for start, end, alarm in zip(starts, ends, alarms):
+            occs.add({'filename': FILENAME,
+                      'id_': id_,
+                      'start': start,
+                      'end': end,
+                      'alarm': alarm})
+
+    return occs
+
+
+def fill_table(columns):
+    occs = items.OccurrencesTable()
+
+    for id_, starts, ends, alarms in columns:
+        occs.extend(FILENAME, id_, starts, ends, alarms)
+
+    return occs
+
+
+def measure(function, *args):
+    gc.collect()
+    start = time.time()
+    result = function(*args)
+    return (time.time() - start, result)
+
+
+def except_all(occs, windows):
+    for id_, iwindows in windows.iteritems():
+        occs.except_(FILENAME, id_, iwindows, True)
+
+
+def run(size):
+    columns = make_columns(size)
+    windows = make_windows(columns)
+    results = []
+
+    for name, fill in (('dicts', fill_dicts), ('table', fill_table)):
+        tfill, occs = measure(fill, columns)
+        memory = get_size(occs, set())
+        texcept = measure(except_all, occs, windows)[0]
+        tnext, ctime = measure(occs.get_next_completion_time)
+        id_, starts, ends, alarms = columns[-1]
+        occs.except_(FILENAME, id_, ((starts[-1], starts[-1]), ), False)
+        tagain, ctime = measure(occs.get_next_completion_time)
+        tlist, occsl = measure(occs.get_list)
+        results.append((name, memory, tfill, texcept, tnext, tagain, tlist,
+                                                                len(occsl)))
+
+    return results
+
+
+def main():
+    import_organism()
+    sizes = [int(arg) for arg in sys.argv[1:]] or SIZES
+
+    print('Occurrences of {} items, {} except windows per item'.format(ITEMS,
+                                                                    EXCEPTS))
+    print('{:>10}{:>8}{:>12}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}'.format(
+                    'Size', 'Store', 'Memory KiB', 'Add s', 'Except s',
+                    'Next s', 'Again s', 'List s', 'Left'))
+
+    for size in sizes:
+        for name, memory, tfill, texcept, tnext, tagain, tlist, left in run(
+                                                                        size):
+            print('{:>10}{:>8}{:>12.0f}{:>10.4f}{:>10.4f}{:>10.4f}{:>10.4f}'
+                            '{:>10.4f}{:>10}'.format(size, name,
+                            memory / 1024.0, tfill, texcept, tnext, tagain,
+                            tlist, left))
+
+
+if __name__ == '__main__':
+    main()
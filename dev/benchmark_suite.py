@@ -0,0 +1,465 @@
+#!/usr/bin/env python2
+
+# This script is meant to be executed from the root directory of the project
+#  as `./dev/benchmark_suite.py [OPTIONS] [SIZE [SIZE ...]]`, see --help
+# It starts Outspline without any interface or plugin, generates synthetic
+#  databases with the requested number of items, tree depth, rules and alarms,
+#  and times the main operations through core_api and the extension APIs
+# The results are printed as JSON, so that the runs of different revisions can
+#  be saved and compared with --compare
+# Every operation is timed while the databases are blocked, like the
+#  interfaces do, so that the searches that the timer extension starts in its
+#  own threads never overlap with a measurement
+
+import sys
+import os
+import time
+import json
+import random
+import shutil
+import sqlite3
+import tempfile
+import platform
+import argparse
+import threading
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+SIZES = (1000, 10000)
+DAY = 86400
+# How far back in time the old alarms are searched when reopening a database
+ALARMS_SPAN = 30 * DAY
+# Number of single-item operations (insert, move, undo, redo) timed per size
+OPERATIONS = 200
+
+core_api = None
+organism_api = None
+organism_timer_api = None
+organism_alarms_api = None
+organism_basicrules_api = None
+copypaste_api = None
+
+
+class CLIArgs(object):
+    # Mimic the object returned by coreaux.cliargparse.parse_cli_args
+    def __init__(self, tempdir):
+        self.configfile = os.path.join(tempdir, 'outspline.conf')
+        self.logfile = os.path.join(tempdir, 'outspline.log')
+        self.loglevel = '00'
+        self.updonly = False
+
+
+def start_outspline(tempdir):
+    sys.path.insert(0, SRC)
+
+    from outspline.coreaux import configuration
+    from outspline.coreaux import logger
+
+    configuration.load_components_info()
+    configuration.load_default_config()
+
+    cliargs = CLIArgs(tempdir)
+    configuration.set_configuration_file(cliargs)
+    configuration.set_update_only(cliargs)
+
+    # Only load core and the extensions, without reading or writing any user
+    #  configuration file
+    for type_ in ('Interfaces', 'Plugins'):
+        for addon in configuration.config(type_).get_sections():
+            configuration.config(type_)(addon)['enabled'] = 'off'
+
+    logger.set_logger(cliargs)
+
+    import outspline.core
+    outspline.core.main()
+
+    import outspline.coreaux.addons
+    outspline.coreaux.addons.start_addons()
+
+    global core_api, organism_api, organism_timer_api, organism_alarms_api, \
+                                    organism_basicrules_api, copypaste_api
+    import outspline.core_api as core_api
+    import outspline.extensions.organism_api as organism_api
+    import outspline.extensions.organism_timer_api as organism_timer_api
+    import outspline.extensions.organism_alarms_api as organism_alarms_api
+    import outspline.extensions.organism_basicrules_api as \
+                                                    organism_basicrules_api
+    import outspline.extensions.copypaste_api as copypaste_api
+
+
+class Timer(object):
+    def __init__(self, size):
+        self.size = size
+        self.results = []
+
+    def measure(self, operation, function, *args, **kwargs):
+        # Like the interfaces, block the databases for the whole operation;
+        #  this also waits for any search started by the previous operation
+        core_api.block_databases(block=True)
+
+        start = time.time()
+        clock = time.clock()
+        count = function(*args, **kwargs)
+        elapsed = (time.time() - start, time.clock() - clock)
+
+        core_api.release_databases()
+
+        self.results.append({
+            'items': self.size,
+            'operation': operation,
+            'time': round(elapsed[0], 6),
+            'clock': round(elapsed[1], 6),
+            'count': count,
+        })
+
+        return count
+
+
+def open_database(filename):
+    # Like the interfaces, never open or close a database while a search of
+    #  the timer extension may be running
+    core_api.block_databases(block=True)
+    core_api.open_database(filename)
+    core_api.release_databases()
+
+
+def close_database(filename):
+    core_api.block_databases(block=True)
+    core_api.close_database(filename)
+    core_api.release_databases()
+
+
+def make_rules(now, alarms):
+    # Return the rules of an item, choosing a random mix of the basic rules
+    brapi = organism_basicrules_api
+    start = now + random.randint(-ALARMS_SPAN, ALARMS_SPAN)
+    refstart = now - random.randint(0, ALARMS_SPAN)
+    # The alarms are 10 minutes before the start of the occurrences
+    alarm = -600 if random.random() < alarms else None
+    hour = random.randint(0, 23)
+    minute = random.choice((0, 15, 30, 45))
+    kind = random.randint(0, 5)
+
+    if kind == 0:
+        rules = [brapi.make_occur_once_rule_UTC(start, start + 3600,
+                        start + alarm if alarm is not None else None, None)]
+    elif kind == 1:
+        rules = [brapi.make_occur_regularly_rule_local(refstart,
+                        random.choice((DAY, 7 * DAY)), 3600, alarm, None)]
+    elif kind == 2:
+        rules = [brapi.make_occur_regularly_group_rule_local(refstart,
+                        7 * DAY, [0, 2 * DAY, 4 * DAY], 3600, alarm, None)]
+    elif kind == 3:
+        rules = [brapi.make_occur_monthly_number_direct_rule_local(
+                        range(1, 13), random.randint(1, 28), hour, minute,
+                        3600, alarm, None)]
+    elif kind == 4:
+        rules = [brapi.make_occur_yearly_rule_local(1,
+                        time.localtime(now).tm_year, random.randint(1, 12),
+                        random.randint(1, 28), hour, minute, 3600, alarm,
+                        None)]
+    else:
+        rules = [brapi.make_occur_regularly_rule_UTC(refstart, DAY, 1800,
+                        alarm, None)]
+
+    # Add some exceptions to the occurrence rules
+    if random.random() < 0.1:
+        rules.append(brapi.make_except_once_rule_UTC(start, start + DAY,
+                                                            False, None))
+
+    if random.random() < 0.1:
+        rules.append(brapi.make_except_regularly_rule_local(refstart,
+                                                7 * DAY, DAY, True, None))
+
+    return rules
+
+
+def generate(filename, size, depth, rules, alarms):
+    now = int(time.time())
+    core_api.create_database(filename)
+    open_database(filename)
+
+    # Build the whole tree in memory, then insert it at once
+    depths = {}
+    parents = [None]
+    irows = []
+
+    for key in xrange(1, size + 1):
+        parent = random.choice(parents)
+        depths[key] = depths[parent] + 1 if parent else 1
+        irows.append((key, parent, 'Item {}\nGenerated item'.format(key)))
+
+        if depths[key] < depth:
+            parents.append(key)
+
+    core_api.block_databases(block=True)
+
+    group = core_api.get_next_history_group(filename)
+    ids = core_api.append_items(filename, 0, irows, group=group,
+                                                    description='Generate')
+
+    for key in xrange(1, size + 1):
+        if random.random() < rules:
+            organism_api.update_item_rules(filename, ids[key],
+                                    make_rules(now, alarms), group=group,
+                                    description='Generate')
+
+    core_api.save_database(filename)
+    core_api.release_databases()
+    close_database(filename)
+
+
+def walk_tree(filename):
+    count = 0
+    stack = list(core_api.get_root_items(filename))
+
+    while stack:
+        id_ = stack.pop()
+        core_api.get_item_text(filename, id_)
+        stack.extend(core_api.get_item_children(filename, id_))
+        count += 1
+
+    return count
+
+
+def insert_items(filename, parents, ids):
+    for parent in parents:
+        ids.append(core_api.create_child(filename, parent, text='Inserted',
+                                            description='Benchmark insert'))
+
+    return len(ids)
+
+
+def move_items(filename, ids):
+    count = 0
+
+    for id_ in ids:
+        if core_api.move_item_up(filename, id_,
+                                            description='Benchmark move'):
+            count += 1
+
+    return count
+
+
+def repeat(function, filename, times):
+    for n in xrange(times):
+        function(filename)
+
+    return times
+
+
+def paste_items(filename, ids):
+    copypaste_api.copy_items(filename, ids)
+    return len(copypaste_api.paste_items_as_children(filename, 0)[1])
+
+
+def delete_items(filename, ids):
+    for id_ in ids:
+        core_api.delete_subtree(filename, id_,
+                                            description='Benchmark delete')
+
+    return len(ids)
+
+
+def search_range(filename, mint, maxt):
+    search = organism_api.get_occurrences_range(mint=mint, maxt=maxt,
+                                                    filenames=(filename, ))
+    search.start()
+    return len(search.get_results().get_list())
+
+
+def search_next(filename, base_time):
+    search = organism_timer_api.get_next_occurrences(base_time=base_time,
+                                                    filenames=(filename, ))
+    search.start()
+    # Count the items that have occurrences at the next occurrence time
+    return len(search.get_results().get_dict().get(filename, {}))
+
+
+def save(filename):
+    core_api.save_database(filename)
+
+
+def save_copy(filename, destination):
+    # Like the interfaces, the destination must be created first
+    core_api.create_database(destination)
+    core_api.save_database_copy(filename, destination)
+
+
+def open_with_old_alarms(filename, timer):
+    # Move the last search time of the timer back, so that reopening the
+    #  database activates the alarms of the last ALARMS_SPAN seconds
+    conn = sqlite3.connect(filename)
+    conn.execute('UPDATE TimerProperties SET TP_last_search=?',
+                                        (int(time.time()) - ALARMS_SPAN, ))
+    conn.commit()
+    conn.close()
+
+    # The old alarms are activated in a separate thread after opening the
+    #  database
+    done = threading.Event()
+
+    def handle_end(kwargs):
+        done.set()
+
+    organism_alarms_api.bind_to_activate_alarms_range_end(handle_end)
+
+    start = time.time()
+    open_database(filename)
+    done.wait()
+    elapsed = time.time() - start
+
+    organism_alarms_api.bind_to_activate_alarms_range_end(handle_end, False)
+
+    timer.results.append({
+        'items': timer.size,
+        'operation': 'open_old_alarms',
+        'time': round(elapsed, 6),
+        'clock': None,
+        'count': organism_alarms_api.get_number_of_active_alarms(),
+    })
+
+
+def run(tempdir, size, options):
+    filename = os.path.join(tempdir, 'benchmark_{}.osl'.format(size))
+    timer = Timer(size)
+    now = int(time.time())
+
+    start = time.time()
+    generate(filename, size, options.depth, options.rules, options.alarms)
+    timer.results.append({'items': size, 'operation': 'generate',
+                    'time': round(time.time() - start, 6), 'clock': None,
+                    'count': size})
+
+    start = time.time()
+    open_database(filename)
+    timer.results.append({'items': size, 'operation': 'open',
+                    'time': round(time.time() - start, 6), 'clock': None,
+                    'count': size})
+
+    timer.measure('tree_walk', walk_tree, filename)
+
+    ids = [row['I_id'] for row in core_api.get_all_items_text(filename)]
+    parents = [random.choice(ids) for n in xrange(OPERATIONS)]
+    new = []
+    timer.measure('insert', insert_items, filename, parents, new)
+    timer.measure('move', move_items, filename, new)
+    timer.measure('undo', repeat, core_api.undo_tree, filename, OPERATIONS)
+    timer.measure('redo', repeat, core_api.redo_tree, filename, OPERATIONS)
+
+    # Copy the largest root subtree
+    roots = core_api.get_root_items(filename)
+    subtrees = [[root] + core_api.get_item_descendants(filename, root)
+                                                            for root in roots]
+    subtree = max(subtrees, key=len)
+    timer.measure('paste', paste_items, filename, subtree)
+    timer.measure('undo_paste', repeat, core_api.undo_tree, filename, 1)
+    timer.measure('redo_paste', repeat, core_api.redo_tree, filename, 1)
+
+    pasted = [root for root in core_api.get_root_items(filename)
+                                                        if root not in roots]
+    timer.measure('delete', delete_items, filename, pasted)
+
+    timer.measure('range_search_week', search_range, filename, now,
+                                                                now + 7 * DAY)
+    timer.measure('range_search_year', search_range, filename, now,
+                                                            now + 365 * DAY)
+    timer.measure('next_search', search_next, filename, now)
+
+    timer.measure('save', save, filename)
+    timer.measure('save_copy', save_copy, filename, filename + '.copy')
+
+    close_database(filename)
+    open_with_old_alarms(filename, timer)
+    close_database(filename)
+
+    return timer.results
+
+
+def compare(results, oldfile):
+    with open(oldfile) as f:
+        old = json.load(f)
+
+    oldtimes = {(r['items'], r['operation']): r['time']
+                                                    for r in old['results']}
+
+    sys.stderr.write('{:>10}{:>20}{:>12}{:>12}{:>10}\n'.format('Items',
+                                        'Operation', 'Old', 'New', 'Ratio'))
+
+    for r in results:
+        try:
+            oldtime = oldtimes[(r['items'], r['operation'])]
+        except KeyError:
+            continue
+
+        sys.stderr.write('{:>10}{:>20}{:>12.4f}{:>12.4f}{:>10.2f}\n'.format(
+                    r['items'], r['operation'], oldtime, r['time'],
+                    r['time'] / oldtime if oldtime else float('inf')))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Time the main operations '
+                            'of Outspline on synthetic databases, without '
+                            'any interface.')
+    parser.add_argument('sizes', metavar='SIZE', type=int, nargs='*',
+                            default=SIZES, help='number of generated items')
+    parser.add_argument('--depth', type=int, default=8,
+                            help='maximum depth of the generated trees')
+    parser.add_argument('--rules', type=float, default=0.3,
+                            help='fraction of the items that have rules')
+    parser.add_argument('--alarms', type=float, default=0.5,
+                            help='fraction of the rules that have alarms')
+    parser.add_argument('--seed', type=int, default=0,
+                            help='seed of the random generator')
+    parser.add_argument('--output', metavar='FILE',
+                            help='write the results to FILE instead of the '
+                            'standard output')
+    parser.add_argument('--compare', metavar='FILE',
+                            help='print the ratios with the results saved in '
+                            'FILE by a previous run to the standard error')
+    return parser.parse_args()
+
+
+def main():
+    options = parse_args()
+    random.seed(options.seed)
+    tempdir = tempfile.mkdtemp(prefix='outspline_benchmark_')
+
+    try:
+        start_outspline(tempdir)
+        results = []
+
+        for size in options.sizes:
+            results.extend(run(tempdir, size, options))
+
+        core_api.exit_()
+    finally:
+        shutil.rmtree(tempdir)
+
+    report = {
+        'environment': {
+            'python': platform.python_version(),
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'time': int(time.time()),
+        },
+        'options': {
+            'depth': options.depth,
+            'rules': options.rules,
+            'alarms': options.alarms,
+            'seed': options.seed,
+        },
+        'results': results,
+    }
+
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if options.compare:
+        compare(results, options.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python2
+
+# This script is meant to be executed from the root directory of the project
+#  as `./dev/benchmark_timealloc.py [DAYS [DAYS ...]]`
+# It compares wxtasklist's TimeAllocation, which finds the gaps and
+#  overlappings of the occurrences by sweeping their sorted start and end
+#  times, with the previous implementation, which stored the occupied minutes
+#  of the search interval in bit arrays: it measures the time needed to add
+#  the occurrences and to find the gaps and overlappings for search intervals
+#  of the given lengths in days, and checks that the results are the same
+
+import sys
+import os.path
+import imp
+import string
+import random
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src',
+                                                                'outspline')
+DAYS = (1, 30, 180, 365)
+# Number of occurrences per day
+DENSITY = 20
+MAXDURATION = 180 * 60
+
+
+def load_timealloc():
+    # Load the module directly, it does not import wx, and this way the
+    #  benchmark does not need to start the interface
+    return imp.load_source('timealloc', os.path.join(SRC, 'plugins',
+                                                'wxtasklist', 'timealloc.py'))
+
+
+timealloc = load_timealloc()
+
+
+class BitmapTimeAllocation(object):
+    # The implementation of TimeAllocation before the sweep line
+    def __init__(self, min_time, max_time, occview, refengine):
+        self.min_time = min_time
+        self.max_time = max_time
+        self.refengine = refengine
+        self.time_allocation = 0
+        self.time_allocation_overlap = 0
+
+    def compute_time_allocation(self, start, end):
+        if start <= self.max_time and end > self.min_time:
+            minr = max((start - self.min_time, 0)) // 60
+            maxr = (min((end, self.max_time + 60)) - self.min_time) // 60
+            interval = maxr - minr
+            occrarr = 2 ** interval - 1
+            occarr = occrarr << minr
+            occoverlap = self.time_allocation & occarr
+            self.time_allocation |= occarr
+            self.time_allocation_overlap |= occoverlap
+
+    def insert_gaps_and_overlappings(self):
+        interval = (self.max_time + 60 - self.min_time) // 60
+
+        gaps = '{:b}'.format(self.time_allocation).zfill(interval
+                                ).translate(string.maketrans("10","01"))[::-1]
+        intervals = []
+        self._find_gaps_or_overlappings(gaps, intervals)
+        self.refengine.insert_gaps(intervals)
+
+        overlappings = '{:b}'.format(self.time_allocation_overlap).zfill(
+                                                                interval)[::-1]
+        intervals = []
+        self._find_gaps_or_overlappings(overlappings, intervals)
+        self.refengine.insert_overlappings(intervals)
+
+    def _find_gaps_or_overlappings(self, bitstring, intervals):
+        maxend = False
+
+        if bitstring[0] == '1':
+            bitstart = 0
+
+            bitend, maxend = self._find_gaps_or_overlappings_continue(
+                                bitstring, bitstart, True, maxend, intervals)
+        else:
+            bitend = 0
+
+        while True:
+            try:
+                bitstart = bitstring.index('01', bitend) + 1
+            except ValueError:
+                break
+            else:
+                bitend, maxend = self._find_gaps_or_overlappings_continue(
+                                bitstring, bitstart, False, maxend, intervals)
+
+    def _find_gaps_or_overlappings_continue(self, bitstring, bitstart,
+                                                minstart, maxend, intervals):
+        try:
+            bitend = bitstring.index('10', bitstart) + 1
+        except ValueError:
+            bitend = len(bitstring)
+            maxend = True
+
+        start = bitstart * 60 + self.min_time
+        end = bitend * 60 + self.min_time
+
+        intervals.append((start, end, minstart, maxend))
+
+        return (bitend, maxend)
+
+
+class OccView(object):
+    def get_gaps_and_overlappings_setting(self):
+        return (True, True)
+
+
+class RefreshEngine(object):
+    def __init__(self):
+        self.gaps = []
+        self.overlappings = []
+
+    def insert_gaps(self, intervals):
+        self.gaps.extend(intervals)
+
+    def insert_overlappings(self, intervals):
+        self.overlappings.extend(intervals)
+
+
+def make_occurrences(min_time, max_time):
+    # Some occurrences start before the interval or end after it, like those
+    #  retrieved because of their alarm times
+    rnd = random.Random(0)
+    occurrences = []
+    days = (max_time + 1 - min_time) // 86400
+
+    for n in xrange(days * DENSITY):
+        start = rnd.randrange(min_time - MAXDURATION, max_time + 1, 60)
+        end = start + rnd.randrange(0, MAXDURATION + 1, 60)
+        occurrences.append((start, end))
+
+    return occurrences
+
+
+def run(cls, min_time, max_time, occurrences):
+    refengine = RefreshEngine()
+    tstart = time.time()
+    timealloc = cls(min_time, max_time, OccView(), refengine)
+
+    for start, end in occurrences:
+        timealloc.compute_time_allocation(start, end)
+
+    tadd = time.time() - tstart
+    tstart = time.time()
+    timealloc.insert_gaps_and_overlappings()
+    tfind = time.time() - tstart
+
+    return (tadd, tfind, refengine.gaps, refengine.overlappings)
+
+
+def main():
+    days = [int(arg) for arg in sys.argv[1:]] or DAYS
+
+    print('{} occurrences per day'.format(DENSITY))
+    print('{:>6}{:>8}{:>8}{:>12}{:>12}{:>12}{:>12}{:>6}'.format('Days',
+                        'Occs', 'Gaps', 'Bitmap add', 'Bitmap find',
+                        'Sweep add', 'Sweep find', 'Same'))
+
+    for ndays in days:
+        min_time = int(time.time()) // 86400 * 86400
+        max_time = min_time + ndays * 86400 - 1
+        occurrences = make_occurrences(min_time, max_time)
+
+        badd, bfind, bgaps, boverlappings = run(BitmapTimeAllocation,
+                                            min_time, max_time, occurrences)
+        sadd, sfind, sgaps, soverlappings = run(timealloc.TimeAllocation,
+                                            min_time, max_time, occurrences)
+
+        print('{:>6}{:>8}{:>8}{:>12.4f}{:>12.4f}{:>12.4f}{:>12.4f}{:>6}'
+                        .format(ndays, len(occurrences), len(sgaps), badd,
+                        bfind, sadd, sfind, str(bgaps == sgaps and
+                        boverlappings == soverlappings)))
+
+
+if __name__ == '__main__':
+    main()
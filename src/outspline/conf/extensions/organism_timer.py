@@ -22,6 +22,7 @@ data = (
     OD((
         ("enabled", "on"),
         ("old_alarms_delay", "250"),
+        ("restart_delay", "100"),
     )),
     OD()
 )
@@ -21,6 +21,7 @@ from collections import OrderedDict as OD
 data = (
     OD((
         ("enabled", "on"),
+        ("text_index", "on"),
     )),
     OD((
         ("GlobalShortcuts", (
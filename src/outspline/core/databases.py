@@ -16,9 +16,11 @@
 # You should have received a copy of the GNU General Public License
 # along with Outspline.  If not, see <http://www.gnu.org/licenses/>.
 
+import sys
 import os
 import errno
 import Queue as queue
+import threading
 import sqlite3
 
 import outspline.info
@@ -35,17 +37,23 @@ protection = None
 memory = None
 
 blocked_databases_event = Event()
+start_opening_databases_event = Event()
+end_opening_databases_event = Event()
 open_database_dirty_event = Event()
 open_database_event = Event()
 closing_database_event = Event()
 close_database_event = Event()
 save_permission_check_event = Event()
 save_database_event = Event()
+save_database_copy_progress_event = Event()
 delete_subtree_event = Event()
 exit_app_event_1 = Event()
 exit_app_event_2 = Event()
 
 dbs = {}
+# The databases loaded in advance by Database.start_opening, and not opened
+# yet: {filename: ((database, dependencies), None) or (None, exc_info)}
+preloaded = {}
 
 
 class Protection(object):
@@ -69,29 +77,134 @@ class Protection(object):
     # Another advantage is that this class makes sure that when a function sets
     #     the history group, it's impossible that another function manages to
     #     set the same group
+    # The databases can be blocked all together and exclusively with
+    #   self.block, or individually: any number of readers can block the same
+    #   database at the same time with self.block_read, while a writer blocks
+    #   it exclusively with self.block_write; this way operations on different
+    #   databases, and reading operations on the same database, are not
+    #   serialized
+    # Threads waiting to block a database for writing, or all the databases,
+    #   prevent new readers from blocking it, so that the writers can't be
+    #   starved by a sequence of readers
     def __init__(self):
-        baton = True
-        self.q = queue.Queue()
-        self.q.put(baton)
+        self.condition = threading.Condition()
+        self.exclusive = False
+        self.waiting_exclusive = 0
+        # {filename: number of readers}
+        self.readers = {}
+        self.writers = set()
+        # {filename: number of waiting writers}
+        self.waiting_writers = {}
 
     def block(self, block=False, quiet=False):
-        try:
-            self.s = self.q.get(block)
-        except queue.Empty:
+        with self.condition:
+            self.waiting_exclusive += 1
+            blocked = self._wait(self._is_free_exclusive, block)
+            self.waiting_exclusive -= 1
+
+            if blocked:
+                self.exclusive = True
+
+        return self._end_block(blocked, quiet, 'Block databases')
+
+    def release(self):
+        log.debug('Release databases')
+
+        with self.condition:
+            self.exclusive = False
+            self.condition.notify_all()
+
+    def block_read(self, filenames, block=False, quiet=False):
+        with self.condition:
+            blocked = self._wait(lambda: self._is_free_read(filenames), block)
+
+            if blocked:
+                for filename in filenames:
+                    try:
+                        self.readers[filename] += 1
+                    except KeyError:
+                        self.readers[filename] = 1
+
+        return self._end_block(blocked, quiet,
+                        'Block databases for reading: {}'.format(filenames))
+
+    def release_read(self, filenames):
+        log.debug('Release databases for reading: {}'.format(filenames))
+
+        with self.condition:
+            for filename in filenames:
+                self.readers[filename] -= 1
+
+                if self.readers[filename] == 0:
+                    del self.readers[filename]
+
+            self.condition.notify_all()
+
+    def block_write(self, filename, block=False, quiet=False):
+        with self.condition:
+            try:
+                self.waiting_writers[filename] += 1
+            except KeyError:
+                self.waiting_writers[filename] = 1
+
+            blocked = self._wait(lambda: self._is_free_write(filename), block)
+            self.waiting_writers[filename] -= 1
+
+            if self.waiting_writers[filename] == 0:
+                del self.waiting_writers[filename]
+
+            if blocked:
+                self.writers.add(filename)
+
+        return self._end_block(blocked, quiet,
+                        'Block database for writing: {}'.format(filename))
+
+    def release_write(self, filename):
+        log.debug('Release database for writing: {}'.format(filename))
+
+        with self.condition:
+            self.writers.remove(filename)
+            self.condition.notify_all()
+
+    def _wait(self, is_free, block):
+        # This must be called while self.condition is acquired
+        if block:
+            while not is_free():
+                self.condition.wait()
+
+            return True
+        else:
+            return is_free()
+
+    def _end_block(self, blocked, quiet, message):
+        # Signal the event only after releasing self.condition, since its
+        # handlers may for example show a modal dialog
+        if blocked:
+            log.debug(message)
+            return True
+        else:
             if not quiet:
                 blocked_databases_event.signal()
 
             return False
-        else:
-            log.debug('Block databases')
-            return True
 
-    def release(self):
-        log.debug('Release databases')
+    def _is_free_exclusive(self):
+        return not self.exclusive and not self.writers and not self.readers
+
+    def _is_free_read(self, filenames):
+        if self.exclusive or self.waiting_exclusive > 0:
+            return False
+
+        for filename in filenames:
+            if filename in self.writers or filename in self.waiting_writers:
+                return False
 
-        self.q.task_done()
-        self.q.join()
-        self.q.put(self.s)
+        return True
+
+    def _is_free_write(self, filename):
+        return not self.exclusive and self.waiting_exclusive == 0 and \
+                                    filename not in self.writers and \
+                                    filename not in self.readers
 
 
 class DBQueue(queue.Queue):
@@ -168,13 +281,46 @@ class FileDB(object):
         self.disconnect()
 
 
+class ReaderDB(object):
+    def __init__(self, database, connection, tables, changes):
+        # A read-only connection to a private in-memory copy of some tables of
+        # a database, see Database.get_reader
+        self.database = database
+        self.connection = connection
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute(queries.pragma_query_only)
+        self.tables = tables
+        # The total_changes of the connection of the database when the copy
+        # was made
+        self.changes = changes
+
+    def cursor(self):
+        return self.connection.cursor()
+
+    def disconnect(self):
+        self.connection.close()
+
+
 class Database(object):
+    # The maximum number of rows that are copied at a time by save_copy and
+    # get_reader
+    COPY_CHUNK = 1000
+    # The number of times that save_copy and get_reader try to copy the
+    # database giving back its connection between the chunks, before holding
+    # the connection for the whole copy
+    COPY_ATTEMPTS = 3
+
     def __init__(self, filename):
         self.connection = DBQueue()
         self.filename = filename
         self.items = {}
+        self.tree = items.Tree()
         self.dbhistory = history.DBHistory(self.connection, self.items,
-                                                                self.filename)
+                                                    self.tree, self.filename)
+        # The reader connections that have been given back, see get_reader
+        self.readers = []
+        self.readers_lock = threading.Lock()
+        self.closed = False
 
         # Enable multi-threading, as the database is protected with a queue
         self.connection.put(FileDB(filename, check_same_thread=False,
@@ -189,12 +335,14 @@ class Database(object):
         hardlimit = config.get_int('hard_limit')
         self.dbhistory.set_limits(softlimit, timelimit, hardlimit)
 
-        dbitems = cursor.execute(queries.items_select_tree)
+        # Build the tree only once here, then keep it updated together with
+        # the Items table
+        self.tree.load(cursor.execute(queries.items_select_tree))
         self.connection.give(qconn)
 
-        for item in dbitems:
-            self.items[item['I_id']] = items.Item(self.connection,
-                    self.dbhistory, self.items, self.filename, item['I_id'])
+        for id_ in self.tree.rows:
+            self.items[id_] = items.Item(self.connection, self.dbhistory,
+                                    self.items, self.tree, self.filename, id_)
 
     @staticmethod
     def create(filename):
@@ -230,7 +378,11 @@ class Database(object):
                                     int(float(outspline.info.core.version)), ))
 
                 cursor.execute(queries.items_create)
+                cursor.execute(queries.items_create_index_parent)
+                cursor.execute(queries.items_create_index_previous)
                 cursor.execute(queries.history_create)
+                cursor.execute(queries.history_create_index_group)
+                cursor.execute(queries.history_create_index_status)
 
                 conn.save_and_disconnect()
 
@@ -242,9 +394,83 @@ class Database(object):
 
                 return filename
 
+    @classmethod
+    def start_opening(cls, filenames, check_new_extensions=True):
+        # Load the databases in parallel, each on its own thread, so that
+        # opening them afterwards with cls.open is immediate; most of the time
+        # is spent waiting for SQLite, which releases the GIL
+        # The databases are not opened here, because cls.open signals events
+        # that must be handled on the main thread and in order
+        start_opening_databases_event.signal(filenames=filenames)
+
+        threads = []
+
+        for filename in set(filenames):
+            thread = threading.Thread(target=cls._preload,
+                                        args=(filename, check_new_extensions))
+            thread.name = "core_preload_{}".format(filename)
+            thread.start()
+            threads.append(thread)
+
+        for thread in threads:
+            thread.join()
+
+    @classmethod
+    def _preload(cls, filename, check_new_extensions):
+        try:
+            loaded = cls._load(filename, check_new_extensions)
+        except Exception:
+            # The exception is raised again by cls.open, on the main thread,
+            # with its original traceback
+            preloaded[filename] = (None, sys.exc_info())
+        else:
+            preloaded[filename] = (loaded, None)
+
+    @staticmethod
+    def end_opening():
+        # Discard the databases that have been loaded but not opened
+        for loaded, error in preloaded.itervalues():
+            if loaded:
+                loaded[0].connection.get().disconnect()
+
+        preloaded.clear()
+
+        end_opening_databases_event.signal()
+
     @classmethod
     def open(cls, filename, check_new_extensions=True):
         global dbs
+
+        try:
+            loaded, error = preloaded.pop(filename)
+        except KeyError:
+            loaded = cls._load(filename, check_new_extensions)
+        else:
+            if error:
+                raise error[0], error[1], error[2]
+            elif filename in dbs:
+                loaded[0].connection.get().disconnect()
+                raise exceptions.DatabaseAlreadyOpenError()
+
+        if loaded:
+            database, dependencies = loaded
+            dbs[filename] = database
+
+            open_database_dirty_event.signal(filename=filename,
+                                                dependencies=dependencies)
+
+            # Reset modified state after instantiating the class, since this
+            # signals an event whose handlers might require the object to be
+            # already created
+            database.dbhistory.reset_modified_state()
+
+            open_database_event.signal(filename=filename)
+            return True
+
+    @classmethod
+    def _load(cls, filename, check_new_extensions):
+        # This method does not modify dbs nor signal events, so that it can
+        # also be run on a separate thread
         if filename in dbs:
             raise exceptions.DatabaseAlreadyOpenError()
         elif not os.access(filename, os.W_OK):
@@ -254,23 +480,17 @@ class Database(object):
                                                         check_new_extensions)
 
             if can_open:
-                dbs[filename] = cls(filename)
-
-                open_database_dirty_event.signal(filename=filename,
-                                                    dependencies=dependencies)
-
-                # Reset modified state after instantiating the class, since
-                # this signals an event whose handlers might require the object
-                # to be already created
-                dbs[filename].dbhistory.reset_modified_state()
-
-                open_database_event.signal(filename=filename)
-                return True
+                return (cls(filename), dependencies)
+            else:
+                return None
 
     def save(self):
         # Some addons may use this event to generate an exception
         save_permission_check_event.signal(filename=self.filename)
 
+        # The history is normally trimmed when the next group is opened
+        self.dbhistory.trim_history()
+
         qconn = self.connection.get()
         cursor = qconn.cursor()
         cursor.execute(queries.history_update_status_new)
@@ -289,34 +509,203 @@ class Database(object):
 
         # Of course the original file cannot be simply copied, in fact in that
         # case it should be saved first, and that's not what is expected
+        # Note that the unsaved changes only exist in the open transaction of
+        # the connection of the database, so the copy must be made by reading
+        # the tables through that connection: statements like ATTACH or
+        # VACUUM INTO would make the sqlite3 module commit the transaction,
+        # i.e. save the database
+        # The destination is overwritten completely, like the sqlite3 backup
+        # API would do
+        def connect():
+            # Start from an empty file
+            with open(destination, 'wb'):
+                pass
+
+            return sqlite3.connect(destination)
+
+        def signal_progress(copied, total):
+            save_database_copy_progress_event.signal(filename=self.filename,
+                        destination=destination, copied=copied, total=total)
+
+        try:
+            dconn = self._copy(connect, None, signal_progress)[0]
+        except IOError as e:
+            if e.errno in (errno.EACCES, errno.ENOENT):
+                raise exceptions.AccessDeniedError()
+            raise
+
+        try:
+            dconn.commit()
+        finally:
+            dconn.close()
 
-        qconn = self.connection.get()
         qconnd = FileDB(destination)
-        cursor = qconn.cursor()
         cursord = qconnd.cursor()
+        cursord.execute(queries.history_update_status_new)
+        cursord.execute(queries.history_update_status_old)
+        qconnd.save_and_disconnect()
 
-        cursor.execute(queries.master_select_tables)
+    def get_reader(self, tables):
+        # See core_api.get_reader_connection
+        tables = frozenset(tables)
+        changes = self._use_connection(None, self._read_changes)
+
+        with self.readers_lock:
+            # The readers of the previous states of the database are useless
+            stale = [reader for reader in self.readers
+                                                if reader.changes != changes]
+            self.readers = [reader for reader in self.readers
+                                                if reader.changes == changes]
+
+            for reader in self.readers:
+                if reader.tables == tables:
+                    self.readers.remove(reader)
+                    break
+            else:
+                reader = None
+
+        for sreader in stale:
+            sreader.disconnect()
+
+        if reader is None:
+            dconn, changes = self._copy(lambda: sqlite3.connect(':memory:',
+                                    check_same_thread=False), tables, None)
+            reader = ReaderDB(self, dconn, tables, changes)
+
+        return reader
+
+    def give_reader(self, reader):
+        # Do not use the connection of the database here, as the reader can be
+        # given back from another thread also after closing the database; a
+        # database with the same file name may even have been opened again
+        with self.readers_lock:
+            if not self.closed and reader.database is self:
+                self.readers.append(reader)
+                return
+
+        reader.disconnect()
+
+    def _copy(self, connect, tables, progress):
+        # Copy the given tables (all of them if None) through a new
+        # connection returned by connect, which must always start from an
+        # empty database; return the destination connection and the
+        # total_changes of the database that the copy reflects
+        # The copy is first attempted without holding the connection of the
+        # database, and restarted if the database is modified meanwhile
+        for attempt in xrange(self.COPY_ATTEMPTS):
+            dconn = connect()
 
-        for row in cursor:
-            tname = row["name"]
+            try:
+                if attempt < self.COPY_ATTEMPTS - 1:
+                    changes = self._copy_tables(dconn, tables, None, progress)
+                else:
+                    # The database keeps being modified while it is copied
+                    qconn = self.connection.get()
+
+                    try:
+                        changes = self._copy_tables(dconn, tables, qconn,
+                                                                    progress)
+                    finally:
+                        self.connection.give(qconn)
+            except:
+                dconn.close()
+                raise
 
-            # Some tables are initialized by self.create
-            cursord.execute(queries.master_delete.format(tname))
+            if changes is not None:
+                return (dconn, changes)
 
-            tcursor = qconn.cursor()
-            tcursor.execute(queries.master_select_table.format(tname))
+            dconn.close()
 
-            for trow in tcursor:
-                cursord.execute(queries.master_insert.format(tname,
-                                    ", ".join(trow.keys()),
-                                    ", ".join(["?", ] * len(trow))), (trow))
+    def _copy_tables(self, dconn, tables, heldconn, progress):
+        # The rows are copied in chunks ordered by rowid; if heldconn is None
+        # the connection is taken only for reading each chunk, so that the
+        # interface and the other threads can keep using the database, and
+        # None is returned as soon as the database turns out to have been
+        # modified since the copy was started
+        changes, schema, total = self._use_connection(heldconn,
+                                            self._read_copy_schema, tables)
+        copied = 0
 
-        cursord.execute(queries.history_update_status_new)
-        cursord.execute(queries.history_update_status_old)
+        for row in schema:
+            if row['type'] == 'table':
+                dconn.execute(row['sql'])
+                # rowid can also be negative; only the smallest possible rowid
+                # would be skipped, but SQLite never assigns it
+                lastid = -2 ** 63
 
-        self.connection.give(qconn)
+                while True:
+                    chunk = self._use_connection(heldconn,
+                                    self._read_copy_chunk, changes,
+                                    row['name'], lastid)
 
-        qconnd.save_and_disconnect()
+                    if chunk is None:
+                        return None
+
+                    columns, rows = chunk
+
+                    if not rows:
+                        break
+
+                    dconn.executemany(queries.master_insert.format(
+                                    row['name'], ", ".join(columns),
+                                    ", ".join(["?", ] * len(columns))), rows)
+
+                    lastid = rows[-1][0]
+                    copied += len(rows)
+
+                    if progress:
+                        progress(copied, total)
+
+        # Create the indexes (and possibly triggers and views) only after
+        # copying the rows
+        for row in schema:
+            if row['type'] != 'table':
+                dconn.execute(row['sql'])
+
+        return changes
+
+    def _use_connection(self, heldconn, function, *args):
+        if heldconn is not None:
+            return function(heldconn, *args)
+
+        qconn = self.connection.get()
+
+        try:
+            return function(qconn, *args)
+        finally:
+            self.connection.give(qconn)
+
+    @staticmethod
+    def _read_changes(qconn):
+        return qconn.connection.total_changes
+
+    @staticmethod
+    def _read_copy_schema(qconn, tables):
+        cursor = qconn.cursor()
+        cursor.execute(queries.master_select_schema)
+        schema = [row for row in cursor.fetchall()
+                            if tables is None or row['tbl_name'] in tables]
+        total = 0
+
+        for row in schema:
+            if row['type'] == 'table':
+                cursor.execute(queries.master_count_table.format(row['name']))
+                total += cursor.fetchone()[0]
+
+        return (qconn.connection.total_changes, schema, total)
+
+    def _read_copy_chunk(self, qconn, changes, table, lastid):
+        if qconn.connection.total_changes != changes:
+            return None
+
+        cursor = qconn.cursor()
+        cursor.execute(queries.master_select_table_chunk.format(table),
+                                                    (lastid, self.COPY_CHUNK))
+        # The rowid column may be named after the INTEGER PRIMARY KEY column
+        # that aliases it
+        columns = ['rowid', ] + [column[0]
+                                        for column in cursor.description[1:]]
+        return (columns, cursor.fetchall())
 
     def close(self):
         closing_database_event.signal(filename=self.filename)
@@ -324,6 +713,13 @@ class Database(object):
         global dbs
         del dbs[self.filename]
 
+        with self.readers_lock:
+            self.closed = True
+            readers, self.readers = self.readers, []
+
+        for reader in readers:
+            reader.disconnect()
+
         qconn = self.connection.get()
         qconn.disconnect()
         self.connection.task_done()
@@ -339,7 +735,7 @@ class Database(object):
 
     def delete_subtree(self, id_, group, description='Delete subtree'):
         self.items[id_].delete_subtree(group, description=description)
-        delete_subtree_event.signal()
+        delete_subtree_event.signal(filename=self.filename)
 
     def find_independent_items(self, ids):
         roots = set(ids)
@@ -352,7 +748,12 @@ class Database(object):
     def get_root_items(self):
         return items.Item.get_children_sorted(self.filename, 0)
 
-    def get_all_items(self):
+    def get_all_items(self, reader=None):
+        if reader:
+            # The rows can be fetched lazily, also from another thread, until
+            # the reader is given back
+            return reader.cursor().execute(queries.items_select_search)
+
         qconn = self.connection.get()
         cursor = qconn.cursor()
         cursor.execute(queries.items_select_search)
@@ -17,6 +17,7 @@
 # along with Outspline.  If not, see <http://www.gnu.org/licenses/>.
 
 import json
+import bisect
 
 from outspline.coreaux_api import Event
 
@@ -37,10 +38,15 @@ history_clean_event = Event()
 
 
 class DBHistory(object):
-    def __init__(self, connection, items, filename):
+    def __init__(self, connection, items, tree, filename):
         self.connection = connection
         self.items = items
+        self.tree = tree
         self.filename = filename
+        # The items whose position is changed by the history group being
+        # applied, mapped to their (parent, previous) before the group, or to
+        # None if they did not exist yet
+        self.oldpositions = {}
 
         self.hactions = {
             'insert': {
@@ -66,6 +72,9 @@ class DBHistory(object):
         }
 
         self.status_updates = {0: 1, 1: 0, 2: 3, 3: 2, 4: 5, 5: 4}
+        # The history is not trimmed after every inserted row, but once per
+        # group, see self.trim_history
+        self.trim_pending = False
 
     def set_limits(self, soft, time, hard):
         self.historylimits = [soft, time, hard]
@@ -95,10 +104,55 @@ class DBHistory(object):
         cur = qconn.cursor()
         cur.execute(queries.history_insert, (group, id_, type_, description,
                                                     query_redo, query_undo))
-        cur.execute(queries.history_delete_union, self.historylimits)
+        hid = cur.lastrowid
         self.connection.give(qconn)
 
+        self.trim_pending = True
+
+        return hid
+
+    def insert_history_many(self, group, rows):
+        # rows must be a list of (id_, type_, description, query_redo,
+        # query_undo) tuples; return the ids of the inserted history rows
+        if not rows:
+            return []
+
+        qconn = self.connection.get()
+        cur = qconn.cursor()
+        cur.executemany(queries.history_insert, [(group, ) + row
+                                                            for row in rows])
+        cur.execute(queries.history_select_last_id)
+        # H_id is an alias of the rowid, so the new rows have been given
+        # consecutive ids
+        lastid = cur.fetchone()['H_id']
+        self.connection.give(qconn)
+
+        self.trim_pending = True
+
+        return range(lastid - len(rows) + 1, lastid + 1)
+
+    def trim_history(self):
+        # Trimming the history after every inserted row is expensive, and
+        # operations like pasting or deleting a subtree can insert thousands
+        # of rows in the same group; the history is instead trimmed when the
+        # next group is opened, before undoing or redoing, or before saving,
+        # so in the meantime it can exceed its limits by the current group
+        # Trimming only ever deletes whole groups older than the last inserted
+        # one, and the time limit is measured from the time stamp of the last
+        # inserted row, so the result is the same that trimming right after
+        # inserting that row would give; for the same reason this must be
+        # done *before* deleting the undone groups
+        if self.trim_pending:
+            qconn = self.connection.get()
+            cur = qconn.cursor()
+            cur.execute(queries.history_delete_union, self.historylimits)
+            self.connection.give(qconn)
+
+            self.trim_pending = False
+
     def get_next_history_group(self):
+        self.trim_history()
+
         qconn = self.connection.get()
         cursor = qconn.cursor()
         cursor.execute(queries.history_delete_status)
@@ -221,34 +275,149 @@ class DBHistory(object):
             return False
 
     def undo_history(self):
+        # Do not undo groups that exceed the limits
+        self.trim_history()
         self._do_history(self.read_history_undo(), 'undo')
 
     def redo_history(self):
+        self.trim_history()
         self._do_history(self.read_history_redo(), 'redo')
 
     def _do_history(self, read, action):
         if read:
             history = read['history']
             status = read['status']
+            self.oldpositions = {}
 
             for row in history:
                 self.hactions[row['H_type']][action](self.filename, action,
                             row[3], row['H_id'], row['H_type'], row['H_item'])
                 self._update_history_id(row['H_id'], status)
 
-            history_event.signal(filename=self.filename)
+            inserted, moved, deleted = self._compute_history_diff()
+            self.oldpositions = {}
+
+            # The structural changes of the whole group are passed as its net
+            # result, so that the interfaces can update only the affected
+            # items
+            history_event.signal(filename=self.filename, inserted=inserted,
+                                                moved=moved, deleted=deleted)
+
+    def _store_old_position(self, itemid):
+        if itemid not in self.oldpositions:
+            self.oldpositions[itemid] = (self.tree.get_parent(itemid),
+                                                self.tree.get_previous(itemid))
+
+    def _compute_history_diff(self):
+        # inserted is the list of the items that did not exist before the
+        # group; moved and deleted map the items that existed before the group
+        # to their old parents
+        inserted = []
+        moved = {}
+        deleted = {}
+        oldchildren = {}
+        reordered = set()
+
+        for id_, oldposition in self.oldpositions.iteritems():
+            if oldposition is not None:
+                oldparent, oldprevious = oldposition
+
+                try:
+                    oldchildren[oldparent].append((id_, oldprevious))
+                except KeyError:
+                    oldchildren[oldparent] = [(id_, oldprevious)]
+
+            if id_ in self.items:
+                if oldposition is None:
+                    inserted.append(id_)
+                else:
+                    moved[id_] = oldparent
+
+                    if self.tree.get_parent(id_) == oldparent:
+                        reordered.add(oldparent)
+            # Ignore the items that were both inserted and deleted by the
+            # group
+            elif oldposition is not None:
+                deleted[id_] = oldparent
+
+        # An item whose parent has not changed only has to be repositioned if
+        # its order has changed with respect to the siblings that have not
+        # been repositioned; e.g. the next item of a deleted item, or one of
+        # two swapped items, can stay where it is
+        for parent in reordered:
+            for id_, keep in self._find_kept_siblings(parent,
+                                                    oldchildren[parent]):
+                if keep:
+                    moved.pop(id_, None)
+                else:
+                    moved[id_] = parent
+
+        return (inserted, moved, deleted)
+
+    def _find_kept_siblings(self, parent, oldchildren):
+        # Rebuild the order of the children of parent before the group;
+        # oldchildren are the (id_, previous) of the items that were children
+        # of parent and have been touched by the group, the other children
+        # still have the same previous item
+        oldnexts = dict((previous, id_) for id_, previous in oldchildren)
+
+        for id_ in self.tree.get_children_unsorted(parent):
+            if id_ not in self.oldpositions:
+                oldnexts[self.tree.get_previous(id_)] = id_
+
+        newindexes = dict((id_, index) for index, id_ in
+                        enumerate(self.tree.get_children_sorted(parent)))
+        siblings = []
+        id_ = oldnexts.get(0)
+
+        while id_ is not None:
+            # Only the items that are still children of parent matter
+            if id_ in newindexes:
+                siblings.append(id_)
+
+            id_ = oldnexts.get(id_)
+
+        # The largest set of siblings that are in the same order as before is
+        # a longest increasing subsequence of their new indexes
+        tails = []
+        tailids = []
+        predecessors = {}
+
+        for id_ in siblings:
+            index = newindexes[id_]
+            position = bisect.bisect_left(tails, index)
+            predecessors[id_] = tailids[position - 1] if position > 0 \
+                                                                    else None
+
+            if position == len(tails):
+                tails.append(index)
+                tailids.append(id_)
+            else:
+                tails[position] = index
+                tailids[position] = id_
+
+        kept = set()
+        id_ = tailids[-1] if tailids else None
+
+        while id_ is not None:
+            kept.add(id_)
+            id_ = predecessors[id_]
+
+        return ((id_, id_ in kept) for id_ in siblings)
 
     def _do_history_row_insert(self, filename, action, jparams, hid, type_,
                                                                     itemid):
         parent, previous, text = json.loads(jparams)
+        self.oldpositions.setdefault(itemid, None)
 
         qconn = self.connection.get()
         cursor = qconn.cursor()
         cursor.execute(queries.items_insert, (itemid, parent, previous, text))
+        self.tree.insert(itemid, parent, previous, text)
         self.connection.give(qconn)
 
         self.items[itemid] = items.Item(self.connection, self, self.items,
-                                                        self.filename, itemid)
+                                            self.tree, self.filename, itemid)
 
         history_insert_event.signal(filename=self.filename, id_=itemid,
                         parent=parent, previous=previous, text=text, hid=hid)
@@ -256,10 +425,12 @@ class DBHistory(object):
     def _do_history_row_update_previous(self, filename, action, jparams, hid,
                                                                 type_, itemid):
         parent, previous = json.loads(jparams)
+        self._store_old_position(itemid)
 
         qconn = self.connection.get()
         cursor = qconn.cursor()
         cursor.execute(queries.items_update_previous, (previous, itemid))
+        self.tree.update_previous(itemid, previous)
         self.connection.give(qconn)
 
         history_update_previous_event.signal(filename=self.filename,
@@ -268,11 +439,13 @@ class DBHistory(object):
     def _do_history_row_update_parent(self, filename, action, jparams, hid,
                                                                 type_, itemid):
         oldparent, newparent, previous = json.loads(jparams)
+        self._store_old_position(itemid)
 
         qconn = self.connection.get()
         cursor = qconn.cursor()
         cursor.execute(queries.items_update_parent, (newparent, previous,
                                                                     itemid))
+        self.tree.update_parent(itemid, newparent, previous)
         self.connection.give(qconn)
 
         history_update_parent_event.signal(filename=self.filename, id_=itemid,
@@ -283,6 +456,7 @@ class DBHistory(object):
         qconn = self.connection.get()
         cursor = qconn.cursor()
         cursor.execute(queries.items_update_text, (jparams, itemid))
+        self.tree.update_text(itemid, jparams)
         self.connection.give(qconn)
 
         history_update_text_event.signal(filename=self.filename, id_=itemid,
@@ -291,10 +465,12 @@ class DBHistory(object):
     def _do_history_row_delete(self, filename, action, jparams, hid, type_,
                                                                     itemid):
         parent, text = json.loads(jparams)
+        self._store_old_position(itemid)
 
         qconn = self.connection.get()
         cursor = qconn.cursor()
         cursor.execute(queries.items_delete_id, (itemid, ))
+        self.tree.delete(itemid)
         self.connection.give(qconn)
 
         self.items[itemid].remove()
@@ -25,19 +25,140 @@ import queries
 import exceptions
 
 item_insert_event = Event()
+items_insert_event = Event()
 item_update_previous_event = Event()
 item_update_parent_event = Event()
 item_update_text_event = Event()
 item_deleting_event = Event()
 item_deleted_event = Event()
 item_deleted_2_event = Event()
+items_deleting_event = Event()
+items_deleted_event = Event()
+
+
+class Tree(object):
+    # Mirror of the parent/previous/text columns of the Items table, so that
+    # navigating the tree never has to query the database
+    # The rows are mirrored exactly, including the transient states where two
+    # items have the same previous item (e.g. while inserting or moving an
+    # item), so that the results are always the same that the database would
+    # return
+    def __init__(self):
+        self.rows = {}
+        self.children = {}
+        # Items with I_previous == 0, grouped by parent
+        self.firsts = {}
+        # Items with I_previous != 0, grouped by previous
+        self.nexts = {}
+
+    def load(self, rows):
+        for row in rows:
+            self.insert(row['I_id'], row['I_parent'], row['I_previous'],
+                                                                row['I_text'])
+
+    def insert(self, id_, parent, previous, text):
+        self.rows[id_] = [parent, previous, text]
+        self._add(self.children, parent, id_)
+        self._link(id_, parent, previous)
+
+    def update_previous(self, id_, previous):
+        row = self.rows[id_]
+        self._unlink(id_, row[0], row[1])
+        row[1] = previous
+        self._link(id_, row[0], previous)
+
+    def update_parent(self, id_, parent, previous):
+        row = self.rows[id_]
+        self._unlink(id_, row[0], row[1])
+        self._discard(self.children, row[0], id_)
+        row[0] = parent
+        row[1] = previous
+        self._add(self.children, parent, id_)
+        self._link(id_, parent, previous)
+
+    def update_text(self, id_, text):
+        self.rows[id_][2] = text
+
+    def delete(self, id_):
+        parent, previous, text = self.rows.pop(id_)
+        self._discard(self.children, parent, id_)
+        self._unlink(id_, parent, previous)
+
+    def get_parent(self, id_):
+        return self.rows[id_][0]
+
+    def get_previous(self, id_):
+        return self.rows[id_][1]
+
+    def get_text(self, id_):
+        return self.rows[id_][2]
+
+    def get_next(self, id_):
+        return self._pick(self.nexts, id_)
+
+    def has_children(self, id_):
+        return id_ in self.children
+
+    def get_children_unsorted(self, id_):
+        # Create a list, so that it can be safely iterated while the tree
+        # is updated
+        return list(self.children.get(id_, ()))
+
+    def get_children_sorted(self, parent):
+        ids = []
+        id_ = self._pick(self.firsts, parent)
+
+        while id_ is not None:
+            ids.append(id_)
+            id_ = self._pick(self.nexts, id_)
+
+        return ids
+
+    def _link(self, id_, parent, previous):
+        if previous == 0:
+            self._add(self.firsts, parent, id_)
+        else:
+            self._add(self.nexts, previous, id_)
+
+    def _unlink(self, id_, parent, previous):
+        if previous == 0:
+            self._discard(self.firsts, parent, id_)
+        else:
+            self._discard(self.nexts, previous, id_)
+
+    @staticmethod
+    def _add(index, key, id_):
+        try:
+            index[key].add(id_)
+        except KeyError:
+            index[key] = set((id_, ))
+
+    @staticmethod
+    def _discard(index, key, id_):
+        ids = index[key]
+        ids.discard(id_)
+
+        # Do not keep empty sets, so that testing the key is enough to know
+        # if there are any items
+        if not ids:
+            del index[key]
+
+    @staticmethod
+    def _pick(index, key):
+        # Like the "LIMIT 1" queries, return an arbitrary item if more than
+        # one match
+        for id_ in index.get(key, ()):
+            return id_
+        else:
+            return None
 
 
 class Item(object):
-    def __init__(self, connection, dbhistory, items, filename, id_):
+    def __init__(self, connection, dbhistory, items, tree, filename, id_):
         self.connection = connection
         self.dbhistory = dbhistory
         self.items = items
+        self.tree = tree
         self.filename = filename
         self.id_ = id_
 
@@ -58,6 +179,7 @@ class Item(object):
 
         cursor.execute(queries.items_insert, (None, parent, previous, text))
         id_ = cursor.lastrowid
+        databases.dbs[filename].tree.insert(id_, parent, previous, text)
 
         databases.dbs[filename].connection.give(qconn)
 
@@ -71,31 +193,109 @@ class Item(object):
 
         db = databases.dbs[filename]
         databases.dbs[filename].items[id_] = cls(db.connection, db.dbhistory,
-                                                    db.items, filename, id_)
+                                            db.items, db.tree, filename, id_)
 
         if updnext:
             items[updnext.get_id()].update_previous(id_, group,
                                                     description=description)
 
-        # Signal the event *after* updating the next item
+        # Signal the events *after* updating the next item
         item_insert_event.signal(filename=filename, id_=id_, parent=parent,
                             text=text, group=group,  description=description)
+        items_insert_event.signal(filename=filename,
+                            items=[(id_, parent, text)], group=group,
+                            description=description)
 
         return id_
 
+    @classmethod
+    def insert_many(cls, filename, parent, previous, rows, group,
+                                                description='Insert items'):
+        # rows must be a list of (key, parentkey, text) tuples, where every
+        # item comes after its parent and its previous siblings; the items
+        # whose parentkey is None are inserted as consecutive children of
+        # parent after previous
+        # Return a dictionary mapping the keys to the new ids
+        db = databases.dbs[filename]
+
+        # Set updnext *before* inserting the new items in the database
+        try:
+            updnext = db.items[previous]._get_next()
+        except KeyError:
+            # previous may be 0
+            updnext = False
+
+        qconn = db.connection.get()
+        cursor = qconn.cursor()
+
+        cursor.execute(queries.items_select_last_id)
+        # Assign the ids explicitly, so that they are known without querying
+        # the database after each insertion
+        newid = (cursor.fetchone()['I_id'] or 0) + 1
+        newids = {}
+        # The last inserted child of each parent
+        lasts = {parent: previous}
+        irows = []
+
+        for key, parentkey, text in rows:
+            if parentkey is None:
+                iparent = parent
+            else:
+                iparent = newids[parentkey]
+
+            irows.append((newid, iparent, lasts.get(iparent, 0), text))
+            newids[key] = lasts[iparent] = newid
+            newid += 1
+
+        cursor.executemany(queries.items_insert, irows)
+
+        for id_, iparent, iprevious, text in irows:
+            db.tree.insert(id_, iparent, iprevious, text)
+
+        db.connection.give(qconn)
+
+        # For the moment it's necessary to pass 'text' for both the redo and
+        # undo queries, because it's needed also when a history action removes
+        # an item
+        db.dbhistory.insert_history_many(group, [(id_, 'insert', description,
+                    json.dumps((iparent, iprevious, text),
+                                                        separators=(',',':')),
+                    json.dumps((iparent, text), separators=(',',':')))
+                    for id_, iparent, iprevious, text in irows])
+
+        for id_, iparent, iprevious, text in irows:
+            db.items[id_] = cls(db.connection, db.dbhistory, db.items,
+                                                    db.tree, filename, id_)
+
+        if updnext and irows:
+            updnext.update_previous(lasts[parent], group,
+                                                    description=description)
+
+        # Signal the events *after* updating the next item
+        for id_, iparent, iprevious, text in irows:
+            item_insert_event.signal(filename=filename, id_=id_,
+                            parent=iparent, text=text, group=group,
+                            description=description)
+
+        items_insert_event.signal(filename=filename,
+                            items=[(id_, iparent, text)
+                            for id_, iparent, iprevious, text in irows],
+                            group=group, description=description)
+
+        return newids
+
     def update_previous(self, previous, group, description='Update item'):
         qconn = self.connection.get()
         cursor = qconn.cursor()
 
-        cursor.execute(queries.items_select_parent_previous, (self.id_, ))
-        oldvalues = cursor.fetchone()
-        parent = oldvalues["I_parent"]
+        parent = self.tree.get_parent(self.id_)
+        oldprevious = self.tree.get_previous(self.id_)
         cursor.execute(queries.items_update_previous, (previous, self.id_))
+        self.tree.update_previous(self.id_, previous)
         self.connection.give(qconn)
 
         jhparams = json.dumps((parent, previous), separators=(',',':'))
-        jhunparams = json.dumps((parent, oldvalues["I_previous"]),
-                                                        separators=(',',':'))
+        jhunparams = json.dumps((parent, oldprevious), separators=(',',':'))
         self.dbhistory.insert_history(group, self.id_, 'update_previous',
                                             description, jhparams, jhunparams)
 
@@ -108,16 +308,17 @@ class Item(object):
         qconn = self.connection.get()
         cursor = qconn.cursor()
 
-        cursor.execute(queries.items_select_parent_previous, (self.id_, ))
-        oldvalues = cursor.fetchone()
+        oldparent = self.tree.get_parent(self.id_)
+        oldprevious = self.tree.get_previous(self.id_)
         cursor.execute(queries.items_update_parent, (parent, previous,
                                                                     self.id_))
+        self.tree.update_parent(self.id_, parent, previous)
         self.connection.give(qconn)
 
-        jhparams = json.dumps((oldvalues["I_parent"], parent, previous),
+        jhparams = json.dumps((oldparent, parent, previous),
+                                                        separators=(',',':'))
+        jhunparams = json.dumps((parent, oldparent, oldprevious),
                                                         separators=(',',':'))
-        jhunparams = json.dumps((parent, oldvalues["I_parent"],
-                                oldvalues["I_previous"]), separators=(',',':'))
         self.dbhistory.insert_history(group, self.id_, 'update_parent',
                                             description, jhparams, jhunparams)
 
@@ -129,9 +330,9 @@ class Item(object):
         qconn = self.connection.get()
         cursor = qconn.cursor()
 
-        cursor.execute(queries.items_select_id_editor, (self.id_, ))
-        oldtext = cursor.fetchone()["I_text"]
+        oldtext = self.tree.get_text(self.id_)
         cursor.execute(queries.items_update_text, (text, self.id_))
+        self.tree.update_text(self.id_, text)
         self.connection.give(qconn)
 
         self.dbhistory.insert_history(group, self.id_, 'update_text',
@@ -141,54 +342,74 @@ class Item(object):
                             text=text, group=group, description=description)
 
     def delete_subtree(self, group, description='Delete subtree'):
-        for child in self._get_children_unsorted():
-            child.delete_subtree(group, description)
-
         qconn = self.connection.get()
         cursor = qconn.cursor()
+        cursor.execute(queries.items_select_subtree, (self.id_, ))
+        # The descendants come before their ancestors, like with the former
+        # recursive deletion
+        rows = [(row['I_id'], row['I_parent'], row['I_previous'],
+                                            row['I_text']) for row in cursor]
+        self.connection.give(qconn)
 
-        cursor.execute(queries.items_select_id, (self.id_, ))
-        res = cursor.fetchone()
-        parent = res['I_parent']
-        previous = res['I_previous']
-        text = res['I_text']
+        ditems = [(id_, parent, text) for id_, parent, previous, text in rows]
 
-        self.connection.give(qconn)
+        # Listeners that can handle the whole subtree at once should bind to
+        # items_deleting_event
+        items_deleting_event.signal(filename=self.filename, items=ditems,
+                                        group=group, description=description)
 
-        # This event must be signalled *before* updating the next item
-        item_deleting_event.signal(filename=self.filename, parent=parent,
-                                        id_=self.id_, text=text,
+        # Like with the former recursive deletion, the single items are
+        # removed from the tree one by one, descendants first, and each
+        # item_deleting_event is signalled right before its own item is
+        # removed, i.e. when all its descendants are already gone
+        for id_, parent, previous, text in rows:
+            # This event must be signalled *before* updating the next item
+            item_deleting_event.signal(filename=self.filename, parent=parent,
+                                        id_=id_, text=text,
                                         group=group, description=description)
 
-        next = self._get_next()
+            # Only the next item of the root of the subtree has to be updated,
+            # all the other items are deleted together with their siblings
+            if id_ == self.id_:
+                next = self._get_next()
+
+                if next:
+                    next.update_previous(self.tree.get_previous(self.id_),
+                                            group, description=description)
 
-        if next:
-            next.update_previous(previous, group, description=description)
+            self.tree.delete(id_)
 
         qconn = self.connection.get()
         cursor = qconn.cursor()
+        cursor.execute(queries.items_delete_subtree, (self.id_, ))
+        self.connection.give(qconn)
 
-        # For the moment it's necessary to pass res['I_text'] for both the redo
+        # For the moment it's necessary to pass the text for both the redo
         # and undo queries, because it's needed also when a history action
         # removes an item
-        hparams = json.dumps((parent, text), separators=(',',':'))
-        hunparams = json.dumps((parent, previous, text), separators=(',',':'))
-
-        cursor.execute(queries.items_delete_id, (self.id_, ))
-
-        self.connection.give(qconn)
-
-        self.dbhistory.insert_history(group, self.id_, 'delete',
-                                            description, hparams, hunparams)
+        # Storing the original previous items makes the undo restore the
+        # subtree exactly, without the intermediate updates that the
+        # deletion of the single items used to record
+        # The rows of the listeners of items_deleting_event, e.g. the deleted
+        # and broken links, come before these, as the undo requires
+        hids = self.dbhistory.insert_history_many(group, [(id_, 'delete',
+                    description,
+                    json.dumps((parent, text), separators=(',',':')),
+                    json.dumps((parent, previous, text), separators=(',',':')))
+                    for id_, parent, previous, text in rows])
 
-        self.remove()
+        for (id_, parent, text), hid in zip(ditems, hids):
+            self.items[id_].remove()
 
-        # This event is designed to be signalled _after_ self.remove()
-        item_deleted_event.signal(filename=self.filename, id_=self.id_,
-                                         hid=cursor.lastrowid, text=text,
+            # This event is designed to be signalled _after_ self.remove()
+            item_deleted_event.signal(filename=self.filename, id_=id_,
+                                         hid=hid, text=text,
                                          group=group, description=description)
 
-        item_deleted_2_event.signal(filename=self.filename, id_=self.id_)
+            item_deleted_2_event.signal(filename=self.filename, id_=id_)
+
+        items_deleted_event.signal(filename=self.filename, items=ditems,
+                                        group=group, description=description)
 
     def remove(self):
         del self.items[self.id_]
@@ -281,26 +502,19 @@ class Item(object):
         return [self.items[id_] for id_ in self.get_children()]
 
     def _get_children_unsorted(self):
-        qconn = self.connection.get()
-        cursor = qconn.cursor()
-        cursor.execute(queries.items_select_id_children, (self.id_, ))
-        self.connection.give(qconn)
-        return [self.items[row["I_id"]] for row in cursor]
+        return [self.items[id_] for id_ in
+                                self.tree.get_children_unsorted(self.id_)]
 
     def get_children(self):
         return self.get_children_sorted(self.filename, self.id_)
 
     def get_all_info(self):
-        qconn = self.connection.get()
-        cursor = qconn.cursor()
-        cursor.execute(queries.items_select_id, (self.id_, ))
-        self.connection.give(qconn)
-        row = cursor.fetchone()
+        parent, previous, text = self.tree.rows[self.id_]
 
         return {'id_': self.id_,
-                'parent': row['I_parent'],
-                'previous': row['I_previous'],
-                'text': row['I_text']}
+                'parent': parent,
+                'previous': previous,
+                'text': text}
 
     def get_ancestors(self):
         ancestors = []
@@ -328,11 +542,7 @@ class Item(object):
             return None
 
     def get_previous(self):
-        qconn = self.connection.get()
-        cursor = qconn.cursor()
-        cursor.execute(queries.items_select_id_previous, (self.id_, ))
-        self.connection.give(qconn)
-        return cursor.fetchone()['I_previous']
+        return self.tree.get_previous(self.id_)
 
     def _get_next(self):
         try:
@@ -341,16 +551,7 @@ class Item(object):
             return None
 
     def get_next(self):
-        qconn = self.connection.get()
-        cursor = qconn.cursor()
-        cursor.execute(queries.items_select_id_next, (self.id_, ))
-        self.connection.give(qconn)
-        nid = cursor.fetchone()
-
-        if nid:
-            return nid['I_id']
-        else:
-            return None
+        return self.tree.get_next(self.id_)
 
     def _get_parent(self):
         pid = self.get_parent()
@@ -361,42 +562,16 @@ class Item(object):
             return None
 
     def get_parent(self):
-        qconn = self.connection.get()
-        cursor = qconn.cursor()
-        cursor.execute(queries.items_select_id_parent, (self.id_, ))
-        self.connection.give(qconn)
-        pid = cursor.fetchone()
-        return pid['I_parent']
+        return self.tree.get_parent(self.id_)
 
     def get_text(self):
-        qconn = self.connection.get()
-        cur = qconn.cursor()
-        cur.execute(queries.items_select_id_editor, (self.id_, ))
-        text = cur.fetchone()['I_text']
-        self.connection.give(qconn)
-        return text
+        return self.tree.get_text(self.id_)
 
     def has_children(self):
-        qconn = self.connection.get()
-        cursor = qconn.cursor()
-        cursor.execute(queries.items_select_id_haschildren, (self.id_, ))
-        self.connection.give(qconn)
-
-        if cursor.fetchone():
-            return True
-        else:
-            return False
+        return self.tree.has_children(self.id_)
 
     def is_root(self):
-        qconn = self.connection.get()
-        cursor = qconn.cursor()
-        cursor.execute(queries.items_select_id_parent, (self.id_, ))
-        self.connection.give(qconn)
-
-        if cursor.fetchone()["I_parent"] == 0:
-            return True
-        else:
-            return False
+        return self.tree.get_parent(self.id_) == 0
 
     @classmethod
     def get_last_child(cls, filename, id_):
@@ -409,23 +584,4 @@ class Item(object):
 
     @staticmethod
     def get_children_sorted(filename, parent):
-        qconn = databases.dbs[filename].connection.get()
-        cursor = qconn.cursor()
-        cursor.execute(queries.items_select_parent, (parent, 0))
-        row = cursor.fetchone()
-        ids = []
-
-        if row:
-            ids.append(row["I_id"])
-
-            while True:
-                cursor.execute(queries.items_select_id_next, (ids[-1], ))
-                row = cursor.fetchone()
-
-                if row:
-                    ids.append(row["I_id"])
-                else:
-                    break
-
-        databases.dbs[filename].connection.give(qconn)
-        return ids
+        return databases.dbs[filename].tree.get_children_sorted(parent)
@@ -18,10 +18,22 @@
 
 pragma_valid_test = "PRAGMA schema_version"
 
+pragma_query_only = "PRAGMA query_only = ON"
+
 master_select_tables = "SELECT name FROM sqlite_master WHERE type='table'"
 
+# The internal tables, e.g. sqlite_sequence, are created automatically
+master_select_schema = ("SELECT type, name, tbl_name, sql FROM sqlite_master "
+                        "WHERE sql NOT NULL AND name NOT LIKE 'sqlite!_%' "
+                        "ESCAPE '!'")
+
 master_select_table = "SELECT * FROM {}"
 
+master_select_table_chunk = ("SELECT rowid, * FROM {} WHERE rowid > ? "
+                                                    "ORDER BY rowid LIMIT ?")
+
+master_count_table = "SELECT COUNT(*) FROM {}"
+
 master_insert = "INSERT INTO {} ({}) VALUES ({})"
 
 master_delete = "DELETE FROM {}"
@@ -68,29 +80,16 @@ items_create = ("CREATE TABLE Items (I_id INTEGER PRIMARY KEY, "
                                     "I_previous INTEGER, "
                                     "I_text TEXT)")
 
-items_select_tree = 'SELECT I_id FROM Items'
-
-items_select_id = ('SELECT I_parent, I_previous, I_text FROM Items '
-                   'WHERE I_id=? LIMIT 1')
-
-items_select_id_parent = 'SELECT I_parent FROM Items WHERE I_id=? LIMIT 1'
-
-items_select_id_editor = 'SELECT I_text FROM Items WHERE I_id=? LIMIT 1'
+# The index on (I_parent, I_previous) also serves the queries on I_parent alone
+items_create_index_parent = ('CREATE INDEX Items_parent ON Items '
+                                                    '(I_parent, I_previous)')
 
-items_select_id_previous = ('SELECT I_previous FROM Items WHERE I_id=? '
-                            'LIMIT 1')
+items_create_index_previous = ('CREATE INDEX Items_previous ON Items '
+                                                                '(I_previous)')
 
-items_select_id_next = 'SELECT I_id FROM Items WHERE I_previous=? LIMIT 1'
+items_select_last_id = 'SELECT MAX(I_id) AS I_id FROM Items'
 
-items_select_id_children = 'SELECT I_id FROM Items WHERE I_parent=?'
-
-items_select_id_haschildren = 'SELECT I_id FROM Items WHERE I_parent=? LIMIT 1'
-
-items_select_parent = ('SELECT I_id FROM Items WHERE I_parent=? AND '
-                                                        'I_previous=? LIMIT 1')
-
-items_select_parent_previous = ('SELECT I_parent, I_previous FROM Items '
-                                                        'WHERE I_id=? LIMIT 1')
+items_select_tree = 'SELECT I_id, I_parent, I_previous, I_text FROM Items'
 
 items_select_parent_text = ('SELECT I_id, I_text FROM Items '
                                 'WHERE I_parent=? AND I_previous=? LIMIT 1')
@@ -108,6 +107,24 @@ items_update_text = 'UPDATE Items SET I_text=? WHERE I_id=?'
 
 items_delete_id = 'DELETE FROM Items WHERE I_id=?'
 
+# The descendants are returned before their ancestors
+items_select_subtree = ('''
+WITH RECURSIVE Subtree (S_id, S_depth) AS (
+    SELECT ?, 0
+    UNION ALL
+    SELECT I_id, S_depth + 1 FROM Items JOIN Subtree ON I_parent=S_id
+)
+SELECT I_id, I_parent, I_previous, I_text FROM Items JOIN Subtree ON I_id=S_id
+ORDER BY S_depth DESC''')
+
+items_delete_subtree = ('''
+WITH RECURSIVE Subtree (S_id) AS (
+    SELECT ?
+    UNION ALL
+    SELECT I_id FROM Items JOIN Subtree ON I_parent=S_id
+)
+DELETE FROM Items WHERE I_id IN Subtree''')
+
 history_create = ("CREATE TABLE History (H_id INTEGER PRIMARY KEY, "
                                         "H_group INTEGER, "
                                         "H_status INTEGER, "
@@ -118,6 +135,12 @@ history_create = ("CREATE TABLE History (H_id INTEGER PRIMARY KEY, "
                                         "H_redo TEXT, "
                                         "H_undo TEXT)")
 
+history_create_index_group = ('CREATE INDEX History_group ON History '
+                                                                '(H_group)')
+
+history_create_index_status = ('CREATE INDEX History_status ON History '
+                                                        '(H_status, H_group)')
+
 # Do not change the index of H_undo [3]
 history_select_group_undo = ('SELECT H_id, H_item, H_type, H_undo '
                              'FROM History WHERE H_group=? ORDER BY H_id DESC')
@@ -148,6 +171,8 @@ history_insert = ('INSERT INTO History (H_id, H_group, H_status, '
                   'H_item, H_type, H_tstamp, H_description, H_redo, H_undo) '
                   'VALUES (NULL, ?, 1, ?, ?, strftime("%s", "now"), ?, ?, ?)')
 
+history_select_last_id = 'SELECT MAX(H_id) AS H_id FROM History'
+
 history_update_status_new = ('UPDATE History SET H_status=5 '
                              'WHERE H_status IN (1, 3)')
 
@@ -177,11 +202,13 @@ DELETE FROM History WHERE H_group < (
     )
 )''')
 
-# There can't be entries with statuses 0, 2, 4 because this query is executed
-# only when *inserting* a group in the history, and before that all 0, 2 and 4
-# actions are deleted by history_delete_status
+# This query is executed by DBHistory.trim_history before deleting the
+# actions with statuses 0, 2, 4, so that the set of groups is the same as when
+# the last row was inserted, even if some of them have been undone meanwhile
 # Don't just use ORDER BY and OFFSET directly in the main DELETE query, because
 # groups have to be kept intact
+# The time limit is measured from the time stamp of the last inserted row,
+# i.e. as if the history was trimmed right after inserting it
 history_delete_union = ('''
 DELETE FROM History WHERE H_group < (
     SELECT MIN(H_group) FROM (
@@ -191,7 +218,9 @@ DELETE FROM History WHERE H_group < (
         UNION
         SELECT H_group FROM (
             SELECT DISTINCT H_group FROM History
-            WHERE H_tstamp >= strftime("%s", "now") - ? * 60
+            WHERE H_tstamp >= (
+                SELECT H_tstamp FROM History ORDER BY H_id DESC LIMIT 1
+            ) - ? * 60
             ORDER BY H_group DESC LIMIT ?
         )
     )
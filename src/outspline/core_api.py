@@ -39,10 +39,49 @@ def give_connection(filename, conn):
     return databases.dbs[filename].connection.give(conn)
 
 
+def get_reader_connection(filename, tables):
+    # Return a read-only connection to a private in-memory copy of the given
+    # tables of the database, which long scans can query, also from other
+    # threads, without holding the connection of the database
+    # The copy includes the unsaved changes, and reflects the state of the
+    # tables at a single moment during this call: it sees all the changes
+    # completed before the call and none of those started after it; the
+    # database must still be blocked, e.g. with block_databases_read, if the
+    # results of the scan must not be made obsolete by changes made meanwhile
+    # Only the given tables and their indexes exist in the copy
+    # The copies are reused as long as the database is not modified, otherwise
+    # making one costs reading the given tables in chunks, taking the
+    # connection of the database only for each chunk
+    # The connection must be given back with give_reader_connection, also if
+    # the database has been closed meanwhile
+    return databases.dbs[filename].get_reader(tables)
+
+
+def give_reader_connection(filename, conn):
+    try:
+        database = databases.dbs[filename]
+    except KeyError:
+        # The database has been closed
+        conn.disconnect()
+    else:
+        database.give_reader(conn)
+
+
 def create_database(filename):
     return databases.Database.create(filename)
 
 
+def start_opening_databases(filenames, check_new_extensions=True):
+    # Load the databases in parallel: they must then be opened one by one
+    #  with open_database, and end_opening_databases must be called when done
+    return databases.Database.start_opening(filenames,
+                                    check_new_extensions=check_new_extensions)
+
+
+def end_opening_databases():
+    return databases.Database.end_opening()
+
+
 def open_database(filename, check_new_extensions=True):
     return databases.Database.open(filename,
                                     check_new_extensions=check_new_extensions)
@@ -101,6 +140,32 @@ def insert_item_after(filename, previous, group=None, text='New item',
             previous=previous, group=group, text=text, description=description)
 
 
+def append_items(filename, parent, rows, group=None,
+                                                description='Insert items'):
+    # rows must be a list of (key, parentkey, text) tuples, see
+    # core.items.Item.insert_many
+    previous = items.Item.get_last_child(filename, parent)
+
+    if group == None:
+        group = databases.dbs[filename].dbhistory.get_next_history_group()
+
+    return items.Item.insert_many(filename, parent, previous, rows, group,
+                                                    description=description)
+
+
+def insert_items_after(filename, previous, rows, group=None,
+                                                description='Insert items'):
+    # rows must be a list of (key, parentkey, text) tuples, see
+    # core.items.Item.insert_many
+    parent = databases.dbs[filename].items[previous].get_parent()
+
+    if group == None:
+        group = databases.dbs[filename].dbhistory.get_next_history_group()
+
+    return items.Item.insert_many(filename, parent, previous, rows, group,
+                                                    description=description)
+
+
 def move_item_up(filename, id_, description='Move item up'):
     group = databases.dbs[filename].dbhistory.get_next_history_group()
     try:
@@ -148,6 +213,12 @@ def insert_history(filename, group, id_, type, description, query_redo,
                                         description, query_redo, query_undo)
 
 
+def insert_history_many(filename, group, rows):
+    # rows must be a list of (id_, type, description, query_redo, query_undo)
+    # tuples
+    return databases.dbs[filename].dbhistory.insert_history_many(group, rows)
+
+
 def preview_undo_tree(filename):
     read = databases.dbs[filename].dbhistory.read_history_undo()
     if read:
@@ -276,8 +347,10 @@ def get_item_text(filename, id_):
         raise NonExistingItemError()
 
 
-def get_all_items(filename):
-    return databases.dbs[filename].get_all_items()
+def get_all_items(filename, reader=None):
+    # If a connection returned by get_reader_connection is given, read the
+    # items from its copy
+    return databases.dbs[filename].get_all_items(reader=reader)
 
 
 def get_all_items_text(filename):
@@ -348,6 +421,29 @@ def release_databases():
     return databases.protection.release()
 
 
+def block_databases_read(filenames, block=False, quiet=False):
+    # Only prevent the given databases from being modified: other readers can
+    # block the same databases at the same time, and the other databases can
+    # still be blocked for writing
+    return databases.protection.block_read(filenames, block=block,
+                                                                quiet=quiet)
+
+
+def release_databases_read(filenames):
+    return databases.protection.release_read(filenames)
+
+
+def block_database_write(filename, block=False, quiet=False):
+    # Block only the given database, exclusively; use this instead of
+    # block_databases for the operations that only concern one database
+    return databases.protection.block_write(filename, block=block,
+                                                                quiet=quiet)
+
+
+def release_database_write(filename):
+    return databases.protection.release_write(filename)
+
+
 def get_open_databases():
     return tuple(databases.dbs.keys())
 
@@ -368,6 +464,14 @@ def bind_to_open_database_dirty(handler, bind=True):
     return databases.open_database_dirty_event.bind(handler, bind)
 
 
+def bind_to_start_opening_databases(handler, bind=True):
+    return databases.start_opening_databases_event.bind(handler, bind)
+
+
+def bind_to_end_opening_databases(handler, bind=True):
+    return databases.end_opening_databases_event.bind(handler, bind)
+
+
 def bind_to_open_database(handler, bind=True):
     return databases.open_database_event.bind(handler, bind)
 
@@ -388,6 +492,10 @@ def bind_to_save_database(handler, bind=True):
     return databases.save_database_event.bind(handler, bind)
 
 
+def bind_to_save_database_copy_progress(handler, bind=True):
+    return databases.save_database_copy_progress_event.bind(handler, bind)
+
+
 def bind_to_delete_subtree(handler, bind=True):
     return databases.delete_subtree_event.bind(handler, bind)
 
@@ -440,6 +548,12 @@ def bind_to_insert_item(handler, bind=True):
     return items.item_insert_event.bind(handler, bind)
 
 
+def bind_to_insert_items(handler, bind=True):
+    # The handler receives the whole list of (id_, parent, text) tuples of the
+    # inserted items, ancestors before descendants
+    return items.items_insert_event.bind(handler, bind)
+
+
 def bind_to_update_item_simple(handler, bind=True):
     return items.item_update_previous_event.bind(handler, bind)
 
@@ -462,3 +576,13 @@ def bind_to_deleted_item(handler, bind=True):
 
 def bind_to_deleted_item_2(handler, bind=True):
     return items.item_deleted_2_event.bind(handler, bind)
+
+
+def bind_to_deleting_items(handler, bind=True):
+    # The handler receives the whole list of (id_, parent, text) tuples of a
+    # deleted subtree, descendants before ancestors
+    return items.items_deleting_event.bind(handler, bind)
+
+
+def bind_to_deleted_items(handler, bind=True):
+    return items.items_deleted_event.bind(handler, bind)
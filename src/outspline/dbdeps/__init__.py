@@ -66,6 +66,17 @@ class Core(object):
         # the normal queries
         pass
 
+    @staticmethod
+    def upgrade_4_to_5(cursor):
+        # These queries must stay here because they must not be updated with
+        # the normal queries
+        cursor.execute('CREATE INDEX Items_parent ON Items '
+                                                    '(I_parent, I_previous)')
+        cursor.execute('CREATE INDEX Items_previous ON Items (I_previous)')
+        cursor.execute('CREATE INDEX History_group ON History (H_group)')
+        cursor.execute('CREATE INDEX History_status ON History '
+                                                        '(H_status, H_group)')
+
 
 class Database(object):
     def __init__(self, filename):
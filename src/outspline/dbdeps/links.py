@@ -21,6 +21,8 @@ from outspline.extensions.links import queries
 
 def add(cursor):
     cursor.execute(queries.links_create)
+    cursor.execute(queries.links_create_index_id)
+    cursor.execute(queries.links_create_index_target)
 
 def remove(cursor):
     cursor.execute(queries.links_drop)
@@ -30,3 +32,9 @@ def upgrade_0_to_1(cursor):
     # These queries must stay here because they must not be updated with the
     # normal queries
     pass
+
+def upgrade_1_to_2(cursor):
+    # These queries must stay here because they must not be updated with the
+    # normal queries
+    cursor.execute('CREATE INDEX Links_id ON Links (L_id, L_target)')
+    cursor.execute('CREATE INDEX Links_target ON Links (L_target, L_id)')
@@ -26,6 +26,7 @@ origin_filename = None
 copy_items_event = Event()
 item_copy_event = Event()
 item_paste_event = Event()
+items_paste_event = Event()
 items_pasted_event = Event()
 paste_check_event = Event()
 
@@ -56,54 +57,76 @@ def copy_items(filename, cids):
 def paste_items(filename, baseid, mode, group, description='Paste items'):
     qmemory = core_api.get_memory_connection()
     cursor = qmemory.cursor()
-    cursor.execute(queries.copy_select_parent_roots)
-    old_roots = cursor.fetchall()
+    # The roots are returned in the order in which they were copied
+    cursor.execute(queries.copy_select)
+    rows = cursor.fetchall()
     core_api.give_memory_connection(qmemory)
 
-    old_to_new_ids = {}
+    copied = set(row['C_id'] for row in rows)
+    old_roots = []
+    # Rebuild the copied forest in memory instead of looking up every child
+    # with a query; the children of each item are chained by their previous
+    # item
+    chains = {}
 
-    def recurse(baseid, previd):
-        cursor.execute(queries.copy_select_parent, (baseid, previd))
-        child = cursor.fetchone()
+    for row in rows:
+        if row['C_parent'] in copied:
+            chains[(row['C_parent'], row['C_previous'])] = row
+        else:
+            old_roots.append(row)
 
-        if child:
-            id_ = child['C_id']
+    # Sort the items so that every item comes after its parent and its
+    # previous siblings; do not recurse, subtrees can be very deep
+    irows = []
 
-            old_to_new_ids[id_] = core_api.append_item(
-                                filename, old_to_new_ids[baseid], group=group,
-                                text=child['C_text'], description=description)
+    for root in old_roots:
+        stack = [root]
+
+        while stack:
+            row = stack.pop()
+            id_ = row['C_id']
+
+            if row is root:
+                irows.append((id_, None, row['C_text']))
+            else:
+                irows.append((id_, row['C_parent'], row['C_text']))
+
+            children = []
+            child = chains.get((id_, 0))
+
+            while child:
+                children.append(child)
+                child = chains.get((id_, child['C_id']))
 
-            item_paste_event.signal(filename=filename, id_=old_to_new_ids[id_],
-                                    oldid=id_, group=group,
+            children.reverse()
+            stack.extend(children)
+
+    if mode == 'children':
+        old_to_new_ids = core_api.append_items(filename, baseid, irows,
+                                    group=group, description=description)
+    elif mode == 'siblings':
+        old_to_new_ids = core_api.insert_items_after(filename, baseid, irows,
+                                    group=group, description=description)
+
+    for oldid, parentkey, text in irows:
+        item_paste_event.signal(filename=filename, id_=old_to_new_ids[oldid],
+                                    oldid=oldid, group=group,
                                     description=description)
 
-            recurse(id_, 0)
-            recurse(baseid, id_)
+    items_paste_event.signal(filename=filename,
+                        items=[(old_to_new_ids[oldid], oldid)
+                        for oldid, parentkey, text in irows],
+                        group=group, description=description)
 
     if mode == 'siblings':
+        # Keep returning the roots in the order in which they used to be
+        # inserted after baseid
         old_roots.reverse()
 
-    for root in old_roots:
-        if mode == 'children':
-            old_to_new_ids[root['C_id']] = core_api.append_item(
-                                filename, baseid, group=group,
-                                text=root['C_text'], description=description)
-        elif mode == 'siblings':
-            old_to_new_ids[root['C_id']] = core_api.insert_item_after(
-                                filename, baseid, group=group,
-                                text=root['C_text'], description=description)
-
-        item_paste_event.signal(filename=filename,
-                                            id_=old_to_new_ids[root['C_id']],
-                                            oldid=root['C_id'], group=group,
-                                            description=description)
-
-        recurse(root['C_id'], 0)
-
     new_ids = old_to_new_ids.values()
     new_roots = [old_to_new_ids[root['C_id']] for root in old_roots]
 
-    items_pasted_event.signal()
+    items_pasted_event.signal(filename=filename)
 
     return (new_roots, new_ids)
 
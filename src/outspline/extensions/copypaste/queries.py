@@ -23,11 +23,7 @@ copy_create = ("CREATE TABLE Copy (C_id INTEGER, "
 
 copy_select_check = 'SELECT C_id FROM Copy LIMIT 1'
 
-copy_select_parent = ('SELECT C_id, C_text FROM Copy WHERE C_parent=? '
-                      'AND C_previous=? LIMIT 1')
-
-copy_select_parent_roots = ('SELECT C_id, C_text FROM Copy '
-                            'WHERE C_parent NOT IN (SELECT C_id FROM Copy)')
+copy_select = 'SELECT C_id, C_parent, C_previous, C_text FROM Copy'
 
 copy_insert = ('INSERT INTO Copy (C_id, C_parent, C_previous, C_text) '
                'VALUES (?, ?, ?, ?)')
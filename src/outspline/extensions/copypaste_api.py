@@ -62,6 +62,12 @@ def bind_to_paste_item(handler, bind=True):
     return copypaste.item_paste_event.bind(handler, bind)
 
 
+def bind_to_paste_items(handler, bind=True):
+    # The handler receives the whole list of (id_, oldid) tuples of the pasted
+    # items, ancestors before descendants
+    return copypaste.items_paste_event.bind(handler, bind)
+
+
 def bind_to_items_pasted(handler, bind=True):
     return copypaste.items_pasted_event.bind(handler, bind)
 
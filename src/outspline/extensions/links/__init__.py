@@ -50,15 +50,12 @@ def handle_open_database(kwargs):
     filename = kwargs['filename']
 
     if filename in links.cdbs:
-        links.last_known_links[filename] = {}
-
         qconn = core_api.get_connection(filename)
         cursor = qconn.cursor()
         cursor.execute(queries.links_select)
         core_api.give_connection(filename, qconn)
 
-        for row in cursor:
-            links.last_known_links[filename][row['L_id']] = row['L_target']
+        links.load_links(filename, cursor)
 
         core_api.register_history_action_handlers(filename, 'link_insert',
                     links.handle_history_insert, links.handle_history_delete)
@@ -69,11 +66,7 @@ def handle_open_database(kwargs):
 
 
 def handle_close_database(kwargs):
-    try:
-        del links.last_known_links[kwargs['filename']]
-    except KeyError:
-        pass
-
+    links.unload_links(kwargs['filename'])
     links.cdbs.discard(kwargs['filename'])
 
 
@@ -82,21 +75,20 @@ def handle_update_item_text(kwargs):
                         kwargs['text'], kwargs['group'], kwargs['description'])
 
 
-def handle_delete_item(kwargs):
+def handle_delete_items(kwargs):
     filename = kwargs['filename']
-    id_ = kwargs['id_']
-    group = kwargs['group']
-    description = kwargs['description']
+    # The descendants come before their ancestors
+    ids = [id_ for id_, parent, text in kwargs['items']]
 
     if filename in links.cdbs:
-        links.delete_link(filename, id_, group, description)
-        links.break_links(filename, id_, group, description)
+        links.delete_subtree_links(filename, ids, kwargs['group'],
+                                                        kwargs['description'])
 
         if copypaste_api:
             # Breaking links in the CopyLinks table will not be stored in the
             # history, so this is useful only if undoing/redoing changes will
             # warn the user and break all the copied links
-            links.break_copied_links(filename, id_)
+            links.break_copied_links(filename, ids)
 
 
 def handle_history(kwargs):
@@ -119,9 +111,9 @@ def handle_copy_item(kwargs):
     links.copy_link(kwargs['filename'], kwargs['id_'])
 
 
-def handle_paste_item(kwargs):
-    links.paste_link(kwargs['filename'], kwargs['id_'], kwargs['oldid'],
-                                        kwargs['group'], kwargs['description'])
+def handle_paste_items(kwargs):
+    links.paste_links(kwargs['filename'], kwargs['items'], kwargs['group'],
+                                                        kwargs['description'])
 
 
 def handle_safe_paste_check(kwargs):
@@ -134,7 +126,7 @@ def main():
     core_api.bind_to_open_database_dirty(handle_open_database_dirty)
     core_api.bind_to_open_database(handle_open_database)
     core_api.bind_to_close_database(handle_close_database)
-    core_api.bind_to_deleting_item(handle_delete_item)
+    core_api.bind_to_deleting_items(handle_delete_items)
     core_api.bind_to_history(handle_history)
 
     if coreaux_api.get_extension_configuration('links').get_bool('sync_text'):
@@ -143,5 +135,5 @@ def main():
     if copypaste_api:
         copypaste_api.bind_to_copy_items(handle_copy_items)
         copypaste_api.bind_to_copy_item(handle_copy_item)
-        copypaste_api.bind_to_paste_item(handle_paste_item)
+        copypaste_api.bind_to_paste_items(handle_paste_items)
         copypaste_api.bind_to_safe_paste_check(handle_safe_paste_check)
@@ -37,10 +37,18 @@ history_delete_event = Event()
 cdbs = set()
 
 # This dictionary keeps track of the last target for any link that has existed
-# It's *not* a mapping of the *current* links, for that use a proper query to
-# the database
+# It's *not* a mapping of the *current* links, for that use link_targets
 last_known_links = {}
 
+# These dictionaries map the *current* links of every database, i.e. they are
+# kept in sync with the Links table by the do_* functions, so that the links
+# chains and the back links can be found without querying the database:
+# link_targets maps every link to its target, and back_links maps every
+# target to the set of the links that point to it; the broken links are
+# stored with None as target
+link_targets = {}
+back_links = {}
+
 
 def select_links(filename):
     qconn = core_api.get_connection(filename)
@@ -51,11 +59,48 @@ def select_links(filename):
     return cursor.fetchall()
 
 
+def load_links(filename, rows):
+    last_known_links[filename] = {}
+    link_targets[filename] = {}
+    back_links[filename] = {}
+
+    for row in rows:
+        last_known_links[filename][row['L_id']] = row['L_target']
+        _map_link(filename, row['L_id'], row['L_target'])
+
+
+def unload_links(filename):
+    for dict_ in (last_known_links, link_targets, back_links):
+        try:
+            del dict_[filename]
+        except KeyError:
+            pass
+
+
+def _map_link(filename, id_, target):
+    link_targets[filename][id_] = target
+
+    try:
+        back_links[filename][target].add(id_)
+    except KeyError:
+        back_links[filename][target] = set((id_, ))
+
+
+def _unmap_link(filename, id_):
+    target = link_targets[filename].pop(id_)
+    backlinks = back_links[filename][target]
+    backlinks.discard(id_)
+
+    if not backlinks:
+        del back_links[filename][target]
+
+
 def do_insert_link(filename, cursor, id_, target):
     cursor.execute(queries.links_insert, (id_, target))
 
     global last_known_links
     last_known_links[filename][id_] = target
+    _map_link(filename, id_, target)
 
 
 def do_update_link(filename, cursor, target, id_):
@@ -63,11 +108,14 @@ def do_update_link(filename, cursor, target, id_):
 
     global last_known_links
     last_known_links[filename][id_] = target
+    _unmap_link(filename, id_)
+    _map_link(filename, id_, target)
 
 
-def do_delete_link(cursor, id_):
+def do_delete_link(filename, cursor, id_):
     cursor.execute(queries.links_delete_id, (id_, ))
     # Do not update last_known_links here, otherwise it would lose its meaning
+    _unmap_link(filename, id_)
 
 
 def upsert_link(filename, id_, target, group, description='Insert link'):
@@ -104,12 +152,9 @@ def upsert_link(filename, id_, target, group, description='Insert link'):
     qconn = core_api.get_connection(filename)
     cursor = qconn.cursor()
 
-    cursor.execute(queries.links_select_id, (id_, ))
-    res = cursor.fetchone()
-
     # Do not allow creating more than one link per item
-    if res:
-        oldtarget = res['L_target']
+    if id_ in link_targets[filename]:
+        oldtarget = link_targets[filename][id_]
 
         do_update_link(filename, cursor, target, id_)
 
@@ -141,67 +186,76 @@ def synchronize_links_text(filename, target, text, group, description):
 
 
 def delete_link(filename, id_, group, description='Delete link'):
-    qconn = core_api.get_connection(filename)
-    cursor = qconn.cursor()
-
-    cursor.execute(queries.links_select_id, (id_, ))
-    res = cursor.fetchone()
-
-    if res:
-        target = res['L_target']
-
-        do_delete_link(cursor, id_)
-
+    try:
+        target = link_targets[filename][id_]
+    except KeyError:
+        pass
+    else:
+        qconn = core_api.get_connection(filename)
+        cursor = qconn.cursor()
+        do_delete_link(filename, cursor, id_)
         core_api.give_connection(filename, qconn)
 
         core_api.insert_history(filename, group, id_, 'link_delete',
                 description, None, str(target) if target is not None else None)
 
         delete_link_event.signal(filename=filename, id_=id_, oldtarget=target)
-    else:
-        core_api.give_connection(filename, qconn)
 
 
-def break_links(filename, id_, group, description='Break links'):
-    # Break any links that point to the item
-    # Don't just delete those links, as it would leave their associated
-    # items in an unexpected state for the user (back to normal,
-    # undistinguished items); also this further action should be handled
-    # properly by the interface somehow
-    # Don't try to delete the links and their associated items, because
-    # silently deleting items that were not selected would be confusing;
-    # furthermore, theoretically link items are allowed (at least in the
-    # back-end) to have their own children, which should be deleted too
+def delete_subtree_links(filename, ids, group, description='Delete links'):
+    # ids are the items of a subtree that is being deleted: delete their links
+    # and break the links that point to them, item by item in the given
+    # order, but storing all the history rows at once
+    deleted = []
+    broken = []
+    hrows = []
+
     qconn = core_api.get_connection(filename)
     cursor = qconn.cursor()
-    cursor.execute(queries.links_select_target, (id_, ))
-
-    ids = set()
-    rows = cursor.fetchall()
 
-    if rows:
-        for row in rows:
-            linkid = row['L_id']
-            ids.add(linkid)
-
-            do_update_link(filename, cursor, None, linkid)
-
-            core_api.give_connection(filename, qconn)
+    for id_ in ids:
+        try:
+            target = link_targets[filename][id_]
+        except KeyError:
+            pass
+        else:
+            do_delete_link(filename, cursor, id_)
+            deleted.append((id_, target))
+            hrows.append((id_, 'link_delete', description, None,
+                                str(target) if target is not None else None))
+
+        # Break any links that point to the item
+        # Don't just delete those links, as it would leave their associated
+        # items in an unexpected state for the user (back to normal,
+        # undistinguished items); also this further action should be handled
+        # properly by the interface somehow
+        # Don't try to delete the links and their associated items, because
+        # silently deleting items that were not selected would be confusing;
+        # furthermore, theoretically link items are allowed (at least in the
+        # back-end) to have their own children, which should be deleted too
+        # Copy the set, as do_update_link modifies it
+        linkids = set(back_links[filename].get(id_, ()))
+
+        if linkids:
+            for linkid in linkids:
+                do_update_link(filename, cursor, None, linkid)
+                hrows.append((linkid, 'link_update', description, None,
+                                                                    str(id_)))
+
+            broken.append((linkids, id_))
 
-            core_api.insert_history(filename, group, linkid, 'link_update',
-                                                description, None, str(id_))
+    core_api.give_connection(filename, qconn)
 
-            qconn = core_api.get_connection(filename)
-            cursor = qconn.cursor()
+    core_api.insert_history_many(filename, group, hrows)
 
-        core_api.give_connection(filename, qconn)
+    for id_, target in deleted:
+        delete_link_event.signal(filename=filename, id_=id_, oldtarget=target)
 
-        break_link_event.signal(filename=filename, ids=ids, oldtarget=id_)
-    else:
-        core_api.give_connection(filename, qconn)
+    for linkids, id_ in broken:
+        break_link_event.signal(filename=filename, ids=linkids, oldtarget=id_)
 
 
-def break_copied_links(filename, id_):
+def break_copied_links(filename, ids):
     # Breaking links in the CopyLinks table will not be stored in the history,
     # so this is useful only if undoing/redoing changes will warn the user and
     # break all the copied links
@@ -209,10 +263,11 @@ def break_copied_links(filename, id_):
         mconn = core_api.get_memory_connection()
         curm = mconn.cursor()
 
-        curm.execute(queries.copylinks_select_target, (id_, ))
+        for id_ in ids:
+            curm.execute(queries.copylinks_select_target, (id_, ))
 
-        for row in curm.fetchall():
-            curm.execute(queries.copylinks_update_id, (row['CL_id'], ))
+            for row in curm.fetchall():
+                curm.execute(queries.copylinks_update_id, (row['CL_id'], ))
 
         core_api.give_memory_connection(mconn)
 
@@ -226,19 +281,9 @@ def break_all_copied_links(filename):
 
 
 def find_link_target(filename, id_):
-    qconn = core_api.get_connection(filename)
-    cursor = qconn.cursor()
-    cursor.execute(queries.links_select_id, (id_, ))
-    core_api.give_connection(filename, qconn)
-
-    row = cursor.fetchone()
-
     # If it's a valid link return its target id; if it's a broken link
     # return None; if it's not a link return False
-    try:
-        return row['L_target']
-    except TypeError:
-        return False
+    return link_targets[filename].get(id_, False)
 
 
 def find_links_chain(filename, id_):
@@ -252,33 +297,19 @@ def find_links_chain(filename, id_):
 
 
 def find_broken_links(filename):
-    qconn = core_api.get_connection(filename)
-    cursor = qconn.cursor()
-    cursor.execute(queries.links_select_target, (None, ))
-    core_api.give_connection(filename, qconn)
-
-    return [row['L_id'] for row in cursor.fetchall()]
+    return sorted(back_links[filename].get(None, ()))
 
 
 def find_first_broken_link(filename):
-    qconn = core_api.get_connection(filename)
-    cursor = qconn.cursor()
-    cursor.execute(queries.links_select_target_broken)
-    core_api.give_connection(filename, qconn)
-
     try:
-        return row['L_id']
-    except TypeError:
+        return min(back_links[filename][None])
+    except KeyError:
         return None
 
 
 def find_back_links(filename, id_):
-    qconn = core_api.get_connection(filename)
-    cursor = qconn.cursor()
-    cursor.execute(queries.links_select_target, (id_, ))
-    core_api.give_connection(filename, qconn)
-
-    return [row['L_id'] for row in cursor.fetchall()]
+    # Return the ids sorted like the index of the Links table did
+    return sorted(back_links[filename].get(id_, ()))
 
 
 def copy_link(filename, id_):
@@ -303,24 +334,29 @@ def can_paste_safely(filename, exception):
         raise exception()
 
 
-def paste_link(filename, id_, oldid, group, description):
+def paste_links(filename, pitems, group, description):
+    # pitems is a list of (id_, oldid) tuples
     if filename in cdbs:
         mem = core_api.get_memory_connection()
         curm = mem.cursor()
-        curm.execute(queries.copylinks_select_id, (oldid, ))
+        curm.execute(queries.copylinks_select_all)
         core_api.give_memory_connection(mem)
-        row = curm.fetchone()
 
-        if row:
-            # Item is a link
-            if copypaste_api.get_copy_origin_filename() == filename:
-                # Pasting on the same database is always safe, although the
-                # link could have been broken by a deletion or a history change
-                target = row['CL_target']
-            else:
+        copied = dict(curm.fetchall())
+
+        for id_, oldid in pitems:
+            try:
+                target = copied[oldid]
+            except KeyError:
+                # Item is not a link
+                continue
+
+            if copypaste_api.get_copy_origin_filename() != filename:
                 # If pasting on a different database, the link must be broken,
                 # in fact even if the target is pasted too there's not a simple
                 # way of retrieving its new id
+                # Pasting on the same database is always safe, although the
+                # link could have been broken by a deletion or a history change
                 target = None
 
             upsert_link(filename, id_, target, group, description)
@@ -349,7 +385,7 @@ def handle_history_update(filename, action, jparams, hid, type_, itemid):
 def handle_history_delete(filename, action, jparams, hid, type_, itemid):
     qconn = core_api.get_connection(filename)
     cursor = qconn.cursor()
-    do_delete_link(cursor, itemid)
+    do_delete_link(filename, cursor, itemid)
     core_api.give_connection(filename, qconn)
 
     history_delete_event.signal(filename=filename, id_=itemid)
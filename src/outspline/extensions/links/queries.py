@@ -19,14 +19,15 @@
 links_create = ("CREATE TABLE Links (L_id INTEGER, "
                                        "L_target INTEGER)")
 
-links_select = 'SELECT * FROM Links'
-
-links_select_id = 'SELECT L_target FROM Links WHERE L_id=? LIMIT 1'
+# L_id is not the primary key of the table, so it needs its own index too
+# Both indexes include the other column, so that the queries can be answered
+# without reading the table rows
+links_create_index_id = 'CREATE INDEX Links_id ON Links (L_id, L_target)'
 
-links_select_target = 'SELECT L_id FROM Links WHERE L_target=?'
+links_create_index_target = ('CREATE INDEX Links_target ON Links '
+                                                        '(L_target, L_id)')
 
-links_select_target_broken = ('SELECT L_id FROM Links WHERE L_target=NULL '
-                              'LIMIT 1')
+links_select = 'SELECT * FROM Links'
 
 links_insert = 'INSERT INTO Links (L_id, L_target) VALUES (?, ?)'
 
@@ -41,7 +42,7 @@ copylinks_create = ("CREATE TABLE CopyLinks (CL_id INTEGER, "
 
 copylinks_select = 'SELECT CL_id FROM CopyLinks LIMIT 1'
 
-copylinks_select_id = 'SELECT CL_target FROM CopyLinks WHERE CL_id=?'
+copylinks_select_all = 'SELECT CL_id, CL_target FROM CopyLinks'
 
 copylinks_select_target = 'SELECT CL_id FROM CopyLinks WHERE CL_target=?'
 
@@ -41,13 +41,13 @@ class Main(object):
         core_api.bind_to_open_database_dirty(self._handle_open_database_dirty)
         core_api.bind_to_open_database(self._handle_open_database)
         core_api.bind_to_close_database(self._handle_close_database)
-        core_api.bind_to_insert_item(self._handle_insert_item)
-        core_api.bind_to_deleting_item(self._handle_delete_item)
+        core_api.bind_to_insert_items(self._handle_insert_items)
+        core_api.bind_to_deleting_items(self._handle_delete_items)
 
         if copypaste_api:
             copypaste_api.bind_to_copy_items(self._handle_copy_items)
             copypaste_api.bind_to_copy_item(self._handle_copy_item)
-            copypaste_api.bind_to_paste_item(self._handle_paste_item)
+            copypaste_api.bind_to_paste_items(self._handle_paste_items)
             copypaste_api.bind_to_safe_paste_check(
                                                 self._handle_safe_paste_check)
 
@@ -68,7 +68,8 @@ class Main(object):
             pass
         else:
             filename = kwargs['filename']
-            self.databases[filename] = items.Database(filename)
+            self.databases[filename] = items.Database(filename,
+                                            self.rules.footprint_handlers)
 
     def _handle_open_database(self, kwargs):
         filename = kwargs['filename']
@@ -86,17 +87,17 @@ class Main(object):
         except KeyError:
             pass
 
-    def _handle_insert_item(self, kwargs):
+    def _handle_insert_items(self, kwargs):
         try:
-            self.databases[kwargs['filename']].insert_item(kwargs['id_'],
+            self.databases[kwargs['filename']].insert_items(kwargs['items'],
                                         kwargs['group'], kwargs['description'])
         except KeyError:
             pass
 
-    def _handle_delete_item(self, kwargs):
+    def _handle_delete_items(self, kwargs):
         try:
-            self.databases[kwargs['filename']].delete_item_rules(kwargs['id_'],
-                        kwargs['text'], kwargs['group'], kwargs['description'])
+            self.databases[kwargs['filename']].delete_items_rules(
+                    kwargs['items'], kwargs['group'], kwargs['description'])
         except KeyError:
             pass
 
@@ -127,10 +128,10 @@ class Main(object):
         curm.execute(queries.copyrules_insert, record)
         core_api.give_memory_connection(mem)
 
-    def _handle_paste_item(self, kwargs):
+    def _handle_paste_items(self, kwargs):
         try:
-            self.databases[kwargs['filename']].paste_item_rules(kwargs['id_'],
-                    kwargs['oldid'], kwargs['group'], kwargs['description'])
+            self.databases[kwargs['filename']].paste_items_rules(
+                    kwargs['items'], kwargs['group'], kwargs['description'])
         except KeyError:
             pass
 
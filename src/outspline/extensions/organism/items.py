@@ -17,6 +17,10 @@
 # along with Outspline.  If not, see <http://www.gnu.org/licenses/>.
 
 import json
+import threading
+import bisect
+import heapq
+import itertools
 import time as time_
 
 from outspline.static.pyaux import timeaux
@@ -31,14 +35,28 @@ update_item_rules_conditional_event = Event()
 delete_item_rules_event = Event()
 history_insert_event = Event()
 history_update_event = Event()
+history_delete_event = Event()
 get_alarms_event = Event()
 
 
 class Database(object):
-    def __init__(self, filename):
+    def __init__(self, filename, footprint_handlers):
         self.filename = filename
+        self.index = RulesIndex(footprint_handlers)
+        # Decoded rules lists, {id_: (string, rules)}; they are shared by all
+        # the searches, so they must never be modified
+        # The cache is also used by the searches running on other threads
+        self.rules_cache = {}
+        self.rules_cache_lock = threading.Lock()
+        self.rules_cache_hits = 0
+        self.rules_cache_misses = 0
 
     def post_init(self):
+        for row in self.get_all_valid_item_rules():
+            id_ = row['R_id']
+            self.index.update(id_, self._decode_item_rules(id_,
+                                                            row['R_rules']))
+
         core_api.register_history_action_handlers(self.filename,
                                 'rules_insert', self._handle_history_insert,
                                 self._handle_history_delete)
@@ -58,8 +76,12 @@ class Database(object):
         cursor.execute(queries.rules_insert, (itemid, jparams))
         core_api.give_connection(filename, qconn)
 
+        rules = self.string_to_rules(jparams)
+        self.index.update(itemid, rules)
+        self._uncache_item_rules(itemid)
+
         history_insert_event.signal(filename=filename, id_=itemid,
-                                        rules=self.string_to_rules(jparams))
+                                                                rules=rules)
 
     # This method has to accept filename as the first argument, even though
     # it's part of this object
@@ -70,8 +92,12 @@ class Database(object):
         cursor.execute(queries.rules_update_id, (jparams, itemid))
         core_api.give_connection(filename, qconn)
 
+        rules = self.string_to_rules(jparams)
+        self.index.update(itemid, rules)
+        self._uncache_item_rules(itemid)
+
         history_update_event.signal(filename=filename, id_=itemid,
-                                        rules=self.string_to_rules(jparams))
+                                                                rules=rules)
 
     # This method has to accept filename as the first argument, even though
     # it's part of this object
@@ -82,16 +108,27 @@ class Database(object):
         cursor.execute(queries.rules_delete_id, (itemid, ))
         core_api.give_connection(filename, qconn)
 
-    def insert_item(self, id_, group, description='Insert item'):
+        self.index.remove(itemid)
+        self._uncache_item_rules(itemid)
+
+        history_delete_event.signal(filename=filename, id_=itemid)
+
+    def insert_items(self, iitems, group, description='Insert items'):
+        # iitems is a list of (id_, parent, text) tuples
         srules = self.rules_to_string([])
 
         qconn = core_api.get_connection(self.filename)
         cursor = qconn.cursor()
-        cursor.execute(queries.rules_insert, (id_, srules, ))
+        cursor.executemany(queries.rules_insert, [(id_, srules)
+                                            for id_, parent, text in iitems])
         core_api.give_connection(self.filename, qconn)
 
-        core_api.insert_history(self.filename, group, id_, 'rules_insert',
-                                                    description, srules, None)
+        for id_, parent, text in iitems:
+            self._uncache_item_rules(id_)
+
+        core_api.insert_history_many(self.filename, group, [(id_,
+                                'rules_insert', description, srules, None)
+                                for id_, parent, text in iitems])
 
     def update_item_rules(self, id_, rules, group,
                                             description='Update item rules'):
@@ -106,7 +143,12 @@ class Database(object):
     def _update_item_rules_no_event(self, id_, rules, group,
                                             description='Update item rules'):
         if isinstance(rules, list):
+            self.index.update(id_, rules)
             rules = self.rules_to_string(rules)
+        else:
+            self.index.update(id_, self.string_to_rules(rules))
+
+        self._uncache_item_rules(id_)
 
         qconn = core_api.get_connection(self.filename)
         cursor = qconn.cursor()
@@ -132,41 +174,78 @@ class Database(object):
 
         return cur.fetchone()
 
-    def paste_item_rules(self, id_, oldid, group, description):
+    def paste_items_rules(self, pitems, group, description):
+        # pitems is a list of (id_, oldid) tuples
         mem = core_api.get_memory_connection()
         curm = mem.cursor()
-        curm.execute(queries.copyrules_select_id, (oldid, ))
+        curm.execute(queries.copyrules_select_all)
         core_api.give_memory_connection(mem)
 
+        copied = dict(curm.fetchall())
+
+        # The rows of the pasted items have just been inserted by insert_items
+        # with the empty rules, so there is no need to read them back; most
+        # pasted items do not have rules anyway
+        unrules = self.rules_to_string([])
+        urows = []
+        hrows = []
+
+        for id_, oldid in pitems:
+            rules = copied[oldid]
+
+            if rules != unrules:
+                urows.append((rules, id_))
+                hrows.append((id_, 'rules_update', description, rules,
+                                                                    unrules))
+
+        qconn = core_api.get_connection(self.filename)
+        cursor = qconn.cursor()
+        cursor.executemany(queries.rules_update_id, urows)
+        core_api.give_connection(self.filename, qconn)
+
+        for rules, id_ in urows:
+            self.index.update(id_, self.string_to_rules(rules))
+            self._uncache_item_rules(id_)
+
         # Do not signal update_item_rules_conditional_event because it's
         # handled by organism_timer.timer.NextOccurrencesEngine, and it would
         # slow down the pasting of items a lot; NextOccurrencesEngine is bound
         # anyway to copypaste_api.bind_to_items_pasted
-        self._update_item_rules_no_event(id_, curm.fetchone()['CR_rules'],
-                                                            group, description)
+        core_api.insert_history_many(self.filename, group, hrows)
 
-    def delete_item_rules(self, id_, text, group,
-                                            description='Delete item rules'):
+    def delete_items_rules(self, ditems, group,
+                                            description='Delete items rules'):
+        # ditems is a list of (id_, parent, text) tuples
         qconn = core_api.get_connection(self.filename)
         cursor = qconn.cursor()
+        hrows = []
 
-        cursor.execute(queries.rules_select_id, (id_, ))
-        sel = cursor.fetchone()
+        for id_, parent, text in ditems:
+            cursor.execute(queries.rules_select_id, (id_, ))
+            sel = cursor.fetchone()
 
-        # The query should always return a result, so sel should never be None
-        current_rules = sel['R_rules']
+            # The query should always return a result, so sel should never be
+            # None
+            hrows.append((id_, 'rules_delete', description, None,
+                                                            sel['R_rules']))
 
-        cursor.execute(queries.rules_delete_id, (id_, ))
+        cursor.executemany(queries.rules_delete_id, [(id_, )
+                                            for id_, parent, text in ditems])
 
         core_api.give_connection(self.filename, qconn)
 
-        core_api.insert_history(self.filename, group, id_, 'rules_delete',
-                                            description, None, current_rules)
+        for id_, parent, text in ditems:
+            self.index.remove(id_)
+            self._uncache_item_rules(id_)
+
+        core_api.insert_history_many(self.filename, group, hrows)
 
-        delete_item_rules_event.signal(filename=self.filename, id_=id_,
+        for id_, parent, text in ditems:
+            delete_item_rules_event.signal(filename=self.filename, id_=id_,
                                                                     text=text)
 
     def get_item_rules(self, id_):
+        # Always read the row: the cache only avoids decoding it again
         qconn = core_api.get_connection(self.filename)
         cursor = qconn.cursor()
         cursor.execute(queries.rules_select_id, (id_, ))
@@ -174,7 +253,77 @@ class Database(object):
         core_api.give_connection(self.filename, qconn)
 
         # The query should always return a result, so row should never be None
-        return self.string_to_rules(row['R_rules'])
+        return self._decode_item_rules(id_, row['R_rules'])
+
+    def get_item_rules_range(self, mint, maxt):
+        # Only return the rules of the items that can have occurrences in the
+        # [mint, maxt] range, as reported by the index; the rows are still
+        # read with a single query, but only the candidates are decoded
+        candidates = set(self.get_item_ids_range(mint, maxt))
+
+        return [(row['R_id'], self._decode_item_rules(row['R_id'],
+                                                            row['R_rules']))
+                            for row in self._read_all_valid_item_rules()
+                            if row['R_id'] in candidates]
+
+    def get_item_ids_range(self, mint, maxt):
+        return self.index.get_candidates(mint, maxt)
+
+    def get_all_valid_decoded_item_rules(self):
+        return [(row['R_id'], self._decode_item_rules(row['R_id'],
+                                                            row['R_rules']))
+                            for row in self._read_all_valid_item_rules()]
+
+    def _read_all_valid_item_rules(self):
+        # The occurrences searches read the rules from a copy of the table, so
+        # that they don't compete for the connection of the database with the
+        # interface, see core_api.get_reader_connection
+        # Don't iterate directly over the cursor, otherwise another search
+        # could be given the same reader connection while the loop is still
+        # reading it
+        rconn = core_api.get_reader_connection(self.filename, ('Rules', ))
+        cursor = rconn.cursor()
+        cursor.execute(queries.rules_select_all, (self.rules_to_string([]), ))
+        rows = cursor.fetchall()
+        core_api.give_reader_connection(self.filename, rconn)
+
+        return rows
+
+    def _decode_item_rules(self, id_, string):
+        # The cached rules are used only if they were decoded from the same
+        # string, otherwise a search that read the row before it was updated
+        # could cache the old rules after they were uncached
+        with self.rules_cache_lock:
+            try:
+                cstring, rules = self.rules_cache[id_]
+            except KeyError:
+                pass
+            else:
+                if cstring == string:
+                    self.rules_cache_hits += 1
+                    return rules
+
+            self.rules_cache_misses += 1
+
+        rules = self.string_to_rules(string)
+
+        with self.rules_cache_lock:
+            self.rules_cache[id_] = (string, rules)
+
+        return rules
+
+    def _uncache_item_rules(self, id_):
+        with self.rules_cache_lock:
+            try:
+                del self.rules_cache[id_]
+            except KeyError:
+                pass
+
+    def get_rules_cache_stats(self):
+        with self.rules_cache_lock:
+            return {'hits': self.rules_cache_hits,
+                    'misses': self.rules_cache_misses,
+                    'size': len(self.rules_cache)}
 
     def get_all_valid_item_rules(self):
         qconn = core_api.get_connection(self.filename)
@@ -207,6 +356,7 @@ class Database(object):
 class Rules(object):
     def __init__(self):
         self.handlers = {}
+        self.footprint_handlers = {}
 
     def install_rule_handler(self, rulename, handler):
         # The rules should be installed separately for each database (bug #330)
@@ -215,21 +365,485 @@ class Rules(object):
         else:
             raise ConflictingRuleHandlerError()
 
+    def install_rule_footprint_handler(self, rulename, handler):
+        if rulename not in self.footprint_handlers:
+            self.footprint_handlers[rulename] = handler
+        else:
+            raise ConflictingRuleHandlerError()
+
+
+class RulesIndex(object):
+    # The footprint handlers must accept a rule and return a list of
+    # (start, end, period) windows: the rule can only produce occurrences
+    # (start, end or alarm times) falling in [start + k * period,
+    # end + k * period], where k is any integer if period is set, or only 0 if
+    # period is None; except rules, which never produce occurrences, should
+    # return an empty list
+    # If a rule has no footprint handler, its item is considered a candidate
+    # for any range
+    def __init__(self, footprint_handlers):
+        self.handlers = footprint_handlers
+        # {id_: [(start, end, id_), ...]}
+        self.items = {}
+        # Sorted list of the (start, end, id_) windows of all the items
+        self.bounded = []
+        # The windows in self.bounded are at most this long; it is never
+        # reduced when windows are removed, which is only less selective
+        self.maxspan = 0
+        # {id_: [(start, end, period), ...]}
+        self.periodic = {}
+        self.unbounded = set()
+        # The index is updated on the main thread, but also queried by the
+        # searches running on other threads
+        self.lock = threading.Lock()
+
+    def update(self, id_, rules):
+        with self.lock:
+            self._remove(id_)
+            self._update(id_, rules)
+
+    def _update(self, id_, rules):
+        bounded = []
+        periodic = []
+
+        for rule in rules:
+            try:
+                handler = self.handlers[rule['rule']]
+            except KeyError:
+                self.unbounded.add(id_)
+                return
+
+            for start, end, period in handler(rule):
+                if period is None:
+                    bounded.append((start, end, id_))
+                elif end - start >= period:
+                    # The windows cover all the time line
+                    self.unbounded.add(id_)
+                    return
+                else:
+                    periodic.append((start, end, period))
+
+        if bounded:
+            self.items[id_] = bounded
+
+            for window in bounded:
+                bisect.insort(self.bounded, window)
+                self.maxspan = max(self.maxspan, window[1] - window[0])
+
+        if periodic:
+            self.periodic[id_] = periodic
+
+    def remove(self, id_):
+        with self.lock:
+            self._remove(id_)
+
+    def _remove(self, id_):
+        self.unbounded.discard(id_)
+
+        try:
+            del self.periodic[id_]
+        except KeyError:
+            pass
+
+        try:
+            bounded = self.items.pop(id_)
+        except KeyError:
+            pass
+        else:
+            for window in bounded:
+                del self.bounded[bisect.bisect_left(self.bounded, window)]
+
+    def get_candidates(self, mint, maxt):
+        with self.lock:
+            return self._get_candidates(mint, maxt)
+
+    def _get_candidates(self, mint, maxt):
+        candidates = set(self.unbounded)
+
+        # A window can intersect the range only if it starts not earlier than
+        # mint - self.maxspan
+        i = bisect.bisect_left(self.bounded, (mint - self.maxspan, ))
+
+        for start, end, id_ in self.bounded[i:]:
+            if start > maxt:
+                break
+
+            if end >= mint:
+                candidates.add(id_)
+
+        for id_, windows in self.periodic.iteritems():
+            for start, end, period in windows:
+                # Find the first repetition of the window that does not end
+                # before mint, and check that it does not start after maxt
+                k = (end - mint) // period * -1
+
+                if start + k * period <= maxt:
+                    candidates.add(id_)
+                    break
+
+        return sorted(candidates)
+
+
+class ItemOccurrences(object):
+    # The occurrences of an item as parallel lists sorted by start time;
+    #  alarmids stores None for the occurrences that don't come from an
+    #  active or snoozed alarm
+    __slots__ = ('starts', 'ends', 'alarms', 'alarmids', 'maxspan',
+                                                                    'version')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.alarms = []
+        self.alarmids = []
+        # The greatest end - start difference, used to bound the search of
+        #  the occurrences that contain a given time; it is not decreased when
+        #  occurrences are removed, so it is only an upper bound
+        self.maxspan = 0
+        self.version = None
+
+    def __len__(self):
+        return len(self.starts)
+
+    def copy(self):
+        item = ItemOccurrences()
+        item.starts = self.starts[:]
+        item.ends = self.ends[:]
+        item.alarms = self.alarms[:]
+        item.alarmids = self.alarmids[:]
+        item.maxspan = self.maxspan
+        return item
+
+    def insert(self, start, end, alarm, alarmid):
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.ends.insert(i, end)
+        self.alarms.insert(i, alarm)
+        self.alarmids.insert(i, alarmid)
+
+        if end is not None:
+            self.maxspan = max((self.maxspan, end - start))
+
+    def extend(self, starts, ends, alarms, alarmids):
+        # The new occurrences are usually already sorted and later than the
+        #  existing ones, in which case they don't need to be sorted again
+        insorted = not self.starts or not starts or \
+                                                starts[0] >= self.starts[-1]
+
+        self.starts.extend(starts)
+        self.ends.extend(ends)
+        self.alarms.extend(alarms)
+        self.alarmids.extend(alarmids)
+
+        spans = [end - start for start, end in zip(starts, ends)
+                                                            if end is not None]
+
+        if spans:
+            self.maxspan = max((self.maxspan, max(spans)))
+
+        if not insorted or starts != sorted(starts):
+            # sorted is stable, so the occurrences with the same start time
+            #  keep their insertion order
+            rows = sorted(zip(self.starts, self.ends, self.alarms,
+                                    self.alarmids), key=lambda row: row[0])
+            self.starts[:], self.ends[:], self.alarms[:], \
+                                        self.alarmids[:] = zip(*rows)
+
+    def find(self, start, end, alarm, alarmid, match_alarmid=True):
+        i = bisect.bisect_left(self.starts, start)
+
+        while i < len(self.starts) and self.starts[i] == start:
+            if self.ends[i] == end and self.alarms[i] == alarm and \
+                            (not match_alarmid or self.alarmids[i] == alarmid):
+                return i
+
+            i += 1
+
+        return None
+
+    def delete(self, indices):
+        # indices must be sorted; delete the runs of consecutive indices
+        #  starting from the last one, so that the others remain valid
+        runs = []
+
+        for i in indices:
+            if runs and runs[-1][1] == i:
+                runs[-1][1] = i + 1
+            else:
+                runs.append([i, i + 1])
+
+        for first, last in reversed(runs):
+            del self.starts[first:last]
+            del self.ends[first:last]
+            del self.alarms[first:last]
+            del self.alarmids[first:last]
+
+    def except_(self, windows, inclusive):
+        # Return the sorted indices of the occurrences excepted by any of the
+        #  (start, end) windows
+        starts = self.starts
+        ends = self.ends
+        excepted = set()
+
+        for wstart, wend in windows:
+            # The occurrences with wstart <= start <= wend
+            excepted.update(xrange(bisect.bisect_left(starts, wstart),
+                                        bisect.bisect_right(starts, wend)))
+
+            # Occurrences with wstart == end shouldn't be excepted, as
+            #  they're not considered part of the end minute
+            if inclusive:
+                # The occurrences with start <= wstart < end
+                for i in xrange(bisect.bisect_left(starts,
+                                                    wstart - self.maxspan),
+                                        bisect.bisect_right(starts, wstart)):
+                    # end could be None
+                    if wstart < ends[i]:
+                        excepted.add(i)
+
+        return sorted(excepted)
+
+    def get_time_span(self):
+        # This assumes that start <= end; the ends could be None
+        return (self.starts[0], max((self.starts[-1], max(self.ends))))
+
+    def get_completion_time(self):
+        # The ends and alarms could be None, and the alarms also False
+        return min([t for t in map(max, self.ends, self.starts, self.alarms)
+                                                                if t] or [None])
+
+    def get_list(self, filename, id_):
+        occs = []
+
+        for start, end, alarm, alarmid in zip(self.starts, self.ends,
+                                                self.alarms, self.alarmids):
+            occ = {'filename': filename,
+                   'id_': id_,
+                   'start': start,
+                   'end': end,
+                   'alarm': alarm}
+
+            if alarmid is not None:
+                occ['alarmid'] = alarmid
+
+            occs.append(occ)
+
+        return occs
+
+
+class OccurrencesTable(object):
+    # Compact storage for the occurrences found by the searches: instead of a
+    #  dictionary for every occurrence, the occurrences of each item are kept
+    #  in an ItemOccurrences object; the occurrence dictionaries are only
+    #  built when the consumers request them
+    def __init__(self):
+        self.items = {}
+        self.count = 0
+        # Heap of (completion time, version, filename, id_) tuples; the
+        #  entries whose version doesn't match the item's one are obsolete and
+        #  are just discarded when found
+        self.ctimes = []
+        self.changed = set()
+        self.versions = itertools.count()
+
+    def _get_item(self, filename, id_):
+        try:
+            return self.items[filename][id_]
+        except KeyError:
+            try:
+                fitems = self.items[filename]
+            except KeyError:
+                fitems = self.items[filename] = {}
+
+            item = fitems[id_] = ItemOccurrences()
+            return item
+
+    def _forget_empty_item(self, filename, id_):
+        if not self.items[filename][id_]:
+            del self.items[filename][id_]
+
+            if not self.items[filename]:
+                del self.items[filename]
+
+    def add(self, occ):
+        filename = occ['filename']
+        id_ = occ['id_']
+
+        self._get_item(filename, id_).insert(occ['start'], occ['end'],
+                                            occ['alarm'], occ.get('alarmid'))
+        self.count += 1
+        self.changed.add((filename, id_))
+
+    def extend(self, filename, id_, starts, ends, alarms):
+        if starts:
+            self._get_item(filename, id_).extend(starts, ends, alarms,
+                                                        [None] * len(starts))
+            self.count += len(starts)
+            self.changed.add((filename, id_))
+
+    def merge(self, filename, id_, ioccs):
+        # ioccs is an ItemOccurrences object, e.g. as returned by
+        #  self.get_item_occurrences
+        if ioccs:
+            self._get_item(filename, id_).extend(ioccs.starts, ioccs.ends,
+                                                ioccs.alarms, ioccs.alarmids)
+            self.count += len(ioccs)
+            self.changed.add((filename, id_))
+
+    def replace_alarm(self, filename, id_, start, end, origalarm, alarm,
+                                                                    alarmid):
+        # Replace the alarm of the occurrence that has the given start, end
+        #  and original alarm times, and that doesn't come from an alarm yet
+        try:
+            item = self.items[filename][id_]
+        except KeyError:
+            return False
+
+        i = item.find(start, end, origalarm, None)
+
+        if i is None:
+            return False
+        else:
+            item.alarms[i] = alarm
+            item.alarmids[i] = alarmid
+            self.changed.add((filename, id_))
+            return True
+
+    def remove_one(self, filename, id_, start, end, alarm):
+        try:
+            item = self.items[filename][id_]
+        except KeyError:
+            return False
+
+        i = item.find(start, end, alarm, None, match_alarmid=False)
+
+        if i is None:
+            return False
+        else:
+            item.delete((i, ))
+            self.count -= 1
+            self.changed.add((filename, id_))
+            self._forget_empty_item(filename, id_)
+            return True
+
+    def except_(self, filename, id_, windows, inclusive):
+        try:
+            item = self.items[filename][id_]
+        except KeyError:
+            return
+
+        excepted = item.except_(windows, inclusive)
+
+        if excepted:
+            item.delete(excepted)
+            self.count -= len(excepted)
+            self.changed.add((filename, id_))
+            self._forget_empty_item(filename, id_)
+
+    def get_count(self):
+        return self.count
+
+    def get_item_occurrences(self, filename, id_):
+        # Return a copy of the ItemOccurrences object of the item, or None
+        try:
+            return self.items[filename][id_].copy()
+        except KeyError:
+            return None
+
+    def get_item_time_span(self, filename, id_):
+        try:
+            item = self.items[filename][id_]
+        except KeyError:
+            return False
+        else:
+            return item.get_time_span()
+
+    def get_next_completion_time(self):
+        for filename, id_ in self.changed:
+            try:
+                item = self.items[filename][id_]
+            except KeyError:
+                # The item has no occurrences anymore, its entries in the
+                #  heap will be discarded because the item is not found
+                pass
+            else:
+                item.version = next(self.versions)
+                ctime = item.get_completion_time()
+
+                if ctime is not None:
+                    heapq.heappush(self.ctimes, (ctime, item.version,
+                                                                filename, id_))
+
+        self.changed.clear()
+
+        while self.ctimes:
+            ctime, version, filename, id_ = self.ctimes[0]
+
+            try:
+                item = self.items[filename][id_]
+            except KeyError:
+                heapq.heappop(self.ctimes)
+            else:
+                if item.version != version:
+                    heapq.heappop(self.ctimes)
+                else:
+                    return ctime
+
+        return None
+
+    def get_dict(self):
+        # The dictionary is built on request, and it can be modified freely by
+        #  the caller
+        return {filename: {id_: item.get_list(filename, id_)
+                                    for id_, item in fitems.iteritems()}
+                                for filename, fitems in self.items.iteritems()}
+
+    def get_list(self):
+        occsl = []
+
+        for filename, fitems in self.items.iteritems():
+            for id_, item in fitems.iteritems():
+                occsl.extend(item.get_list(filename, id_))
+
+        return occsl
+
 
 class OccurrencesRange(object):
     def __init__(self, mint, maxt):
         self.mint = mint
         self.maxt = maxt
-        self.dict_ = {}
+        self.occs = OccurrencesTable()
         self.actd = {}
 
     def update(self, occ, origalarm):
-        return self._update(self.dict_, self.add_safe, self._replace, occ,
-                                                                     origalarm)
+        if self.occs.replace_alarm(occ['filename'], occ['id_'], occ['start'],
+                            occ['end'], origalarm, occ['alarm'],
+                            occ['alarmid']):
+            return True
+        else:
+            return self.add_safe(occ)
 
     def move_active(self, occ, origalarm):
-        return self._update(self.actd, self.add_active, self._move, occ,
-                                                                     origalarm)
+        filename = occ['filename']
+        id_ = occ['id_']
+
+        oocc = occ.copy()
+        oocc['alarm'] = origalarm
+        del oocc['alarmid']
+
+        try:
+            self.actd[filename][id_]
+        except KeyError:
+            return self.add_active(occ)
+        else:
+            try:
+                i = self.actd[filename][id_].index(oocc)
+            except ValueError:
+                return self.add_active(occ)
+            else:
+                del self.actd[filename][id_][i]
+                self.add_active(occ)
+                return True
 
     def add(self, occ):
         # Make sure this occurrence is compliant with the requirements defined
@@ -246,60 +860,46 @@ class OccurrencesRange(object):
         if self.mint <= occ['start'] <= self.maxt or \
                    (occ['end'] and occ['start'] <= self.mint < occ['end']) or \
                      (occ['alarm'] and self.mint <= occ['alarm'] <= self.maxt):
-            self._add(self.dict_, occ)
+            self.occs.add(occ)
             return True
         else:
             return False
 
-    def add_active(self, occ):
-        # This method must accept the same arguments as self.add
-        return self._add(self.actd, occ)
+    def add_safe_many(self, filename, id_, starts, ends, alarms):
+        # Like add_safe, for several occurrences of the same item, given as
+        # parallel lists of start, end and alarm times, preferably sorted by
+        # start time; return the number of added occurrences
+        mint = self.mint
+        maxt = self.maxt
+        rows = [(start, end, alarm) for start, end, alarm in zip(starts, ends,
+                                                                    alarms)
+                if mint <= start <= maxt or (end and start <= mint < end) or
+                                        (alarm and mint <= alarm <= maxt)]
 
-    def _update(self, occsd, add, action, occ, origalarm):
-        filename = occ['filename']
-        id_ = occ['id_']
+        if len(rows) < len(starts):
+            starts, ends, alarms = [list(column) for column in zip(*rows)
+                                                    ] if rows else ([], [], [])
 
-        oocc = occ.copy()
-        oocc['alarm'] = origalarm
-        del oocc['alarmid']
+        self.occs.extend(filename, id_, starts, ends, alarms)
 
-        try:
-            occsd[filename][id_]
-        except KeyError:
-            return add(occ)
-        else:
-            try:
-                i = occsd[filename][id_].index(oocc)
-            except ValueError:
-                return add(occ)
-            else:
-                action(occsd[filename][id_], i, occ)
-                return True
+        return len(rows)
 
-    def _add(self, occsd, occ):
+    def add_active(self, occ):
+        # This method must accept the same arguments as self.add
         filename = occ['filename']
         id_ = occ['id_']
 
         try:
-            occsd[filename][id_]
+            self.actd[filename][id_]
         except KeyError:
             try:
-                occsd[filename]
+                self.actd[filename]
             except KeyError:
-                occsd[filename] = {}
-
-            occsd[filename][id_] = []
-
-        occsd[filename][id_].append(occ)
+                self.actd[filename] = {}
 
-    def _replace(self, ioccs, i, occ):
-        # This method must accept the same arguments as self._move
-        ioccs[i] = occ
+            self.actd[filename][id_] = []
 
-    def _move(self, ioccs, i, occ):
-        # This method must accept the same arguments as self._replace
-        del ioccs[i]
-        self.add_active(occ)
+        self.actd[filename][id_].append(occ)
 
     def except_(self, filename, id_, start, end, inclusive):
         # Make sure this call is compliant with the requirements defined in
@@ -311,42 +911,30 @@ class OccurrencesRange(object):
 
     def except_safe(self, filename, id_, start, end, inclusive):
         # If an except rule is put at the start of the rules list for an item,
-        # self.dict_[filename][id_] wouldn't exist yet; note that if the item
-        # is the first one being processed in the database, even
-        # self.dict_[filename] wouldn't exist
+        # the item wouldn't have any occurrences yet
         # This way the except rule is of course completely useless, however if
         # the user has to be warned at all, it must be done in the interface
         # when he saves the rules list, not here, where the exception has to be
         # just silenced
-        try:
-            dc = self.dict_[filename][id_][:]
-        except KeyError:
-            pass
-        else:
-            for o in dc:
-                # Occurrences with start == o['end'] shouldn't be excepted, as
-                # they're not considered part of the end minute
-                if start <= o['start'] <= end or \
-                                (inclusive and o['start'] <= start < o['end']):
-                    self.dict_[filename][id_].remove(o)
-                    if not self.dict_[filename][id_]:
-                        del self.dict_[filename][id_]
-                        if not self.dict_[filename]:
-                            del self.dict_[filename]
+        self.occs.except_(filename, id_, ((start, end), ), inclusive)
+
+    def except_safe_many(self, filename, id_, windows, inclusive):
+        # Like except_safe, for several (start, end) except windows of the
+        # same item at once
+        self.occs.except_(filename, id_, windows, inclusive)
 
     def get_dict(self):
-        return self.dict_
+        return self.occs.get_dict()
 
     def get_active_dict(self):
         return self.actd
 
+    def get_count(self):
+        # Note that this method ignores self.actd _deliberately_
+        return self.occs.get_count()
+
     def get_list(self):
-        occsl = []
-        for f in self.dict_:
-            for i in self.dict_[f]:
-                for o in self.dict_[f][i]:
-                    occsl.append(o)
-        return occsl
+        return self.occs.get_list()
 
     def get_active_list(self):
         occsl = []
@@ -358,34 +946,11 @@ class OccurrencesRange(object):
 
     def get_next_completion_time(self):
         # Note that this method ignores self.actd _deliberately_
-        ctime = None
-        for f in self.dict_:
-            for i in self.dict_[f]:
-                for o in self.dict_[f][i]:
-                    t = max((o['end'], o['start'], o['alarm']))
-                    if t and (not ctime or t < ctime):
-                        ctime = t
-        return ctime
+        return self.occs.get_next_completion_time()
 
     def get_item_time_span(self, filename, id_):
         # Note that this method ignores self.actd _deliberately_
-        try:
-            occs = self.dict_[filename][id_]
-        except KeyError:
-            return False
-        else:
-            # The final minstart and maxend should never end up being None
-            minstart = occs[0]['start']
-            # Initialize maxend to minstart, which is surely != None
-            maxend = minstart
-
-            for occ in occs:
-                # This assumes that start <= end
-                minstart = min((minstart, occ['start']))
-                # occ['end'] could be None
-                maxend = max((occ['start'], occ['end'], maxend))
-
-            return (minstart, maxend)
+        return self.occs.get_item_time_span(filename, id_)
 
 
 class OccurrencesRangeSearchStop(UserWarning):
@@ -402,7 +967,9 @@ class OccurrencesRangeSearch(object):
         self.databases = databases
         self.rule_handlers = rule_handlers
         self.occs = OccurrencesRange(mint, maxt)
-        self.utcoffset = timeaux.UTCOffset()
+        # The rule handlers can compute sequences of offsets in the range
+        #  in batches with self.utcoffset.compute_sequence
+        self.utcoffset = timeaux.UTCOffsetTable(mint, maxt)
         self.utcmint = mint - self.utcoffset.compute(mint)
         self._search_item = self._search_item_continue
 
@@ -415,25 +982,19 @@ class OccurrencesRangeSearch(object):
             # Note that Main.databases could also change size during the
             #  search, so it should be copied to iterate in it
             for filename in self.filenames:
-                # Don'd iterate directly over the returned cursor, but use a
-                # fetchall, otherwise if the application is closed while the
-                # search is on (e.g. while searching the old alarms) an
-                # exception will be raised, because the database will be closed
-                # while the loop is still reading it
-                rows = self.databases[filename].get_all_valid_item_rules(
-                                                                ).fetchall()
-
-                for row in rows:
-                    id_ = row['R_id']
-                    rules = Database.string_to_rules(row['R_rules'])
-
-                    for rule in rules:
-                        self._search_item(filename, id_, rule)
-
-                # Get active alarms *after* all occurrences, to avoid except
-                # rules
-                get_alarms_event.signal(mint=self.mint, maxt=self.maxt,
-                                            filename=filename, occs=self.occs)
+                # Only the items that can have occurrences in the range are
+                # returned; note that the rows are fetched all at once,
+                # otherwise if the application is closed while the search is
+                # on (e.g. while searching the old alarms) an exception will be
+                # raised, because the database will be closed while the loop is
+                # still reading it
+                rows = self.databases[filename].get_item_rules_range(
+                                                        self.mint, self.maxt)
+
+                for id_, rules in rows:
+                    self.search_item(filename, id_, rules)
+
+                self.end_database(filename)
 
         # All loops must be broken
         except OccurrencesRangeSearchStop:
@@ -443,6 +1004,23 @@ class OccurrencesRangeSearch(object):
                                             time_.time() - search_start[0],
                                             time_.clock() - search_start[1]))
 
+    def get_item_ids(self, filename):
+        # Return the ids of the items of the database that can have
+        #  occurrences in the range
+        # This and the following methods let other searches go through the
+        #  rules of the databases only once, while also searching the range
+        return self.databases[filename].get_item_ids_range(self.mint,
+                                                                    self.maxt)
+
+    def search_item(self, filename, id_, rules):
+        for rule in rules:
+            self._search_item(filename, id_, rule)
+
+    def end_database(self, filename):
+        # Get active alarms *after* all occurrences, to avoid except rules
+        get_alarms_event.signal(mint=self.mint, maxt=self.maxt,
+                                            filename=filename, occs=self.occs)
+
     def stop(self):
         self._search_item = self._search_item_stop
 
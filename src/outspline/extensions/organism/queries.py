@@ -38,7 +38,7 @@ copyrules_create = ("CREATE TABLE CopyRules (CR_id INTEGER, "
 
 copyrules_select = 'SELECT CR_id FROM CopyRules WHERE CR_rules!=? LIMIT 1'
 
-copyrules_select_id = 'SELECT CR_rules FROM CopyRules WHERE CR_id=?'
+copyrules_select_all = 'SELECT CR_id, CR_rules FROM CopyRules'
 
 copyrules_insert = 'INSERT INTO CopyRules (CR_id, CR_rules) VALUES (?, ?)'
 
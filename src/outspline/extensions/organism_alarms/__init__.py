@@ -54,8 +54,8 @@ class Main(object):
         core_api.bind_to_history_clean(self._handle_history_clean)
 
         # Do not bind directly to core_api.bind_to_deleted_item because it
-        # would create a race hazard with organism.items.delete_item_rules,
-        # which is bound to the same event
+        # would create a race hazard with organism.items.delete_items_rules,
+        # which handles the deletion of the same items
         organism_api.bind_to_delete_item_rules(self._handle_delete_item_rules)
         organism_api.bind_to_get_alarms(self._handle_get_alarms)
 
@@ -71,7 +71,7 @@ class Main(object):
         if copypaste_api:
             copypaste_api.bind_to_copy_items(self._handle_copy_items)
             copypaste_api.bind_to_copy_item(self._handle_copy_item)
-            copypaste_api.bind_to_paste_item(self._handle_paste_item)
+            copypaste_api.bind_to_paste_items(self._handle_paste_items)
             copypaste_api.bind_to_safe_paste_check(
                                                 self._handle_safe_paste_check)
 
@@ -127,10 +127,9 @@ class Main(object):
         except KeyError:
             pass
 
-    def _handle_paste_item(self, kwargs):
+    def _handle_paste_items(self, kwargs):
         try:
-            self.databases[kwargs['filename']].paste_alarms(kwargs['id_'],
-                                                            kwargs['oldid'])
+            self.databases[kwargs['filename']].paste_alarms(kwargs['items'])
         except KeyError:
             pass
 
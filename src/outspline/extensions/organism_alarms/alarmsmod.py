@@ -26,6 +26,7 @@ import outspline.extensions.organism_timer_api as organism_timer_api
 import queries
 
 alarm_event = Event()
+alarms_event = Event()
 alarm_off_event = Event()
 activate_alarms_range_event = Event()
 activate_alarms_range_end_event = Event()
@@ -35,7 +36,9 @@ class Database(object):
     def __init__(self, filename, choose_unique_old_alarms):
         self.filename = filename
         self.choose_unique_old_alarms = choose_unique_old_alarms
-        self.changes = None
+        # The number of changes made to the Alarms table since the database
+        # was last opened or saved: all the changes go through this class
+        self.changes = 0
         self.modified_state = False
         self.old_alarms_lock = threading.Lock()
         # A first call to acquire is needed to set the state to unlocked
@@ -147,15 +150,20 @@ class Database(object):
         self._activate_alarms_all(occsd)
 
     def _activate_alarms_all(self, occsd):
+        alarms = []
+
         for id_ in occsd:
             # Due to race conditions, id_ could have been deleted meanwhile
             # (e.g. if the modal dialog for deleting the item was open in the
             # interface)
             if core_api.is_item(self.filename, id_):
-                for occ in occsd[id_]:
-                    self._activate_alarm(occ)
+                alarms.extend(occsd[id_])
+
+        self._activate_alarms(alarms)
 
     def _activate_alarms_unique(self, occsd):
+        alarms = []
+
         for id_ in occsd:
             # Due to race conditions, id_ could have been deleted meanwhile
             # (e.g. if the modal dialog for deleting the item was open in the
@@ -168,9 +176,13 @@ class Database(object):
                     # self.activate_alarms_range
                     pass
                 else:
-                    self._activate_alarm(occ)
+                    alarms.append(occ)
+
+        self._activate_alarms(alarms)
 
     def activate_alarms(self, time, occsd):
+        alarms = []
+
         for id_ in occsd:
             # Due to race conditions, id_ could have been deleted meanwhile
             # (e.g. if the modal dialog for deleting the item was open in the
@@ -179,38 +191,67 @@ class Database(object):
                 for occ in occsd[id_]:
                     # occ may have start or end == time
                     if occ['alarm'] == time:
-                        self._activate_alarm(occ)
+                        alarms.append(occ)
+
+        self._activate_alarms(alarms)
 
-    def _activate_alarm(self, alarm):
+    def _activate_alarms(self, alarms):
         # If one of the loops that call this method lasts long enough (and
         # the're not run on the main thread), the database may be closed
         # meanwhile; however this function seems to terminate safely without
         # the need of further tests here
-        if 'alarmid' not in alarm:
-            alarmid = self._insert_alarm(id_=alarm['id_'],
-                                   start=alarm['start'],
-                                   end=alarm['end'],
-                                   origalarm=alarm['alarm'],
-                                   # Note that here passing None is correct (do
-                                   # not pass False)
-                                   snooze=None)
-        else:
-            alarmid = alarm['alarmid']
-            # Occurrence dictionaries store active alarms with False, not None
-            if alarm['alarm']:
-                filename = alarm['filename']
-                qconn = core_api.get_connection(filename)
-                cursor = qconn.cursor()
-                # Note that here using None is correct (do not use False)
-                cursor.execute(queries.alarms_update_id, (None, alarmid))
-                core_api.give_connection(filename, qconn)
+        if not alarms:
+            return
+
+        newalarms = [(alarm['id_'], alarm['start'], alarm['end'],
+                                # Note that here passing None is correct (do
+                                # not pass False)
+                                alarm['alarm'], None) for alarm in alarms
+                                if 'alarmid' not in alarm]
+        # Occurrence dictionaries store active alarms with False, not None
+        # Note that here using None is correct (do not use False)
+        snoozedalarms = [(None, alarm['alarmid']) for alarm in alarms
+                                    if 'alarmid' in alarm and alarm['alarm']]
+
+        qconn = core_api.get_connection(self.filename)
+        cursor = qconn.cursor()
+
+        if newalarms:
+            cursor.executemany(queries.alarms_insert, newalarms)
+            # executemany doesn't set cursor.lastrowid; since the connection
+            # is not released in the meantime and the ids are not specified,
+            # SQLite assigns consecutive ids to the inserted rows, each one
+            # larger than the largest id in the table
+            cursor.execute(queries.alarms_select_last_id)
+            lastid = cursor.fetchone()[0]
+            newids = iter(xrange(lastid - len(newalarms) + 1, lastid + 1))
+
+        if snoozedalarms:
+            cursor.executemany(queries.alarms_update_id, snoozedalarms)
+
+        core_api.give_connection(self.filename, qconn)
+        self.changes += len(newalarms) + len(snoozedalarms)
+
+        activated = []
+
+        for alarm in alarms:
+            try:
+                alarmid = alarm['alarmid']
+            except KeyError:
+                alarmid = next(newids)
+
+            alarmd = {'id_': alarm['id_'],
+                      'alarmid': alarmid,
+                      'start': alarm['start'],
+                      'end': alarm['end'],
+                      'alarm': alarm['alarm']}
+
+            # The single-alarm event is kept for compatibility, the handlers
+            # of the interface should bind to alarms_event instead
+            alarm_event.signal(filename=self.filename, **alarmd)
+            activated.append(alarmd)
 
-        alarm_event.signal(filename=alarm['filename'],
-                           id_=alarm['id_'],
-                           alarmid=alarmid,
-                           start=alarm['start'],
-                           end=alarm['end'],
-                           alarm=alarm['alarm'])
+        alarms_event.signal(filename=self.filename, alarms=activated)
 
     def get_alarms(self, mint, maxt, occs):
         conn = core_api.get_connection(self.filename)
@@ -262,6 +303,7 @@ class Database(object):
                 cursor = qconn.cursor()
                 cursor.execute(queries.alarms_update_id, (newalarm, alarmid))
                 core_api.give_connection(self.filename, qconn)
+                self.changes += 1
 
                 self._insert_alarm_log(id_, 0, text.partition('\n')[0])
 
@@ -279,6 +321,7 @@ class Database(object):
                 cursor = qconn.cursor()
                 cursor.execute(queries.alarms_delete_id, (alarmid, ))
                 core_api.give_connection(self.filename, qconn)
+                self.changes += 1
 
                 self._insert_alarm_log(id_, 1, text.partition('\n')[0])
 
@@ -294,15 +337,6 @@ class Database(object):
                 alarm_off_event.signal(filename=self.filename, id_=id_,
                                                             alarmid=alarmid)
 
-    def _insert_alarm(self, id_, start, end, origalarm, snooze):
-        conn = core_api.get_connection(self.filename)
-        cur = conn.cursor()
-        cur.execute(queries.alarms_insert, (id_, start, end, origalarm,
-                                                                    snooze))
-        core_api.give_connection(self.filename, conn)
-        aid = cur.lastrowid
-        return aid
-
     def copy_alarms(self, id_):
         occs = []
 
@@ -324,15 +358,30 @@ class Database(object):
 
         core_api.give_memory_connection(mem)
 
-    def paste_alarms(self, id_, oldid):
+    def paste_alarms(self, pitems):
+        # pitems is a list of (id_, oldid) tuples
         mem = core_api.get_memory_connection()
         curm = mem.cursor()
-        curm.execute(queries.copyalarms_select_id, (oldid, ))
+        curm.execute(queries.copyalarms_select_all)
         core_api.give_memory_connection(mem)
 
+        copied = {}
+
         for occ in curm:
-            self._insert_alarm(id_, occ['CA_start'], occ['CA_end'],
-                                            occ['CA_alarm'], occ['CA_snooze'])
+            copied.setdefault(occ['CA_item'], []).append(occ)
+
+        rows = []
+
+        for id_, oldid in pitems:
+            for occ in copied.get(oldid, ()):
+                rows.append((id_, occ['CA_start'], occ['CA_end'],
+                                            occ['CA_alarm'], occ['CA_snooze']))
+
+        conn = core_api.get_connection(self.filename)
+        cur = conn.cursor()
+        cur.executemany(queries.alarms_insert, rows)
+        core_api.give_connection(self.filename, conn)
+        self.changes += len(rows)
 
     def delete_alarms(self, id_, text):
         qconn = core_api.get_connection(self.filename)
@@ -341,6 +390,7 @@ class Database(object):
 
         if cursor.rowcount > 0:
             core_api.give_connection(self.filename, qconn)
+            self.changes += cursor.rowcount
 
             self._insert_alarm_log(id_, 2, text.partition('\n')[0])
 
@@ -382,19 +432,9 @@ class Database(object):
                                                         (self.log_limits[0], ))
 
     def check_pending_changes(self):
-        conn = core_api.get_connection(self.filename)
-        cur = conn.cursor()
-        change_state = self.changes != [row for row in
-                                            cur.execute(queries.alarms_select)]
-        core_api.give_connection(self.filename, conn)
-
-        if change_state or self.modified_state:
+        if self.changes > 0 or self.modified_state:
             core_api.set_modified(self.filename)
 
     def reset_modified_state(self):
-        conn = core_api.get_connection(self.filename)
-        cur = conn.cursor()
-        self.changes = [row for row in cur.execute(queries.alarms_select)]
-        core_api.give_connection(self.filename, conn)
-
+        self.changes = 0
         self.modified_state = False
@@ -37,6 +37,8 @@ alarms_create = ("CREATE TABLE Alarms (A_id INTEGER PRIMARY KEY, "
                                       "A_alarm INTEGER, "
                                       "A_snooze INTEGER)")
 
+alarms_create_index_item = 'CREATE INDEX Alarms_item ON Alarms (A_item)'
+
 alarms_select = 'SELECT * FROM Alarms'
 
 alarms_select_item = ('SELECT A_id, A_start, A_end, A_alarm, A_snooze '
@@ -48,6 +50,8 @@ alarms_select_count = ('SELECT COUNT(*) AS A_active_alarms FROM Alarms '
 alarms_insert = ('INSERT INTO Alarms (A_id, A_item, A_start, A_end, A_alarm, '
                                     'A_snooze) VALUES (NULL, ?, ?, ?, ?, ?)')
 
+alarms_select_last_id = 'SELECT last_insert_rowid()'
+
 alarms_update_id = 'UPDATE Alarms SET A_snooze=? WHERE A_id=?'
 
 alarms_delete_id = 'DELETE FROM Alarms WHERE A_id=?'
@@ -65,8 +69,8 @@ copyalarms_create = ("CREATE TABLE CopyAlarms (CA_id INTEGER, "
 
 copyalarms_select = 'SELECT CA_id FROM CopyAlarms LIMIT 1'
 
-copyalarms_select_id = ('SELECT CA_id, CA_start, CA_end, CA_alarm, CA_snooze '
-                        'FROM CopyAlarms WHERE CA_item=?')
+copyalarms_select_all = ('SELECT CA_item, CA_start, CA_end, CA_alarm, '
+                         'CA_snooze FROM CopyAlarms')
 
 copyalarms_insert = ('INSERT INTO CopyAlarms (CA_id, CA_item, CA_start, '
                      'CA_end, CA_alarm, CA_snooze) VALUES (?, ?, ?, ?, ?, ?)')
@@ -61,6 +61,14 @@ def bind_to_alarm(handler, bind=True):
     return alarmsmod.alarm_event.bind(handler, bind)
 
 
+def bind_to_alarms(handler, bind=True):
+    # Warning, this function is executed on a separate thread!!!
+    # (Check for race conditions)
+    # Signalled once for all the alarms activated together in a database, with
+    # the same arguments of the alarm event in the 'alarms' list
+    return alarmsmod.alarms_event.bind(handler, bind)
+
+
 def bind_to_alarm_off(handler, bind=True):
     return alarmsmod.alarm_off_event.bind(handler, bind)
 
@@ -25,6 +25,12 @@ def install_rule_handler(rulename, handler):
     return extension.rules.install_rule_handler(rulename, handler)
 
 
+def install_rule_footprint_handler(rulename, handler):
+    # The handler must accept a rule and return the list of its
+    # (start, end, period) windows, see organism.items.RulesIndex
+    return extension.rules.install_rule_footprint_handler(rulename, handler)
+
+
 def update_item_rules(filename, id_, rules, group,
                                             description='Update item rules'):
     # All rules must be able to produce only occurrences compliant with the
@@ -49,6 +55,7 @@ def get_supported_open_databases():
 
 
 def get_item_rules(filename, id_):
+    # The returned list is cached and shared, it must not be modified
     return extension.databases[filename].get_item_rules(id_)
 
 
@@ -56,6 +63,16 @@ def get_all_valid_item_rules(filename):
     return extension.databases[filename].get_all_valid_item_rules()
 
 
+def get_all_valid_decoded_item_rules(filename):
+    # Return a list of (id_, rules) tuples; the rules lists are cached and
+    # shared, they must not be modified
+    return extension.databases[filename].get_all_valid_decoded_item_rules()
+
+
+def get_rules_cache_stats(filename):
+    return extension.databases[filename].get_rules_cache_stats()
+
+
 def get_all_item_rules(filename):
     return extension.databases[filename].get_all_item_rules()
 
@@ -65,6 +82,12 @@ def get_occurrences_range(mint, maxt, filenames):
                                 extension.databases, extension.rules.handlers)
 
 
+def make_occurrences_table():
+    # Return the compact container that stores the occurrences found by the
+    #  range searches, so that other searches can share its representation
+    return items.OccurrencesTable()
+
+
 def convert_string_to_rules(string):
     return items.Database.string_to_rules(string)
 
@@ -81,6 +104,10 @@ def bind_to_history_update(handler, bind=True):
     return items.history_update_event.bind(handler, bind)
 
 
+def bind_to_history_delete(handler, bind=True):
+    return items.history_delete_event.bind(handler, bind)
+
+
 def bind_to_update_item_rules_conditional(handler, bind=True):
     return items.update_item_rules_conditional_event.bind(handler, bind)
 
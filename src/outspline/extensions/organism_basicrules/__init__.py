@@ -123,6 +123,35 @@ def install_occurrence_range_handlers():
         organism_api.install_rule_handler(rulename, handler)
 
 
+def install_footprint_handlers():
+    # The monthly and yearly rules don't have a footprint handler, so their
+    # items are always searched
+    for rulename, handler in (
+                (occur_once._RULE_NAMES['local'],
+                    occur_once.get_footprint_local),
+                (occur_once._RULE_NAMES['UTC'],
+                    occur_once.get_footprint_UTC),
+                (occur_regularly._RULE_NAMES['local'],
+                    occur_regularly.get_footprint_local),
+                (occur_regularly._RULE_NAMES['UTC'],
+                    occur_regularly.get_footprint_UTC),
+                (occur_regularly_group._RULE_NAMES['local'],
+                    occur_regularly_group.get_footprint_local),
+                (occur_regularly_group._RULE_NAMES['UTC'],
+                    occur_regularly_group.get_footprint_UTC),
+                (except_once._RULE_NAMES['local'],
+                    except_once.get_footprint),
+                (except_once._RULE_NAMES['UTC'],
+                    except_once.get_footprint),
+                (except_regularly._RULE_NAMES['local'],
+                    except_regularly.get_footprint),
+                (except_regularly._RULE_NAMES['UTC'],
+                    except_regularly.get_footprint),
+            ):
+        organism_api.install_rule_footprint_handler(rulename, handler)
+
+
 def main():
     install_occurrence_range_handlers()
+    install_footprint_handlers()
     install_next_occurrence_handlers()
@@ -97,3 +97,8 @@ def get_next_item_occurrences_UTC(base_time, utcbase, utcoffset, filename,
 
     # The rule is checked in make_rule, no need to use occs.except_
     occs.except_safe(filename, id_, start, end, inclusive)
+
+
+def get_footprint(rule):
+    # Except rules never produce occurrences
+    return []
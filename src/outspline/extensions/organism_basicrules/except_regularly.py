@@ -184,27 +184,19 @@ def get_occurrences_range_local(mint, utcmint, maxt, utcoffset, filename, id_,
         start = occur_regularly.compute_min_time(minstart - utcoffset.compute(
                 minstart), rule['#'][0], interval, rule['#'][2], rule['#'][3])
 
-        # Because of the start time note above, this loop will take a long time
-        # to complete for example when retrieving the old alarms, and such a
-        # search couldn't be aborted, since the aborting happens there, not in
-        # this loop (bug #329)
-        while True:
-            # Every timestamp can have a different UTC offset, depending
-            # whether it's in a DST period or not
-            offset = utcoffset.compute(start)
-
-            sstart = start + offset
-            send = sstart + rend
+        # Because of the start time note above, this sequence can be very long
+        #  for example when retrieving the old alarms (bug #329)
+        # Every timestamp can have a different UTC offset, depending whether
+        #  it's in a DST period or not, but the whole sequence of the start
+        #  times can be computed at once with the table of the DST transitions
+        # Do compare sstart with maxend, *not* start
+        sstarts = utcoffset.compute_sequence(start, interval, maxend)
 
-            # Do compare sstart with maxend, *not* start
-            if sstart > maxend:
-                break
-            # Do compare send with minstart, *not* end
-            elif send >= minstart:
-                # The rule is checked in make_rule, no need to use occs.except_
-                occs.except_safe(filename, id_, sstart, send, inclusive)
-
-            start += interval
+        # Do compare send with minstart, *not* end
+        # The rule is checked in make_rule, no need to use occs.except_
+        occs.except_safe_many(filename, id_, [(sstart, sstart + rend)
+                                    for sstart in sstarts
+                                    if sstart + rend >= minstart], inclusive)
 
 
 def get_occurrences_range_UTC(mint, utcmint, maxt, utcoffset, filename, id_,
@@ -223,20 +215,15 @@ def get_occurrences_range_UTC(mint, utcmint, maxt, utcoffset, filename, id_,
         start = occur_regularly.compute_min_time(minstart, rule['#'][0],
                                         interval, rule['#'][2], rule['#'][3])
 
-        # Because of the start time note above, this loop will take a long time
-        # to complete for example when retrieving the old alarms, and such a
-        # search couldn't be aborted, since the aborting happens there, not in
-        # this loop (bug #329)
-        while True:
-            end = start + rend
+        # Because of the start time note above, this sequence can be very long
+        # for example when retrieving the old alarms (bug #329)
+        # Note that start can be greater than maxend
+        count = max((int((maxend - start) // interval) + 1, 0))
 
-            if start > maxend:
-                break
-            elif end >= minstart:
-                # The rule is checked in make_rule, no need to use occs.except_
-                occs.except_safe(filename, id_, start, end, inclusive)
-
-            start += interval
+        # The rule is checked in make_rule, no need to use occs.except_
+        occs.except_safe_many(filename, id_, [(start + k * interval,
+                        start + k * interval + rend) for k in xrange(count)
+                        if start + k * interval + rend >= minstart], inclusive)
 
 
 def get_next_item_occurrences_local(base_time, utcbase, utcoffset, filename,
@@ -319,3 +306,8 @@ def get_next_item_occurrences_UTC(base_time, utcbase, utcoffset, filename,
                 occs.except_safe(filename, id_, start, end, inclusive)
 
             start += interval
+
+
+def get_footprint(rule):
+    # Except rules never produce occurrences
+    return []
@@ -0,0 +1,32 @@
+# Outspline - A highly modular and extensible outliner.
+# Copyright (C) 2011 Dario Giovannetti <dev@dariogiovannetti.net>
+#
+# This file is part of Outspline.
+#
+# Outspline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Outspline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Outspline.  If not, see <http://www.gnu.org/licenses/>.
+
+import time as time_
+
+
+def widen_local(windows):
+    # The occurrences of the local rules are shifted by the UTC offset of their
+    # time, which can change with DST, so their footprints are widened by the
+    # range of the possible offsets of the local time zone
+    # Do not use a larger margin, otherwise the windows of the daily rules
+    # would cover the whole period, and those rules would always be searched
+    minoffset = min((time_.timezone, time_.altzone))
+    maxoffset = max((time_.timezone, time_.altzone))
+
+    return [(start + minoffset, end + maxoffset, period)
+                                            for start, end, period in windows]
@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU General Public License
 # along with Outspline.  If not, see <http://www.gnu.org/licenses/>.
 
+import footprints
 from exceptions import BadRuleError
 
 _RULE_NAMES = {'local': 'occur_once_local',
@@ -114,3 +115,12 @@ def get_next_item_occurrences_UTC(base_time, utcbase, utcoffset, filename,
                               'start': rule['#'][0],
                               'end': rule['#'][1],
                               'alarm': rule['#'][2]})
+
+
+def get_footprint_local(rule):
+    return footprints.widen_local(get_footprint_UTC(rule))
+
+
+def get_footprint_UTC(rule):
+    times = [t for t in rule['#'][:3] if t is not None]
+    return [(min(times), max(times), None)]
@@ -16,6 +16,7 @@
 # You should have received a copy of the GNU General Public License
 # along with Outspline.  If not, see <http://www.gnu.org/licenses/>.
 
+import footprints
 from exceptions import BadRuleError
 
 _RULE_NAMES = {'local': 'occur_regularly_local',
@@ -435,35 +436,14 @@ def get_occurrences_range_local(mint, utcmint, maxt, utcoffset, filename, id_,
     rend = rule['#'][4]
     ralarm = rule['#'][5]
 
-    while True:
-        # Every timestamp can have a different UTC offset, depending whether
-        # it's in a DST period or not
-        offset = utcoffset.compute(start)
+    # Every timestamp can have a different UTC offset, depending whether it's
+    # in a DST period or not, but the whole sequence of the start times can be
+    # computed at once with the table of the DST transitions in the range
+    # Do compare sstart and salarm with maxt, *not* start and alarm
+    sstarts = utcoffset.compute_sequence(start, interval,
+                                            _compute_max_start(maxt, ralarm))
 
-        sstart = start + offset
-
-        try:
-            send = sstart + rend
-        except TypeError:
-            send = None
-
-        try:
-            salarm = sstart - ralarm
-        except TypeError:
-            salarm = None
-
-        # Do compare sstart and salarm with maxt, *not* start and alarm
-        if sstart > maxt and (salarm is None or salarm > maxt):
-            break
-
-        # The rule is checked in make_rule, no need to use occs.add
-        occs.add_safe({'filename': filename,
-                       'id_': id_,
-                       'start': sstart,
-                       'end': send,
-                       'alarm': salarm})
-
-        start += interval
+    _add_occurrences(filename, id_, sstarts, rend, ralarm, occs)
 
 
 def get_occurrences_range_UTC(mint, utcmint, maxt, utcoffset, filename, id_,
@@ -474,28 +454,36 @@ def get_occurrences_range_UTC(mint, utcmint, maxt, utcoffset, filename, id_,
     rend = rule['#'][4]
     ralarm = rule['#'][5]
 
-    while True:
-        try:
-            end = start + rend
-        except TypeError:
-            end = None
+    maxstart = _compute_max_start(maxt, ralarm)
+    # Note that start can be greater than maxstart
+    count = max((int((maxstart - start) // interval) + 1, 0))
+    starts = [start + k * interval for k in xrange(count)]
 
-        try:
-            alarm = start - ralarm
-        except TypeError:
-            alarm = None
+    _add_occurrences(filename, id_, starts, rend, ralarm, occs)
 
-        if start > maxt and (alarm is None or alarm > maxt):
-            break
 
-        # The rule is checked in make_rule, no need to use occs.add
-        occs.add_safe({'filename': filename,
-                       'id_': id_,
-                       'start': start,
-                       'end': end,
-                       'alarm': alarm})
+def _compute_max_start(maxt, ralarm):
+    # The occurrences are generated until both their start and alarm times are
+    # greater than maxt
+    if ralarm is None:
+        return maxt
+    else:
+        return maxt + max((ralarm, 0))
 
-        start += interval
+
+def _add_occurrences(filename, id_, starts, rend, ralarm, occs):
+    if rend is None:
+        ends = [None] * len(starts)
+    else:
+        ends = [start + rend for start in starts]
+
+    if ralarm is None:
+        alarms = [None] * len(starts)
+    else:
+        alarms = [start - ralarm for start in starts]
+
+    # The rule is checked in make_rule, no need to use occs.add
+    occs.add_safe_many(filename, id_, starts, ends, alarms)
 
 
 def get_next_item_occurrences_local(base_time, utcbase, utcoffset, filename,
@@ -579,3 +567,21 @@ def get_next_item_occurrences_UTC(base_time, utcbase, utcoffset, filename,
             break
 
         start += interval
+
+
+def get_footprint_local(rule):
+    return footprints.widen_local(get_footprint_UTC(rule))
+
+
+def get_footprint_UTC(rule):
+    return [compute_footprint(rule['#'][0], rule['#'][1], rule['#'][4],
+                                                                rule['#'][5])]
+
+
+def compute_footprint(refstart, interval, rend, ralarm):
+    # The alarm is earlier than the start time if ralarm is positive
+    if ralarm is None:
+        return (refstart, refstart + max((rend, 0)), interval)
+    else:
+        return (refstart - max((ralarm, 0)), refstart + max((rend,
+                                                    ralarm * -1, 0)), interval)
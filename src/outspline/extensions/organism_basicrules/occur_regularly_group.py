@@ -19,6 +19,7 @@
 import bisect
 
 import occur_regularly
+import footprints
 from exceptions import BadRuleError
 
 _RULE_NAMES = {'local': 'occur_regularly_group_local',
@@ -93,7 +94,9 @@ def make_rule(refstart, interval, rstarts, rend, ralarm, standard, guiconfig):
 def get_occurrences_range_local(mint, utcmint, maxt, utcoffset, filename, id_,
                                                                 rule, occs):
     for refstart in rule['#'][0]:
+        # Do not modify the original rule, which could be cached
         srule = rule.copy()
+        srule['#'] = list(rule['#'])
         srule['#'][0] = refstart
         occur_regularly.get_occurrences_range_local(mint, utcmint, maxt,
                                         utcoffset, filename, id_, srule, occs)
@@ -102,7 +105,9 @@ def get_occurrences_range_local(mint, utcmint, maxt, utcoffset, filename, id_,
 def get_occurrences_range_UTC(mint, utcmint, maxt, utcoffset, filename, id_,
                                                                 rule, occs):
     for refstart in rule['#'][0]:
+        # Do not modify the original rule, which could be cached
         srule = rule.copy()
+        srule['#'] = list(rule['#'])
         srule['#'][0] = refstart
         occur_regularly.get_occurrences_range_UTC(mint, utcmint, maxt,
                                         utcoffset, filename, id_, srule, occs)
@@ -111,7 +116,9 @@ def get_occurrences_range_UTC(mint, utcmint, maxt, utcoffset, filename, id_,
 def get_next_item_occurrences_local(base_time, utcbase, utcoffset, filename,
                                                             id_, rule, occs):
     for refstart in rule['#'][0]:
+        # Do not modify the original rule, which could be cached
         srule = rule.copy()
+        srule['#'] = list(rule['#'])
         srule['#'][0] = refstart
         occur_regularly.get_next_item_occurrences_local(base_time, utcbase,
                                         utcoffset, filename, id_, srule, occs)
@@ -120,7 +127,19 @@ def get_next_item_occurrences_local(base_time, utcbase, utcoffset, filename,
 def get_next_item_occurrences_UTC(base_time, utcbase, utcoffset, filename,
                                                             id_, rule, occs):
     for refstart in rule['#'][0]:
+        # Do not modify the original rule, which could be cached
         srule = rule.copy()
+        srule['#'] = list(rule['#'])
         srule['#'][0] = refstart
         occur_regularly.get_next_item_occurrences_UTC(base_time, utcbase,
                                         utcoffset, filename, id_, srule, occs)
+
+
+def get_footprint_local(rule):
+    return footprints.widen_local(get_footprint_UTC(rule))
+
+
+def get_footprint_UTC(rule):
+    return [occur_regularly.compute_footprint(refstart, rule['#'][1],
+                            rule['#'][4], rule['#'][5])
+                            for refstart in rule['#'][0]]
@@ -33,24 +33,35 @@ class Main(object):
     def __init__(self):
         self.rules = timer.Rules()
         self.databases = {}
+        # The databases opened together by core_api.start_opening_databases,
+        # whose searches are started only once all of them are open; None when
+        # not opening any
+        self.opening = None
         self.nextoccsengine = timer.NextOccurrencesEngine(self.databases,
                                                         self.rules.handlers)
 
+        core_api.bind_to_start_opening_databases(
+                                        self._handle_start_opening_databases)
+        core_api.bind_to_end_opening_databases(
+                                        self._handle_end_opening_databases)
         core_api.bind_to_open_database_dirty(self._handle_open_database_dirty)
         core_api.bind_to_close_database(self._handle_close_database)
-        core_api.bind_to_delete_subtree(
-                                self._handle_search_next_occurrences_request)
-        core_api.bind_to_history(self._handle_search_next_occurrences_request)
+        core_api.bind_to_delete_subtree(self._handle_delete_subtree)
+        core_api.bind_to_history(self._handle_history)
         core_api.bind_to_exit_app_1(
                         self._handle_search_next_occurrences_cancel_request)
 
         organism_api.bind_to_open_database(self._handle_open_database)
         organism_api.bind_to_update_item_rules_conditional(
-                                self._handle_search_next_occurrences_request)
+                                                self._handle_update_item_rules)
+        organism_api.bind_to_delete_item_rules(self._handle_delete_item_rules)
+        organism_api.bind_to_history_insert(self._handle_history_rules)
+        organism_api.bind_to_history_update(self._handle_history_rules)
+        organism_api.bind_to_history_delete(self._handle_delete_item_rules)
 
         if copypaste_api:
-            copypaste_api.bind_to_items_pasted(
-                                self._handle_search_next_occurrences_request)
+            copypaste_api.bind_to_paste_items(self._handle_paste_items)
+            copypaste_api.bind_to_items_pasted(self._handle_items_pasted)
 
     def _handle_open_database_dirty(self, kwargs):
         dependencies = info.database_dependency_group_1
@@ -65,29 +76,75 @@ class Main(object):
             filename = kwargs['filename']
             self.databases[filename] = timer.Database(filename)
 
+    def _handle_start_opening_databases(self, kwargs):
+        self.opening = []
+
     def _handle_open_database(self, kwargs):
         filename = kwargs['filename']
 
-        try:
-            self.databases[filename].start_old_occurrences_search()
-        except KeyError:
-            pass
-        else:
-            self.nextoccsengine.restart()
+        if filename in self.databases:
+            if self.opening is None:
+                self._start_searches((filename, ))
+            else:
+                self.opening.append(filename)
+
+    def _handle_end_opening_databases(self, kwargs):
+        opening, self.opening = self.opening, None
+
+        # opening is None if the opening failed before signalling its start
+        if opening:
+            self._start_searches(opening)
+
+    def _start_searches(self, filenames):
+        for filename in filenames:
+            # The database may have been closed in the meantime
+            try:
+                self.databases[filename].start_old_occurrences_search()
+            except KeyError:
+                pass
+            else:
+                # The restart requests are merged into a single search
+                self.nextoccsengine.restart('open', filename)
+
+    def _handle_delete_subtree(self, kwargs):
+        self.nextoccsengine.restart('delete', kwargs['filename'])
 
-    def _handle_search_next_occurrences_request(self, kwargs):
-        self.nextoccsengine.restart()
+    def _handle_history(self, kwargs):
+        self.nextoccsengine.restart('history', kwargs['filename'])
+
+    def _handle_items_pasted(self, kwargs):
+        self.nextoccsengine.restart('paste', kwargs['filename'])
+
+    def _handle_update_item_rules(self, kwargs):
+        filename = kwargs['filename']
+        self.nextoccsengine.invalidate_item(filename, kwargs['id_'])
+        self.nextoccsengine.restart('rules', filename)
+
+    def _handle_delete_item_rules(self, kwargs):
+        # The search is restarted by the delete_subtree or history events
+        self.nextoccsengine.forget_item(kwargs['filename'], kwargs['id_'])
+
+    def _handle_history_rules(self, kwargs):
+        # The search is restarted by the history event
+        self.nextoccsengine.invalidate_item(kwargs['filename'], kwargs['id_'])
+
+    def _handle_paste_items(self, kwargs):
+        # The search is restarted by the items_pasted event
+        for id_, oldid in kwargs['items']:
+            self.nextoccsengine.invalidate_item(kwargs['filename'], id_)
 
     def _handle_search_next_occurrences_cancel_request(self, kwargs):
         self.nextoccsengine.cancel()
 
     def _handle_close_database(self, kwargs):
+        filename = kwargs['filename']
+
         try:
-            del self.databases[kwargs['filename']]
+            del self.databases[filename]
         except KeyError:
             pass
         else:
-            self.nextoccsengine.restart()
+            self.nextoccsengine.restart('close', filename)
 
 
 def main():
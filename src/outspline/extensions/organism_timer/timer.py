@@ -17,6 +17,8 @@
 # along with Outspline.  If not, see <http://www.gnu.org/licenses/>.
 
 import threading
+import heapq
+import itertools
 import time as time_
 
 from outspline.static.pyaux import timeaux
@@ -41,6 +43,24 @@ activate_occurrences_event = Event()
 class Database(object):
     def __init__(self, filename):
         self.filename = filename
+        # The next occurrences of each item with rules, as last computed by
+        # NextOccurrencesEngine: {id_: (seq, next, occs, rules)}
+        # The results are valid as long as the base time of the database
+        # stays between self.nextoccs_base and the item's next time
+        self.nextoccs = {}
+        self.nextoccs_base = None
+        self.changed_items = set()
+
+    def invalidate_item(self, id_):
+        self.changed_items.add(id_)
+
+    def forget_item(self, id_):
+        self.changed_items.discard(id_)
+
+        try:
+            del self.nextoccs[id_]
+        except KeyError:
+            pass
 
     def get_last_search(self):
         conn = core_api.get_connection(self.filename)
@@ -91,7 +111,7 @@ class Database(object):
 
 class NextOccurrences(object):
     def __init__(self):
-        self.occs = {}
+        self.occs = organism_api.make_occurrences_table()
         self.oldoccs = {}
         self.next = None
 
@@ -113,10 +133,11 @@ class NextOccurrences(object):
             if base_time < t:
                 if not self.next or t < self.next:
                     self.next = t
-                    self.occs = {occ['filename']: {occ['id_']: [occ]}}
+                    self.occs = organism_api.make_occurrences_table()
+                    self.occs.add(occ)
                     return True
                 elif t == self.next:
-                    self._add(self.occs, occ)
+                    self.occs.add(occ)
                     return True
                 else:
                     return False
@@ -124,21 +145,18 @@ class NextOccurrences(object):
             return False
 
     def add_old(self, occ):
-        self._add(self.oldoccs, occ)
-
-    def _add(self, occsd, occ):
         filename = occ['filename']
         id_ = occ['id_']
 
         try:
-            occsd[filename][id_]
+            self.oldoccs[filename][id_]
         except KeyError:
             try:
-                occsd[filename]
+                self.oldoccs[filename]
             except KeyError:
-                occsd[filename] = {}
-            occsd[filename][id_] = []
-        occsd[filename][id_].append(occ)
+                self.oldoccs[filename] = {}
+            self.oldoccs[filename][id_] = []
+        self.oldoccs[filename][id_].append(occ)
 
     def except_(self, filename, id_, start, end, inclusive):
         # Make sure this call is compliant with the requirements defined in
@@ -149,78 +167,48 @@ class NextOccurrences(object):
             raise BadExceptRuleError()
 
     def except_safe(self, filename, id_, start, end, inclusive):
-        # Test if the item has some rules, for safety, also for coherence with
-        # organism.items.OccurrencesRange.except_safe
-        try:
-            occsc = self.occs[filename][id_][:]
-        except KeyError:
-            pass
-        else:
-            for occ in occsc:
-                # Occurrences with start == o['end'] shouldn't be excepted, as
-                # they're not considered part of the end minute
-                if start <= occ['start'] <= end or (inclusive and
-                                           occ['start'] <= start < occ['end']):
-                    self.occs[filename][id_].remove(occ)
-                    if not self.occs[filename][id_]:
-                        del self.occs[filename][id_]
-                        if not self.occs[filename]:
-                            del self.occs[filename]
+        # Items without occurrences are ignored, for safety, also for
+        # coherence with organism.items.OccurrencesRange.except_safe
+        self.occs.except_(filename, id_, ((start, end), ), inclusive)
         # Do not try to update self.next (even in case there are no occurrences
         # left): this lets NextOccurrencesEngine reset the last search time to
         # this value, thus ignoring the excepted occurrences at the following
         # search
 
     def try_delete_one(self, filename, id_, start, end, alarm):
-        try:
-            occsc = self.occs[filename][id_][:]
-        except KeyError:
-            return False
-        else:
-            for occd in occsc:
-                if (start, end, alarm) == (occd['start'], occd['end'],
-                                                                occd['alarm']):
-                    self.occs[filename][id_].remove(occd)
-                    if not self.occs[filename][id_]:
-                        del self.occs[filename][id_]
-                        if not self.occs[filename]:
-                            del self.occs[filename]
-                    # Delete only one occurrence, hence the name try_delete_one
-                    return True
+        # Delete only one occurrence, hence the name try_delete_one
         # Do not try to update self.next (even in case there are no occurrences
         # left): this would let NextOccurrencesEngine reset the last search
         # time to this value, thus avoiding repeating this same procedure
         # This function is however designed to be used just before adding a
         # very similar occurrence, so self.next will be updated by that anyway
+        return self.occs.remove_one(filename, id_, start, end, alarm)
 
     def get_dict(self):
-        return self.occs
+        return self.occs.get_dict()
 
     def get_old_dict(self):
         return self.oldoccs
 
+    def get_item_occurrences(self, filename, id_):
+        # Return a copy of the occurrences of the item in the compact format
+        # accepted by self.add_item_occurrences, or None
+        return self.occs.get_item_occurrences(filename, id_)
+
+    def add_item_occurrences(self, time, filename, id_, occs):
+        # This method is used by NextOccurrencesEngine to merge the cached
+        # occurrences of an item, whose time must be already known to be the
+        # next one; note that occs can be None, if all the occurrences were
+        # excepted
+        self.next = time
+        self.occs.merge(filename, id_, occs)
+
     def get_next_occurrence_time(self):
         return self.next
 
     def get_item_time_span(self, filename, id_):
         # Note that this method ignores self.oldoccs _deliberately_
-        try:
-            occs = self.occs[filename][id_]
-        except KeyError:
-            return False
-        else:
-            # The final minstart and maxend should never end up being None
-            minstart = occs[0]['start']
-            # Initialize maxend to minstart, which is surely != None
-            maxend = minstart
-
-            for occ in occs:
-                # This assumes that start <= end
-                minstart = min((minstart, occ['start']))
-                # occ['end'] could be None
-                maxend = max((occ['start'], occ['end'], maxend))
-
-            return (minstart, maxend)
+        return self.occs.get_item_time_span(filename, id_)
 
 
 class Rules(object):
@@ -255,30 +243,19 @@ class NextOccurrencesSearch(object):
         # NextOccurrencesEngine because it can be used without the latter (e.g.
         # by wxtasklist); note also that both functions generate their own
         # events
-        self.occs = NextOccurrences()
-        self.utcoffset = timeaux.UTCOffset()
+        self.reset()
         search_start = (time_.time(), time_.clock())
 
         try:
             for filename in self.filenames:
-                if not self.base_time:
-                    self.base_time = self.base_times[filename]
-
-                # Don't even think of moving this to the constructor, as
-                # self.base_time could be defined just above
-                utcbase = self.base_time - self.utcoffset.compute(
-                                                                self.base_time)
+                utcbase = self.start_database(filename)
 
-                for row in organism_api.get_all_valid_item_rules(filename):
-                    id_ = row['R_id']
-                    rules = organism_api.convert_string_to_rules(
-                                                                row['R_rules'])
+                rows = organism_api.get_all_valid_decoded_item_rules(filename)
 
-                    for rule in rules:
-                        self._search_item(filename, id_, rule, utcbase)
+                for id_, rules in rows:
+                    self.search_item(filename, id_, rules, utcbase)
 
-                get_next_occurrences_event.signal(base_time=self.base_time,
-                                            filename=filename, occs=self.occs)
+                self.end_database(filename)
 
         # All loops must be broken
         except NextOccurrencesSearchStop:
@@ -288,6 +265,29 @@ class NextOccurrencesSearch(object):
                                               time_.time() - search_start[0],
                                               time_.clock() - search_start[1]))
 
+    def reset(self):
+        # This and the following methods are also used by
+        # OccurrencesRangeNextSearch
+        self.occs = NextOccurrences()
+        self.utcoffset = timeaux.UTCOffset()
+
+    def start_database(self, filename):
+        # Return the UTC base time to be passed to self.search_item
+        if not self.base_time:
+            self.base_time = self.base_times[filename]
+
+        # Don't even think of moving this to the constructor, as
+        # self.base_time could be defined just above
+        return self.base_time - self.utcoffset.compute(self.base_time)
+
+    def search_item(self, filename, id_, rules, utcbase):
+        for rule in rules:
+            self._search_item(filename, id_, rule, utcbase)
+
+    def end_database(self, filename):
+        get_next_occurrences_event.signal(base_time=self.base_time,
+                                            filename=filename, occs=self.occs)
+
     def stop(self):
         self._search_item = self._search_item_stop
 
@@ -306,6 +306,79 @@ class NextOccurrencesSearch(object):
         raise NextOccurrencesSearchStop()
 
 
+class OccurrencesRangeNextSearchStop(UserWarning):
+    # This class is used as an exception, but used internally, so there's no
+    # need to store it in the exceptions module
+    pass
+
+
+class OccurrencesRangeNextSearch(object):
+    def __init__(self, mint, maxt, filenames, rule_handlers):
+        # Search the occurrences in the [mint, maxt] range like
+        #  organism_api.get_occurrences_range and the next occurrences after
+        #  maxt like NextOccurrencesSearch, but going through the rules of the
+        #  databases only once
+        self.filenames = filenames
+        self.range_search = organism_api.get_occurrences_range(mint=mint,
+                                                maxt=maxt, filenames=filenames)
+        self.next_search = NextOccurrencesSearch(filenames, rule_handlers,
+                                                                base_time=maxt)
+        self._search_item = self._search_item_continue
+
+    def start(self):
+        self.next_search.reset()
+        search_start = (time_.time(), time_.clock())
+
+        try:
+            for filename in self.filenames:
+                utcbase = self.next_search.start_database(filename)
+                # Only the items that can have occurrences in the range are
+                #  searched also for the range
+                range_ids = set(self.range_search.get_item_ids(filename))
+
+                # Note that the rows are fetched all at once, see also
+                #  organism.items.OccurrencesRangeSearch.start
+                rows = organism_api.get_all_valid_decoded_item_rules(filename)
+
+                for id_, rules in rows:
+                    self._search_item(filename, id_, rules, id_ in range_ids,
+                                                                    utcbase)
+
+                self.range_search.end_database(filename)
+                self.next_search.end_database(filename)
+
+        # All loops must be broken
+        except OccurrencesRangeNextSearchStop:
+            pass
+
+        log.debug('Occurrences range and next occurrences found in {} (time) '
+                            '/ {} (clock) s'.format(
+                            time_.time() - search_start[0],
+                            time_.clock() - search_start[1]))
+
+    def stop(self):
+        self._search_item = self._search_item_stop
+
+    def get_results(self):
+        return self.range_search.get_results()
+
+    def get_next_results(self):
+        return self.next_search.get_results()
+
+    def _search_item(self, filename, id_, rules, in_range, utcbase):
+        # This method is defined dynamically
+        pass
+
+    def _search_item_continue(self, filename, id_, rules, in_range, utcbase):
+        if in_range:
+            self.range_search.search_item(filename, id_, rules)
+
+        self.next_search.search_item(filename, id_, rules, utcbase)
+
+    def _search_item_stop(self, filename, id_, rules, in_range, utcbase):
+        raise OccurrencesRangeNextSearchStop()
+
+
 class OldOccurrencesSearch(object):
     def __init__(self, database, filename):
         self.database = database
@@ -365,10 +438,12 @@ class OldOccurrencesSearch(object):
             thread.start()
 
     def _continue(self):
-        # It's important that the databases are blocked on this thread, and not
+        # It's important that the database is blocked on this thread, and not
         # on the main thread, otherwise the program would hang if some
         # occurrences are activated while the user is performing an action
-        core_api.block_databases(block=True)
+        # Only this database is searched and modified, so the others can still
+        # be used meanwhile
+        core_api.block_database_write(self.filename, block=True)
         search_old_occurrences_event.signal(filename=self.filename,
                                                     last_search=self.exclmint)
         self.state = 0
@@ -390,7 +465,7 @@ class OldOccurrencesSearch(object):
         else:
             self._process_results()
 
-        core_api.release_databases()
+        core_api.release_database_write(self.filename)
 
     def _process_results(self):
         occs = self.search.get_results()
@@ -454,19 +529,69 @@ class NextOccurrencesEngine(object):
         self.databases = databases
         self.rule_handlers = rule_handlers
         self.thread = threading.Thread(target=int)
+        # Only one search can run at a time, but the databases are only
+        # blocked for reading during the search
+        self.lock = threading.Lock()
         self.queued = False
+        # The restart requests are coalesced into a single search started
+        # after this delay
+        self.DELAY = coreaux_api.get_extension_configuration('organism_timer'
+                                        ).get_float('restart_delay') / 1000
+        # The reasons of the coalesced restart requests, grouped by database
+        # (None for the requests not related to a particular database)
+        self.reasons = {}
+        self.requested_searches = 0
+        self.executed_searches = 0
+        # Restart requests come from the main thread, but also from the timer
+        # and search threads
+        self.requests_lock = threading.Lock()
+        # No more searches are started after the engine is cancelled
+        self.cancelled = False
         self.timer = threading.Timer(0, int)
+        # Heap of (next, seq, filename, id_) entries for the items cached in
+        # the databases; the entries whose seq doesn't match the cached one
+        # are obsolete and are just discarded when found
+        self.heap = []
+        self.sequence = itertools.count()
+
+    def invalidate_item(self, filename, id_):
+        try:
+            self.databases[filename].invalidate_item(id_)
+        except KeyError:
+            pass
+
+    def forget_item(self, filename, id_):
+        try:
+            self.databases[filename].forget_item(id_)
+        except KeyError:
+            pass
+
+    def restart(self, reason='request', filename=None):
+        with self.requests_lock:
+            if self.cancelled:
+                return
 
-    def restart(self):
-        # Allow only one restart request in the queue
-        if not self.queued:
-            self.queued = True
-            # There's no need to call self.thread.join because the search
-            # blocks the databases, so if another one is started, it will block
-            # until the previous one is finished anyway
-            self.thread = threading.Thread(target=self._restart)
-            self.thread.name = "organism_engine"
-            self.thread.start()
+            self.requested_searches += 1
+
+            try:
+                self.reasons[filename].add(reason)
+            except KeyError:
+                self.reasons[filename] = set((reason, ))
+
+            # Allow only one restart request in the queue: the requests made
+            # before it starts are merged into it
+            if not self.queued:
+                self.queued = True
+                # There's no need to call self.thread.join because the search
+                # acquires self.lock, so if another one is started, it will
+                # block until the previous one is finished anyway
+                self.thread = threading.Timer(self.DELAY, self._restart)
+                self.thread.name = "organism_engine"
+                self.thread.start()
+
+    def get_search_counters(self):
+        with self.requests_lock:
+            return (self.requested_searches, self.executed_searches)
 
     def _restart(self):
         # Note that this function must be kept separate from
@@ -474,31 +599,80 @@ class NextOccurrencesEngine(object):
         # (e.g. by wxtasklist); note also that both functions generate their
         # own events
 
-        # Blocking here also prevents a second search from running
-        # simultaneously
-        core_api.block_databases(block=True)
-        self.queued = False
-        log.debug('Search next occurrences')
+        # Locking here prevents a second search from running simultaneously
+        self.lock.acquire()
+
+        with self.requests_lock:
+            self.queued = False
+            reasons, self.reasons = self.reasons, {}
+            self.executed_searches += 1
+
+        log.debug('Search next occurrences ({})'.format('; '.join(
+                        '{}: {}'.format(filename, ', '.join(sorted(freasons)))
+                        for filename, freasons in reasons.iteritems())))
+
+        # The search only reads the databases, so it can run at the same time
+        #  as other readers, and the databases that are not searched can still
+        #  be modified
+        blocked = self.databases.keys()
+        core_api.block_databases_read(blocked, block=True)
 
         # Make sure to use the same set of filenames during the search, because
         #  self.databases itself could change meanwhile due to race conditions
-        filenames = self.databases.keys()
+        # A database may also have been closed before it could be blocked
+        filenames = [filename for filename in blocked
+                                            if filename in self.databases]
 
         base_times = {filename: self.databases[filename].get_last_search() for
                                                         filename in filenames}
-        # For the moment there seems to be no need to stop the search if a
-        # database is closed, in fact the databases are blocked, and the search
-        # seems to terminate cleanly, and anyway it should take a reasonable
-        # time to complete
-        search = NextOccurrencesSearch(filenames, self.rule_handlers,
-                                                        base_times=base_times)
-        search.start()
-        occs = search.get_results()
+        utcoffset = timeaux.UTCOffset()
+        utcbases = {filename: base_times[filename] - utcoffset.compute(
+                        base_times[filename]) for filename in filenames}
+        search_start = (time_.time(), time_.clock())
+
+        # Only the items whose rules have changed, or whose cached next time
+        # has been reached, are searched again; the other ones keep their
+        # cached results
+        for filename in filenames:
+            self._update_cache(self.databases[filename], base_times[filename],
+                                                utcbases[filename], utcoffset)
+
+        occs = self._pop_next_occurrences(base_times, utcbases, utcoffset)
+
+        for filename in filenames:
+            get_next_occurrences_event.signal(
+                                            base_time=base_times[filename],
+                                            filename=filename, occs=occs)
+
+        self._compact_heap()
+
+        log.debug('Next occurrences found in {} (time) / {} (clock) s'.format(
+                                              time_.time() - search_start[0],
+                                              time_.clock() - search_start[1]))
+
+        core_api.release_databases_read(blocked)
+
+        # Activating the occurrences and updating the last search times
+        #  instead modify the databases
+        core_api.block_databases(block=True)
+
+        if self.queued:
+            # Another search has been requested in the meantime, for example
+            #  because some rules have been modified after the databases were
+            #  released: the results of this search may be obsolete, so let
+            #  the next one, which is waiting for self.lock, activate the
+            #  occurrences
+            core_api.release_databases()
+            self.lock.release()
+            return
+
+        filenames = [filename for filename in filenames
+                                            if filename in self.databases]
         next_occurrence = occs.get_next_occurrence_time()
         occsd = occs.get_dict()
         oldoccsd = occs.get_old_dict()
 
-        self.cancel()
+        self._cancel_timer()
 
         now = int(time_.time())
 
@@ -538,11 +712,111 @@ class NextOccurrencesEngine(object):
                 self.databases[filename].set_last_search(now)
 
         core_api.release_databases()
+        self.lock.release()
 
         # Note that this event is not protected in the databases block
         search_next_occurrences_event.signal()
 
+    def _update_cache(self, database, base_time, utcbase, utcoffset):
+        if database.nextoccs_base is None or \
+                                        base_time < database.nextoccs_base:
+            # The database has just been opened, or its base time has been
+            # moved back, so the cached results cannot be trusted
+            database.nextoccs.clear()
+            database.changed_items.clear()
+
+            for id_, rules in organism_api.get_all_valid_decoded_item_rules(
+                                                    database.filename):
+                self._cache_item(database, id_, rules, base_time, utcbase,
+                                                                    utcoffset)
+        else:
+            changed_items, database.changed_items = database.changed_items, \
+                                                                        set()
+
+            for id_ in changed_items:
+                self._cache_item(database, id_, organism_api.get_item_rules(
+                                database.filename, id_), base_time, utcbase,
+                                utcoffset)
+
+        database.nextoccs_base = base_time
+
+    def _cache_item(self, database, id_, rules, base_time, utcbase,
+                                                                utcoffset):
+        filename = database.filename
+        occs = NextOccurrences()
+
+        for rule in rules:
+            self.rule_handlers[rule['rule']](base_time, utcbase, utcoffset,
+                                                filename, id_, rule, occs)
+
+        next_ = occs.get_next_occurrence_time()
+        seq = next(self.sequence)
+
+        ioccs = occs.get_item_occurrences(filename, id_)
+        database.nextoccs[id_] = (seq, next_, ioccs, rules)
+
+        if next_ is not None:
+            heapq.heappush(self.heap, (next_, seq, filename, id_))
+
+    def _pop_next_occurrences(self, base_times, utcbases, utcoffset):
+        occs = NextOccurrences()
+        nexts = []
+
+        while self.heap:
+            time, seq, filename, id_ = self.heap[0]
+
+            try:
+                database = self.databases[filename]
+                cseq, next_, ioccs, rules = database.nextoccs[id_]
+                base_time = base_times[filename]
+            except KeyError:
+                # The database or the item have been closed or deleted
+                heapq.heappop(self.heap)
+            else:
+                if cseq != seq:
+                    # The item has been cached again meanwhile
+                    heapq.heappop(self.heap)
+                elif occs.get_next_occurrence_time() not in (None, time):
+                    break
+                elif time <= base_time:
+                    # The base time has reached the cached next time, so the
+                    # item has to be searched again
+                    heapq.heappop(self.heap)
+                    self._cache_item(database, id_, rules, base_time,
+                                            utcbases[filename], utcoffset)
+                else:
+                    occs.add_item_occurrences(time, filename, id_, ioccs)
+                    nexts.append(heapq.heappop(self.heap))
+
+        # Keep the popped items in the heap, they will be searched again only
+        # when the base time reaches their next time
+        for entry in nexts:
+            heapq.heappush(self.heap, entry)
+
+        return occs
+
+    def _compact_heap(self):
+        # Obsolete entries are discarded only when they reach the top of the
+        # heap, so rebuild it when they become too many
+        valid = [(next_, seq, filename, id_)
+                        for filename, database in self.databases.items()
+                        for id_, (seq, next_, ioccs, rules) in
+                        database.nextoccs.items() if next_ is not None]
+
+        if len(self.heap) > 2 * len(valid):
+            heapq.heapify(valid)
+            self.heap = valid
+
     def cancel(self):
+        with self.requests_lock:
+            self.cancelled = True
+            # A search that is already waiting for self.lock cannot be
+            # cancelled anymore
+            self.thread.cancel()
+
+        self._cancel_timer()
+
+    def _cancel_timer(self):
         if self.timer.is_alive():
             log.debug('Cancel timer')
             self.timer.cancel()
@@ -557,4 +831,4 @@ class NextOccurrencesEngine(object):
 
     def _activate_occurrences(self, time, occsd):
         activate_occurrences_event.signal(time=time, occsd=occsd)
-        self.restart()
+        self.restart('activation')
@@ -31,10 +31,25 @@ def get_next_occurrences(base_time=None, base_times=None, filenames=()):
                                     base_time=base_time, base_times=base_times)
 
 
+def get_occurrences_range_and_next(mint, maxt, filenames):
+    # Search the occurrences in the range and the next occurrences after maxt
+    #  going through the rules only once; the results of the two searches are
+    #  returned by get_results and get_next_results respectively
+    return timer.OccurrencesRangeNextSearch(mint, maxt, filenames,
+                                                    extension.rules.handlers)
+
+
 def search_next_occurrences():
     return extension.nextoccsengine.restart()
 
 
+def get_next_occurrences_search_counters():
+    # Return the number of the requested and of the actually executed
+    #  searches of the next occurrences, which are fewer because the requests
+    #  made before a search starts are merged
+    return extension.nextoccsengine.get_search_counters()
+
+
 def get_old_occurrences_search_exception():
     return exceptions.OngoingOldSearchWarning
 
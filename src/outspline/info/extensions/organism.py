@@ -22,6 +22,6 @@ description = "Adds the backend for storing schedule information for items."
 website = "https://kynikos.github.io/outspline/"
 affects_database = True
 provides_tables = ("Rules", "CopyRules")
-dependencies = (("core", 4), )
+dependencies = (("core", 5), )
 optional_dependencies = (("extensions.copypaste", 2), )
-database_dependency_group_1 = (("core", 4), ("extensions.organism", 2))
+database_dependency_group_1 = (("core", 5), ("extensions.organism", 2))
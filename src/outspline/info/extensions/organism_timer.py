@@ -23,7 +23,7 @@ description = ("Adds the backend for calculating when item events/tasks "
 website = "https://kynikos.github.io/outspline/"
 affects_database = True
 provides_tables = ("TimerProperties", )
-dependencies = (("core", 4), ("extensions.organism", 2))
+dependencies = (("core", 5), ("extensions.organism", 2))
 optional_dependencies = (("extensions.copypaste", 2), )
-database_dependency_group_1 = (("core", 4), ("extensions.organism", 2),
+database_dependency_group_1 = (("core", 5), ("extensions.organism", 2),
                                 ("extensions.organism_timer", 1))
@@ -21,6 +21,6 @@ version = "1.4"
 description = ("Shows an alarm window whenever an item event/task happens, "
                         "and gives the possibility to snooze or dismiss it.")
 website = "https://kynikos.github.io/outspline/"
-dependencies = (("core", 4), ("extensions.organism_alarms", 1),
+dependencies = (("core", 5), ("extensions.organism_alarms", 2),
                 ("interfaces.wxgui", 3))
 optional_dependencies = (("plugins.wxtrayicon", 1), )
@@ -20,5 +20,5 @@ authors = ("Dario Giovannetti <dev@dariogiovannetti.net>", )
 version = "1.3"
 description = "Lets cut, copy and paste database items."
 website = "https://kynikos.github.io/outspline/"
-dependencies = (("core", 4), ("extensions.copypaste", 2),
+dependencies = (("core", 5), ("extensions.copypaste", 2),
                 ("interfaces.wxgui", 3))
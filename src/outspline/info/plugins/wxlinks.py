@@ -20,5 +20,5 @@ authors = ("Dario Giovannetti <dev@dariogiovannetti.net>", )
 version = "1.3"
 description = "Lets manage link items."
 website = "https://kynikos.github.io/outspline/"
-dependencies = (("core", 4), ("extensions.links", 1), ("interfaces.wxgui", 3))
+dependencies = (("core", 5), ("extensions.links", 2), ("interfaces.wxgui", 3))
 optional_dependencies = (("plugins.wxcopypaste", 1), )
@@ -21,5 +21,5 @@ version = "1.3"
 description = ("Allows controlling the search for old alarms when opening a "
                                                                 "database.")
 website = "https://kynikos.github.io/outspline/"
-dependencies = (("core", 4), ("extensions.organism_timer", 1),
-                ("extensions.organism_alarms", 1), ("interfaces.wxgui", 3))
+dependencies = (("core", 5), ("extensions.organism_timer", 1),
+                ("extensions.organism_alarms", 2), ("interfaces.wxgui", 3))
@@ -21,4 +21,4 @@ version = "1.3"
 description = ("Adds an icon in the system tray and lets the user hide and "
                                                     "show the main window.")
 website = "https://kynikos.github.io/outspline/"
-dependencies = (("core", 4), ("interfaces.wxgui", 3))
+dependencies = (("core", 5), ("interfaces.wxgui", 3))
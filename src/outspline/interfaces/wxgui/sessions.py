@@ -16,9 +16,13 @@
 # You should have received a copy of the GNU General Public License
 # along with Outspline.  If not, see <http://www.gnu.org/licenses/>.
 
+import time as time_
+
 import wx
 
 import outspline.coreaux_api as coreaux_api
+from outspline.coreaux_api import log
+import outspline.core_api as core_api
 
 import rootw
 import databases
@@ -33,15 +37,30 @@ class SessionManager(object):
         wx.CallAfter(self._post_init)
 
     def _post_init(self):
-        for o in self.savedession:
-            filename = self.savedession[o]
-            databases.open_database(filename)
+        start = time_.time()
+        filenames = [self.savedession[o] for o in self.savedession]
+
+        # Load all the databases in parallel, then open them in order, also
+        # showing the possible errors and upgrade dialogs
+        # Always end the opening, otherwise the databases loaded and not
+        # opened would not be released, and organism_timer would keep waiting
+        # to start its searches
+        try:
+            core_api.start_opening_databases(filenames)
+
+            for filename in filenames:
+                databases.open_database(filename)
+        finally:
+            core_api.end_opening_databases()
 
         try:
             wx.GetApp().nb_left.select_page(0)
         except IndexError:
             pass
 
+        log.info('Session of {} databases opened in {} s'.format(
+                                        len(filenames), time_.time() - start))
+
         # Bind *after* opening the databases in the session, because the
         # session must be refreshed only when databases are opened manually
         databases.open_database_event.bind(self._handle_open_database)
@@ -63,9 +63,9 @@ class Item(object):
 
 
 class Model(dv.PyDataViewModel):
-    def __init__(self, data, filename):
+    def __init__(self, database, filename):
         super(Model, self).__init__()
-        self.data = data
+        self.database = database
         self.filename = filename
 
         # The wxPython demo uses weak references for the item objects: see if
@@ -86,7 +86,7 @@ class Model(dv.PyDataViewModel):
             pid = core_api.get_item_parent(self.filename, id_)
 
             if pid > 0:
-                return self.ObjectToItem(self.data[pid])
+                return self.ObjectToItem(self.database.get_item_data(pid))
             else:
                 return dv.NullDataViewItem
 
@@ -98,7 +98,8 @@ class Model(dv.PyDataViewModel):
             ids = core_api.get_item_children(self.filename, pid)
 
         for id_ in ids:
-            children.append(self.ObjectToItem(self.data[id_]))
+            children.append(self.ObjectToItem(
+                                        self.database.get_item_data(id_)))
 
         return len(ids)
 
@@ -195,7 +196,16 @@ class Database(wx.SplitterWindow):
         self.SetMinimumPaneSize(20)
 
         self.filename = filename
+        # The Item objects are created only when they are first requested,
+        # normally by the model when their parents are expanded; note that
+        # they are never evicted, because the model's object mapper keeps a
+        # reference to every object that has been passed to the control
         self.data = {}
+        # Functions that return the (bits, mask) tuple of a property for an
+        # item id, so that the properties can be computed when the item is
+        # created, instead of being set for all the items when opening the
+        # database
+        self.property_providers = []
 
     def _post_init(self):
         # The native GTK widget used by DataViewCtrl would have an internal
@@ -228,13 +238,11 @@ class Database(wx.SplitterWindow):
         # their properties
         self.properties.post_init()
 
-        # Initialize the tree only *after* instantiating the class (and
-        # initilizing the icons), because actions like the creation of item
-        # images rely on the filename to be in the dictionary
-        for row in core_api.get_all_items(self.filename):
-            self._init_item_data(row["I_id"], row["I_text"])
-
-        self.dvmodel = Model(self.data, self.filename)
+        # The items are initialized only when requested by the model, i.e.
+        # only *after* instantiating the class (and initilizing the icons),
+        # because actions like the creation of item images rely on the
+        # filename to be in the dictionary
+        self.dvmodel = Model(self, self.filename)
         self.treec.AssociateModel(self.dvmodel)
         # According to DataViewModel's documentation (as of September 2014)
         # its reference count must be decreased explicitly to avoid memory
@@ -268,7 +276,6 @@ class Database(wx.SplitterWindow):
             self.show_logs()
 
         self.history_item_update_requests = []
-        self.history_tree_reset_request = False
 
         # Explicitly set focus on the tree, otherwise after opening a database
         # no window has focus, and this e.g. prevents F10 from showing the menu
@@ -281,16 +288,11 @@ class Database(wx.SplitterWindow):
         self.treec.Bind(dv.EVT_DATAVIEW_ITEM_CONTEXT_MENU,
                                                         self._popup_item_menu)
 
-        core_api.bind_to_insert_item(self._handle_insert_item)
+        core_api.bind_to_insert_items(self._handle_insert_items)
         core_api.bind_to_update_item_text(self._handle_update_item_text)
         core_api.bind_to_deleting_item(self._handle_deleting_item)
         core_api.bind_to_deleted_item_2(self._handle_deleted_item)
-        core_api.bind_to_history_insert(self._handle_history_insert)
-        core_api.bind_to_history_update_simple(
-                                            self._handle_history_update_simple)
-        core_api.bind_to_history_update_deep(self._handle_history_update_deep)
         core_api.bind_to_history_update_text(self._handle_history_update_text)
-        core_api.bind_to_history_remove(self._handle_history_remove)
         core_api.bind_to_history(self._handle_history)
 
     def _init_accelerators(self):
@@ -319,10 +321,23 @@ class Database(wx.SplitterWindow):
     def install_additional_accelerators(self, accelsconf):
         self.accelerators.update(accelsconf)
 
-    def _handle_insert_item(self, kwargs):
+    def _handle_insert_items(self, kwargs):
         if kwargs['filename'] == self.filename:
-            parent = self.get_tree_item_safe(kwargs['parent'])
-            self._insert_item(parent, kwargs['id_'], kwargs['text'])
+            iitems = kwargs['items']
+            inserted = set(id_ for id_, parent, text in iitems)
+
+            # Only add the roots of the inserted subtrees and their children,
+            # like when moving an item; the other descendants will be added on
+            # request (when their parents are expanded)
+            # Do not add every item here, because when pasting many items the
+            # database already contains all of them, and their parents may
+            # have already requested their children
+            for id_, parent, text in iitems:
+                if parent not in inserted:
+                    item = self.get_tree_item(id_)
+                    self.dvmodel.ItemAdded(self.get_tree_item_safe(parent),
+                                                                        item)
+                    self._reset_children(id_, item)
 
     def _handle_update_item_text(self, kwargs):
         # Don't update an item label only when editing the text area, as there
@@ -342,59 +357,37 @@ class Database(wx.SplitterWindow):
         if kwargs['filename'] == self.filename:
             self._remove_item_data(kwargs['id_'])
 
-    def _handle_history_insert(self, kwargs):
-        if kwargs['filename'] == self.filename:
-            self._init_item_data(kwargs["id_"], kwargs["text"])
-            self._request_tree_reset()
-
-    def _handle_history_update_simple(self, kwargs):
-        if kwargs['filename'] == self.filename:
-            self._request_tree_reset()
-
-    def _handle_history_update_deep(self, kwargs):
-        if kwargs['filename'] == self.filename:
-            self._request_tree_reset()
-
     def _handle_history_update_text(self, kwargs):
         if kwargs['filename'] == self.filename:
             id_ = kwargs['id_']
             self._set_item_label(id_, kwargs['text'])
             self.request_item_refresh(id_)
 
-    def _handle_history_remove(self, kwargs):
-        if kwargs['filename'] == self.filename:
-            self._remove_item_data(kwargs['id_'])
-            self._request_tree_reset()
-
-    def _request_tree_reset(self):
-        self.history_tree_reset_request = True
-
     def request_item_refresh(self, id_):
         self.history_item_update_requests.append(id_)
 
     def _handle_history(self, kwargs):
-        # Yes, this is a very aggressive way of handling history actions, this
-        # is redrawing the whole tree whenever an item is
-        # inserted/moved/deleted, however trying to handle each case separately
-        # is very complicated and thus causes numerous bugs, because each query
-        # in the history group can leave the database in an unstable state
-        # (e.g. the queries that update the previous id to the next/previous
-        # items when moving an item)
-        # It should be quite efficient anyway because self.data is not
-        # recalculated except for the items that explicitly requested it, and
-        # only the root items and their children are re-added, the rest of the
-        # items will be re-added on request (when their parents are expanded
-        # again)
+        # The history group is applied as its net structural changes, only
+        # updating the affected items, so that the rest of the tree keeps its
+        # expansion state
+        # The single history rows are not handled one by one, because each
+        # query in the history group can leave the database in an unstable
+        # state (e.g. the queries that update the previous id to the
+        # next/previous items when moving an item)
         if kwargs['filename'] == self.filename:
-            if self.history_tree_reset_request:
-                self.dvmodel.Cleared()
+            inserted = kwargs['inserted']
+            moved = kwargs['moved']
+            deleted = kwargs['deleted']
 
-                for id_ in core_api.get_root_items(self.filename):
-                    item = self.get_tree_item(id_)
-                    # For some reason ItemDeleted must be called too first...
-                    self.dvmodel.ItemDeleted(self._get_root(), item)
-                    self.dvmodel.ItemAdded(self._get_root(), item)
-                    self._reset_children(id_, item)
+            added = set(inserted)
+            added.update(moved)
+
+            self._remove_history_items(moved, deleted)
+            self._add_history_items(added)
+            self._refresh_history_parents(moved, deleted, added)
+
+            for id_ in deleted:
+                self._remove_item_data(id_)
 
             for id_ in self.history_item_update_requests:
                 # id_ may have been deleted by an action in the history group
@@ -402,7 +395,74 @@ class Database(wx.SplitterWindow):
                     self.update_tree_item(id_)
 
             del self.history_item_update_requests[:]
-            self.history_tree_reset_request = False
+
+    def _remove_history_items(self, moved, deleted):
+        # Removing an item from the model also removes its descendants, so
+        # only remove the items none of whose old ancestors has been removed
+        # too; the old ancestors that have not been moved or deleted still
+        # have the same parent
+        removed = set(moved)
+        removed.update(deleted)
+
+        for oldparents in (moved, deleted):
+            for id_, oldpid in oldparents.iteritems():
+                if not self._is_in_subtrees(oldpid, removed):
+                    self._remove_item(oldpid, id_)
+
+    def _add_history_items(self, added):
+        # Re-adding an item also re-adds its children, so only add the items
+        # none of whose ancestors has been (re-)added too; add the siblings in
+        # their order, so that the model always finds the previous ones
+        parents = set()
+
+        for id_ in added:
+            pid = core_api.get_item_parent(self.filename, id_)
+
+            # A parent that has not been initialized has never been passed to
+            # the model, and its children will be added on request (when it is
+            # expanded)
+            if (pid == 0 or pid in self.data) and \
+                                    not self._is_in_subtrees(pid, added):
+                parents.add(pid)
+
+        for pid in parents:
+            parent = self.get_tree_item_safe(pid)
+
+            if pid > 0:
+                ids = core_api.get_item_children(self.filename, pid)
+            else:
+                ids = core_api.get_root_items(self.filename)
+
+            for id_ in ids:
+                if id_ in added:
+                    item = self.get_tree_item(id_)
+                    self.dvmodel.ItemAdded(parent, item)
+                    self._reset_children(id_, item)
+
+    def _refresh_history_parents(self, moved, deleted, added):
+        oldpids = set(moved.itervalues())
+        oldpids.update(deleted.itervalues())
+
+        for oldpid in oldpids:
+            # The arrows of the (re-)added items and their descendants are
+            # already up to date
+            if oldpid > 0 and oldpid in self.data and \
+                            core_api.is_item(self.filename, oldpid) and \
+                            not self._is_in_subtrees(oldpid, added):
+                pid = core_api.get_item_parent(self.filename, oldpid)
+                self._refresh_item_arrow(self.get_tree_item_safe(pid), oldpid,
+                                                self.get_tree_item(oldpid))
+
+    def _is_in_subtrees(self, id_, roots):
+        # Test if id_ or any of its ancestors is in roots; id_ and its
+        # ancestors must exist, unless they are in roots
+        while id_ > 0:
+            if id_ in roots:
+                return True
+
+            id_ = core_api.get_item_parent(self.filename, id_)
+
+        return False
 
     @classmethod
     def open(cls, filename):
@@ -421,7 +481,7 @@ class Database(wx.SplitterWindow):
                 self.dbhistory.refresh()
 
     def undo(self, no_confirm=False):
-        if core_api.block_databases():
+        if core_api.block_database_write(self.filename):
             read = core_api.preview_undo_tree(self.filename)
 
             if read:
@@ -436,10 +496,10 @@ class Database(wx.SplitterWindow):
                     self.dbhistory.refresh()
                     undo_tree_event.signal(filename=self.filename)
 
-            core_api.release_databases()
+            core_api.release_database_write(self.filename)
 
     def redo(self, no_confirm=False):
-        if core_api.block_databases():
+        if core_api.block_database_write(self.filename):
             read = core_api.preview_redo_tree(self.filename)
 
             if read:
@@ -454,10 +514,10 @@ class Database(wx.SplitterWindow):
                     self.dbhistory.refresh()
                     redo_tree_event.signal(filename=self.filename)
 
-            core_api.release_databases()
+            core_api.release_database_write(self.filename)
 
     def create_sibling(self):
-        if core_api.block_databases():
+        if core_api.block_database_write(self.filename):
             # Do not use none=False in order to allow the creation of the
             # first item
             selection = self.get_selections(many=False)
@@ -481,10 +541,10 @@ class Database(wx.SplitterWindow):
                 self.select_item(id_)
                 self.dbhistory.refresh()
 
-            core_api.release_databases()
+            core_api.release_database_write(self.filename)
 
     def create_child(self):
-        if core_api.block_databases():
+        if core_api.block_database_write(self.filename):
             selection = self.get_selections(none=False, many=False)
 
             if selection:
@@ -497,19 +557,28 @@ class Database(wx.SplitterWindow):
                 self.select_item(id_)
                 self.dbhistory.refresh()
 
-            core_api.release_databases()
+            core_api.release_database_write(self.filename)
 
-    def _insert_item(self, parent, id_, text):
-        self._init_item_data(id_, text)
-        self.dvmodel.ItemAdded(parent, self.get_tree_item(id_))
+    def get_item_data(self, id_):
+        try:
+            return self.data[id_]
+        except KeyError:
+            return self._init_item_data(id_)
 
-    def _init_item_data(self, id_, text):
+    def _init_item_data(self, id_):
+        text = core_api.get_item_text(self.filename, id_)
         label = self._make_item_label(text)
         multiline_bits, multiline_mask = \
                     self.base_properties.get_item_multiline_state(text, label)
         properties = self._compute_property_bits(0, multiline_bits,
                                                                 multiline_mask)
-        self.data[id_] = Item(id_, label, properties)
+
+        for provider in self.property_providers:
+            bits, mask = provider(id_)
+            properties = self._compute_property_bits(properties, bits, mask)
+
+        item = self.data[id_] = Item(id_, label, properties)
+        return item
 
     def get_selections(self, none=True, many=True, descendants=None):
         selection = self.treec.GetSelections()
@@ -530,7 +599,7 @@ class Database(wx.SplitterWindow):
             return selection
 
     def move_item_up(self):
-        if core_api.block_databases():
+        if core_api.block_database_write(self.filename):
             selection = self.get_selections(none=False, many=False)
 
             if selection:
@@ -543,10 +612,10 @@ class Database(wx.SplitterWindow):
                     self.select_item(id_)
                     self.dbhistory.refresh()
 
-            core_api.release_databases()
+            core_api.release_database_write(self.filename)
 
     def move_item_down(self):
-        if core_api.block_databases():
+        if core_api.block_database_write(self.filename):
             selection = self.get_selections(none=False, many=False)
 
             if selection:
@@ -559,7 +628,7 @@ class Database(wx.SplitterWindow):
                     self.select_item(id_)
                     self.dbhistory.refresh()
 
-            core_api.release_databases()
+            core_api.release_database_write(self.filename)
 
     def _move_item(self, id_, item):
         pid = core_api.get_item_parent(self.filename, id_)
@@ -570,7 +639,7 @@ class Database(wx.SplitterWindow):
         self._reset_children(id_, item)
 
     def move_item_to_parent(self):
-        if core_api.block_databases():
+        if core_api.block_database_write(self.filename):
             selection = self.get_selections(none=False, many=False)
 
             if selection:
@@ -596,7 +665,7 @@ class Database(wx.SplitterWindow):
                     self.select_item(id_)
                     self.dbhistory.refresh()
 
-            core_api.release_databases()
+            core_api.release_database_write(self.filename)
 
     def _reset_children(self, id_, item):
         childids = core_api.get_item_children(self.filename, id_)
@@ -619,7 +688,7 @@ class Database(wx.SplitterWindow):
                 editor.Editor.open(self.filename, id_)
 
     def delete_selected_items(self, no_confirm=False):
-        if core_api.block_databases():
+        if core_api.block_database_write(self.filename):
             selection = self.get_selections(none=False, descendants=True)
 
             if selection:
@@ -631,7 +700,7 @@ class Database(wx.SplitterWindow):
 
                     if tab in editor.tabs and not editor.tabs[tab].close(
                                     'quiet' if no_confirm else 'discard'):
-                        core_api.release_databases()
+                        core_api.release_database_write(self.filename)
                         return False
 
                     items.append(id_)
@@ -641,7 +710,7 @@ class Database(wx.SplitterWindow):
                 self.dbhistory.refresh()
                 delete_items_event.signal()
 
-            core_api.release_databases()
+            core_api.release_database_write(self.filename)
 
     def delete_items(self, ids, description="Delete items"):
         group = core_api.get_next_history_group(self.filename)
@@ -668,12 +737,18 @@ class Database(wx.SplitterWindow):
             self.dvmodel.ItemAdded(parent, item)
 
     def _remove_item(self, pid, id_):
-        item = self.get_tree_item(id_)
-        parent = self.get_tree_item_safe(pid)
-        self.dvmodel.ItemDeleted(parent, item)
+        # An item that hasn't been initialized has never been passed to the
+        # model
+        if id_ in self.data:
+            item = self.get_tree_item(id_)
+            parent = self.get_tree_item_safe(pid)
+            self.dvmodel.ItemDeleted(parent, item)
 
     def _remove_item_data(self, id_):
-        del self.data[id_]
+        try:
+            del self.data[id_]
+        except KeyError:
+            pass
 
     def close(self):
         global dbs
@@ -698,7 +773,7 @@ class Database(wx.SplitterWindow):
         return self.dvmodel.ItemToObject(item).get_id()
 
     def get_tree_item(self, id_):
-        return self.dvmodel.ObjectToItem(self.data[id_])
+        return self.dvmodel.ObjectToItem(self.get_item_data(id_))
 
     def get_tree_item_safe(self, id_):
         if id_ > 0:
@@ -711,17 +786,24 @@ class Database(wx.SplitterWindow):
         return text.partition('\n')[0]
 
     def get_item_label(self, id_):
-        return self.data[id_].get_label()
+        return self.get_item_data(id_).get_label()
 
     def get_item_properties(self, id_):
-        return self.properties.get(self.data[id_].get_properties())
+        return self.properties.get(self.get_item_data(id_).get_properties())
 
     def _set_item_label(self, id_, text):
-        label = self._make_item_label(text)
-        self.data[id_].set_label(label)
-        multiline_bits, multiline_mask = \
+        # If the item hasn't been initialized, its label will be computed when
+        # requested
+        try:
+            item = self.data[id_]
+        except KeyError:
+            pass
+        else:
+            label = self._make_item_label(text)
+            item.set_label(label)
+            multiline_bits, multiline_mask = \
                     self.base_properties.get_item_multiline_state(text, label)
-        self.update_item_properties(id_, multiline_bits, multiline_mask)
+            self.update_item_properties(id_, multiline_bits, multiline_mask)
 
     @staticmethod
     def _compute_property_bits(old_property_bits, new_property_bits,
@@ -729,15 +811,28 @@ class Database(wx.SplitterWindow):
         return (old_property_bits & ~property_mask) | new_property_bits
 
     def update_item_properties(self, id_, property_bits, property_mask):
-        self.data[id_].set_properties(self._compute_property_bits(
-                self.data[id_].get_properties(), property_bits, property_mask))
+        # If the item hasn't been initialized, its properties will be computed
+        # by the property providers when requested
+        try:
+            item = self.data[id_]
+        except KeyError:
+            pass
+        else:
+            item.set_properties(self._compute_property_bits(
+                        item.get_properties(), property_bits, property_mask))
 
     def update_tree_item(self, id_):
-        self.dvmodel.ItemChanged(self.get_tree_item(id_))
+        # An item that hasn't been initialized has never been passed to the
+        # model, so there's nothing to refresh
+        if id_ in self.data:
+            self.dvmodel.ItemChanged(self.get_tree_item(id_))
 
     def add_property(self, *args, **kwargs):
         return self.properties.add(*args, **kwargs)
 
+    def add_property_provider(self, provider):
+        self.property_providers.append(provider)
+
     def get_logs_panel(self):
         return self.logspanel
 
@@ -561,6 +561,13 @@ def add_item_property(filename, bitsn, character, bits_to_colour):
     return tree.dbs[filename].add_property(bitsn, character, bits_to_colour)
 
 
+def add_item_property_provider(filename, provider):
+    # provider is called with the id of an item when the tree needs the item
+    # for the first time, and must return the (bits, mask) tuple of the
+    # property for that item
+    return tree.dbs[filename].add_property_provider(provider)
+
+
 def update_item_properties(filename, id_, property_bits, property_mask):
     tree.dbs[filename].update_item_properties(id_, property_bits,
                                                                 property_mask)
@@ -59,50 +59,50 @@ class Notifications():
         self.ICON = "outspline-alarm"
         self.wxtrayicon_id = wxtrayicon_id
 
-        organism_alarms_api.bind_to_alarm(self._handle_alarm)
+        organism_alarms_api.bind_to_alarms(self._handle_alarms)
 
-    def _handle_alarm(self, kwargs):
+    def _handle_alarms(self, kwargs):
         now = int(time.time()) // 60 * 60
+        filename = kwargs['filename']
 
-        # Don't notify for old alarms to avoid filling the screen with
-        # notifications
-        # Of course this check will prevent a valid notification if Outspline
-        # takes more than 1 minute from the activation of the alarm to get
-        # here, but in case of such serious slowness, a missed notification is
-        # probably just a minor problem
-        if kwargs['alarm'] == now:
-            filename = kwargs['filename']
-            id_ = kwargs['id_']
-            start = kwargs['start']
-            end = kwargs['end']
-
-            text = core_api.get_item_text(filename, id_).partition('\n')[0]
-
-            rstart = start - now
-
-            if rstart > 0:
-                body = "In {}".format(TimeSpanFormatters.format_compact(
-                                                                    rstart))
-            elif rstart == 0:
-                body = "Now"
-            else:
-                body = "{} ago".format(TimeSpanFormatters.format_compact(
+        for alarm in kwargs['alarms']:
+            # Don't notify for old alarms to avoid filling the screen with
+            # notifications
+            # Of course this check will prevent a valid notification if
+            # Outspline takes more than 1 minute from the activation of the
+            # alarm to get here, but in case of such serious slowness, a missed
+            # notification is probably just a minor problem
+            if alarm['alarm'] == now:
+                self._notify(filename, alarm['id_'], alarm['start'],
+                                                            alarm['end'], now)
+
+    def _notify(self, filename, id_, start, end, now):
+        text = core_api.get_item_text(filename, id_).partition('\n')[0]
+
+        rstart = start - now
+
+        if rstart > 0:
+            body = "In {}".format(TimeSpanFormatters.format_compact(rstart))
+        elif rstart == 0:
+            body = "Now"
+        else:
+            body = "{} ago".format(TimeSpanFormatters.format_compact(
                                                                 rstart * -1))
 
-            if end:
-                body += ", for {}".format(TimeSpanFormatters.format_compact(
+        if end:
+            body += ", for {}".format(TimeSpanFormatters.format_compact(
                                                                 end - start))
 
-            self.alarm = Notify.Notification.new(summary=text, body=body,
+        self.alarm = Notify.Notification.new(summary=text, body=body,
                                                                 icon=self.ICON)
 
-            if wxgui_api:
-                self.alarm.add_action("open_item", "Open", self._open_item,
-                                                               [filename, id_])
-            try:
-                self.alarm.show()
-            except GLib.Error:
-                log.warning('Alarm notification could not be displayed: check '
+        if wxgui_api:
+            self.alarm.add_action("open_item", "Open", self._open_item,
+                                                            [filename, id_])
+        try:
+            self.alarm.show()
+        except GLib.Error:
+            log.warning('Alarm notification could not be displayed: check '
                         'that you have a notification server installed, '
                         'properly configured and running')
 
@@ -142,7 +142,7 @@ class BlinkingTrayIcon():
 
         self._update_tooltip()
 
-        organism_alarms_api.bind_to_alarm(self._blink_after)
+        organism_alarms_api.bind_to_alarms(self._blink_after)
         organism_alarms_api.bind_to_alarm_off(self._stop_after)
         wxgui_api.bind_to_close_database(self._stop_after)
         core_api.bind_to_exit_app_2(self._exit)
@@ -152,20 +152,23 @@ class BlinkingTrayIcon():
         # signalled many times in a loop, so that self.blink is executed only
         # once after the last signal
         filename = kwargs['filename']
-        alarmid = kwargs['alarmid']
+        alarmids = set(alarm['alarmid'] for alarm in kwargs['alarms'])
 
         # Keep track of the active alarms because the alarm event is signalled
         # every time occurrences are searched and old alarms are found, so not
         # doing this check would blink the tray icon every time occurrences
         # are searched if there are already-open alarms
         # Do this check here and not in self._blink, otherwise only the last
-        # handled alarm would be checked
-        if filename not in self.active_alarms:
-            self.active_alarms[filename] = [alarmid, ]
-        elif alarmid not in self.active_alarms[filename]:
-            self.active_alarms[filename].append(alarmid)
+        # handled alarms would be checked
+        try:
+            active = self.active_alarms[filename]
+        except KeyError:
+            self.active_alarms[filename] = alarmids
         else:
-            return False
+            if alarmids <= active:
+                return False
+
+            active.update(alarmids)
 
         # self._blink_later uses wx.CallLater, which cannot be called from
         # other threads than the main one
@@ -108,7 +108,7 @@ class AlarmsWindow(object):
         wxgui_api.bind_to_menu(self.toggle_shown, self.menushow)
         wxgui_api.bind_to_menu_view_update(self._handle_menu_view_update)
 
-        organism_alarms_api.bind_to_alarm(self._handle_alarm)
+        organism_alarms_api.bind_to_alarms(self._handle_alarms)
         organism_alarms_api.bind_to_alarm_off(self._handle_alarm_off)
         wxgui_api.bind_to_close_database(self._handle_close_db)
 
@@ -268,10 +268,10 @@ class AlarmsWindow(object):
     def _handle_close_db(self, kwargs):
         self._close_alarms(filename=kwargs['filename'])
 
-    def _handle_alarm(self, kwargs):
+    def _handle_alarms(self, kwargs):
         # Using CallAfter can cause (minor) bugs if the core timer is refreshed
         # in a loop (events could be displayed when not necessary...)
-        wx.CallAfter(self._append, **kwargs)
+        wx.CallAfter(self._append, kwargs['filename'], kwargs['alarms'])
 
     def _handle_alarm_off(self, kwargs):
         filename = kwargs['filename']
@@ -282,13 +282,11 @@ class AlarmsWindow(object):
             id_ = kwargs['id_']
             self._close_alarms(filename=filename, id_=id_)
 
-    def _append(self, filename, id_, alarmid, start, end, alarm):
-        a = self.make_alarmid(filename, alarmid)
-
+    def _append(self, filename, alarms):
         # Check whether the database is still open because this method is
-        # called with wx.CallAfter in _handle_alarm, thus running in a
-        # different thread; this way it can happen that, when _handle_alarm is
-        # called, a database is still open, but when this method is called,
+        # called with wx.CallAfter in _handle_alarms, thus running in a
+        # different thread; this way it can happen that, when _handle_alarms
+        # is called, a database is still open, but when this method is called,
         # that database has been already closed; this would happen for example
         # when closing all the databases: after each database is closed (in
         # rapid succession), all the remaining alarms are searched and
@@ -296,20 +294,31 @@ class AlarmsWindow(object):
         # thread) the alarm's database would have already been closed, thus
         # raising an exception later when looking information for the item
         # (e.g. core_api.get_item_text)
-        # Also, for the same reason, check if the item exists, as for example
-        # performing several undos/redos of the database in rapid succession
-        # (e.g. using CTRL+Z/Y) would cause the same issue
-        if core_api.is_database_open(filename) and \
-                                        core_api.is_item(filename, id_) and \
-                                        a not in self.alarms:
-            self.alarms[a] = Alarm(self, filename, id_, alarmid, start, end,
-                                                                        alarm)
-
-            if len(self.alarms) < self.LIMIT + 1:
-                self.alarms[a].show()
-            else:
-                self.hiddenalarms.add(a)
+        if not core_api.is_database_open(filename):
+            return
+
+        appended = False
+
+        for alarm in alarms:
+            a = self.make_alarmid(filename, alarm['alarmid'])
+
+            # Also, for the same reason, check if the item exists, as for
+            # example performing several undos/redos of the database in rapid
+            # succession (e.g. using CTRL+Z/Y) would cause the same issue
+            if core_api.is_item(filename, alarm['id_']) and \
+                                                        a not in self.alarms:
+                self.alarms[a] = Alarm(self, filename, alarm['id_'],
+                                        alarm['alarmid'], alarm['start'],
+                                        alarm['end'], alarm['alarm'])
+
+                if len(self.alarms) < self.LIMIT + 1:
+                    self.alarms[a].show()
+                else:
+                    self.hiddenalarms.add(a)
+
+                appended = True
 
+        if appended:
             # Besides being much slower, calling Layout and the other
             # functions at every append would raise an exception for
             # excessive recursions in case of too many alarms are signalled
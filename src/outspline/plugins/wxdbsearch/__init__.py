@@ -32,9 +32,12 @@ import outspline.core_api as core_api
 import outspline.interfaces.wxgui_api as wxgui_api
 
 import msgboxes
+import textindex
+import scan
 
 mainmenu = None
 searches = []
+indexes = None
 nb_icon_index = None
 nb_icon_refresh_index = None
 
@@ -80,6 +83,8 @@ class SearchView(object):
         self.panel._init_tab_menu()
 
         self.threads = 0
+        # The reader connections used by the ongoing search threads
+        self.readers = {}
         self.search_threaded_action = self._search_threaded_stop
         self.finish_search_action = self._finish_search_dummy
 
@@ -164,55 +169,75 @@ class SearchView(object):
         string = self.filters.text.GetValue()
         self._set_title(string)
 
+        flags = re.MULTILINE
+
+        if not self.filters.option5.GetValue():
+            flags |= re.IGNORECASE
+
+        # The literals are only needed to query the text index
         if not self.filters.option4.GetValue():
+            literals = [string]
             string = re.escape(string)
+        else:
+            literals = textindex.get_required_literals(string, flags)
 
         self.results.reset()
         self.search_threaded_action = self._search_threaded_continue
         self.finish_search_action = self._finish_search_dummy
 
-        flags = re.MULTILINE
-
-        if not self.filters.option5.GetValue():
-            flags |= re.IGNORECASE
-
         try:
             regexp = re.compile(string, flags)
         except re.error:
             msgboxes.bad_regular_expression().ShowModal()
             self.finish_search()
         else:
-            # Note that the databases are released *before* the threads are
-            # terminated: this is safe as no more calls to the databases are
-            # made after core_api.get_all_items_text in
-            # self._finish_search_restart_database
-            if core_api.block_databases():
-                if self.filters.option1.GetValue():
-                    filename = wxgui_api.get_selected_database_filename()
-                    self._finish_search_restart_database(filename, regexp)
-                else:
-                    for filename in core_api.get_open_databases():
-                        self._finish_search_restart_database(filename, regexp)
+            # Read the options here in the main thread, not in the search
+            # threads
+            options = (self.filters.option2.GetValue(),
+                                            self.filters.option3.GetValue())
+
+            if self.filters.option1.GetValue():
+                filenames = (wxgui_api.get_selected_database_filename(), )
+            else:
+                filenames = core_api.get_open_databases()
+
+            # The search only reads the databases, so it doesn't need to wait
+            # for other searches, e.g. of the next occurrences
+            if core_api.block_databases_read(filenames):
+                for filename in filenames:
+                    self._finish_search_restart_database(filename, regexp,
+                                                            literals, options)
 
                 # Note that the databases are released *before* the threads are
-                # terminated: this is safe as no more calls to the databases
-                # are made after core_api.get_all_items_text in
+                # terminated: this is safe as the threads only read the text
+                # index or the reader connections taken in
                 # self._finish_search_restart_database
-                core_api.release_databases()
+                core_api.release_databases_read(filenames)
             else:
                 self.finish_search()
 
-    def _finish_search_restart_database(self, filename, regexp):
+    def _finish_search_restart_database(self, filename, regexp, literals,
+                                                                    options):
         # It's not easy to benchmark the search for all the databases
         # at once, as the searches are done in separate threads
         search_start = (time.time(), time.clock())
 
-        # Retrieve all the rows immediately (based on fetchall()):
-        # retrieving row by row (based on fetchone()) would need
-        # querying the database in the thread, which would be faster
-        # but exposed to race conditions
-        rows = core_api.get_all_items_text(filename)
-        iterator = iter(rows)
+        # Take the rows, or the copy of the table that they will be read from,
+        # immediately: doing it in the thread would be exposed to race
+        # conditions
+        if indexes:
+            # Only the items that contain the literals of the search can
+            # match, and they still have to be verified with the regular
+            # expression
+            rows = indexes.get_rows(filename, literals)
+        else:
+            # The rows are fetched in the thread, from a copy of the table
+            # that doesn't need the connection of the database
+            rconn = core_api.get_reader_connection(filename, ('Items', ))
+            self.readers[filename] = rconn
+            rows = core_api.get_all_items(filename, reader=rconn)
+
+        iterator = scan.iterate_matches(regexp, rows, options[0], options[1])
 
         # A thread for each database is instantiated and started
         thread = threading.Thread(
@@ -224,13 +249,16 @@ class SearchView(object):
 
     # use tail call optimization to avoid Python's limit to recursions
     # (sys.getrecursionlimit()), which would lead to an exception in case of
-    # databases with more items than such limit
+    # databases with more chunks of items than such limit
     @tail_call_optimized
     def _search_threaded_continue(self, regexp, filename, iterator, results,
                                                                 search_start):
         try:
-            row = iterator.next()
+            # The iterator yields the results of a chunk of items at a time
+            chunk = iterator.next()
         except StopIteration:
+            self._give_reader(filename)
+
             log.debug('Search in {} completed in {} (time) / {} (clock) s'
                                             ''.format(filename,
                                             time.time() - search_start[0],
@@ -243,31 +271,17 @@ class SearchView(object):
             # time a match is found
             wx.CallAfter(self.results.display, filename, fname, results)
         else:
-            id_ = row['I_id']
-            text = row['I_text']
-
-            heading = text.partition('\n')[0]
-
-            try:
-                if self.filters.option2.GetValue():
-                    text = heading
-            except wx.PyDeadObjectError:
-                # If the application is closed while the search is ongoing,
-                #  this is where it would crash
-                # If there were more problems, consider running this thread as
-                #  a daemon
-                pass
-            else:
-                results = self._find_match_lines(regexp, id_, heading, text,
-                                                                    results)
+            results.extend(chunk)
 
-                # Use a recursion instead of a simple for loop, so that it will
-                # be easy to stop the search from the main thread if needed
-                self.search_threaded_action(regexp, filename, iterator,
-                                                        results, search_start)
+            # Use a recursion instead of a simple for loop, so that it will
+            # be easy to stop the search from the main thread if needed
+            self.search_threaded_action(regexp, filename, iterator, results,
+                                                                search_start)
 
     def _search_threaded_stop(self, regexp, filename, iterator, results,
                                                                 search_start):
+        self._give_reader(filename)
+
         log.debug('Search in {} stopped after {} (time) / {} (clock) s'
                                             ''.format(filename,
                                             time.time() - search_start[0],
@@ -276,63 +290,14 @@ class SearchView(object):
         # The number of ongoing threads must be updated in the main thread
         wx.CallAfter(self.finish_search)
 
-    def _find_match_lines(self, regexp, id_, heading, text, results):
-        # I can't use a simple for loop because previous_line_index must be
-        # initialized at the first iteration
-        iterator = regexp.finditer(text)
-
+    def _give_reader(self, filename):
         try:
-            match = iterator.next()
-        except StopIteration:
+            rconn = self.readers.pop(filename)
+        except KeyError:
+            # The text index was used
             pass
         else:
-            line, previous_line_end_index = self._find_match_line(text, 0,
-                                                                match.start())
-            results.append((id_, heading, line))
-
-            if not self.filters.option3.GetValue():
-                while True:
-                    try:
-                        match = iterator.next()
-                    except StopIteration:
-                        break
-                    else:
-                        # Don't use >= because if looking for an expression
-                        # that starts with '\n', the one starting at
-                        # previous_line_end_index (which is always a '\n'
-                        # character except at the last iteration) will have
-                        # been found at the previous iteration
-                        if match.start() > previous_line_end_index:
-                            line, previous_line_end_index = \
-                                        self._find_match_line(text,
-                                        previous_line_end_index, match.start())
-                            results.append((id_, heading, line))
-
-        return results
-
-    def _find_match_line(self, text, previous_line_end_index, match_start):
-        # Add 1 so that the line doesn't start with the '\n'
-        # If the first match is in the first line, rfind will return -1, so
-        # adding 1 will give 0 which is still the expected index
-        # For the matches after the first one (which are already filtered for
-        # being all on different lines) rfind will always find an index (and
-        # never return -1) because previous_line_end_index is always the index
-        # of a '\n' character
-        # If match_start is the index of a '\n' character, line_start will be
-        # the *previous* '\n' character, which is expected, as '\n' characters
-        # are considered to be part of the previous line (specifically its
-        # final character)
-        line_start = text.rfind('\n', previous_line_end_index, match_start) + 1
-
-        try:
-            line_end = text.index('\n', line_start)
-        except ValueError:
-            # The match is in the last line
-            line_end = len(text)
-
-        line = text[line_start:line_end]
-
-        return (line, line_end)
+            core_api.give_reader_connection(filename, rconn)
 
 
 class SearchFilters(object):
@@ -705,6 +670,11 @@ def main():
     global mainmenu
     mainmenu = MainMenu()
 
+    if coreaux_api.get_plugin_configuration('wxdbsearch').get_bool(
+                                                                'text_index'):
+        global indexes
+        indexes = textindex.DatabaseIndexes()
+
     global nb_icon_index
     nb_icon_index = wxgui_api.add_right_nb_image(
                                     wxgui_api.get_notebook_icon('@dbfind'))
@@ -0,0 +1,109 @@
+# Outspline - A highly modular and extensible outliner.
+# Copyright (C) 2011 Dario Giovannetti <dev@dariogiovannetti.net>
+#
+# This file is part of Outspline.
+#
+# Outspline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Outspline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Outspline.  If not, see <http://www.gnu.org/licenses/>.
+
+import itertools
+
+# The rows are scanned in chunks, so that a search can be stopped between two
+#  chunks
+CHUNK = 1000
+
+
+def find_matches(regexp, rows, heading_only, one_result):
+    results = []
+
+    for id_, text in rows:
+        heading = text.partition('\n')[0]
+
+        if heading_only:
+            text = heading
+
+        _find_match_lines(regexp, id_, heading, text, one_result, results)
+
+    return results
+
+
+def _find_match_lines(regexp, id_, heading, text, one_result, results):
+    # I can't use a simple for loop because previous_line_index must be
+    # initialized at the first iteration
+    iterator = regexp.finditer(text)
+
+    try:
+        match = iterator.next()
+    except StopIteration:
+        pass
+    else:
+        line, previous_line_end_index = _find_match_line(text, 0,
+                                                                match.start())
+        results.append((id_, heading, line))
+
+        if not one_result:
+            while True:
+                try:
+                    match = iterator.next()
+                except StopIteration:
+                    break
+                else:
+                    # Don't use >= because if looking for an expression
+                    # that starts with '\n', the one starting at
+                    # previous_line_end_index (which is always a '\n'
+                    # character except at the last iteration) will have
+                    # been found at the previous iteration
+                    if match.start() > previous_line_end_index:
+                        line, previous_line_end_index = _find_match_line(text,
+                                        previous_line_end_index, match.start())
+                        results.append((id_, heading, line))
+
+
+def _find_match_line(text, previous_line_end_index, match_start):
+    # Add 1 so that the line doesn't start with the '\n'
+    # If the first match is in the first line, rfind will return -1, so
+    # adding 1 will give 0 which is still the expected index
+    # For the matches after the first one (which are already filtered for
+    # being all on different lines) rfind will always find an index (and
+    # never return -1) because previous_line_end_index is always the index
+    # of a '\n' character
+    # If match_start is the index of a '\n' character, line_start will be
+    # the *previous* '\n' character, which is expected, as '\n' characters
+    # are considered to be part of the previous line (specifically its
+    # final character)
+    line_start = text.rfind('\n', previous_line_end_index, match_start) + 1
+
+    try:
+        line_end = text.index('\n', line_start)
+    except ValueError:
+        # The match is in the last line
+        line_end = len(text)
+
+    line = text[line_start:line_end]
+
+    return (line, line_end)
+
+
+def iterate_matches(regexp, rows, heading_only, one_result):
+    # Return an iterator yielding the results of each chunk of rows, in order
+    # rows can also be a cursor, whose rows are then fetched one chunk at a
+    # time
+    rows = iter(rows)
+
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK))
+
+        if not chunk:
+            break
+
+        yield find_matches(regexp, chunk, heading_only, one_result)
@@ -0,0 +1,212 @@
+# Outspline - A highly modular and extensible outliner.
+# Copyright (C) 2011 Dario Giovannetti <dev@dariogiovannetti.net>
+#
+# This file is part of Outspline.
+#
+# Outspline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Outspline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Outspline.  If not, see <http://www.gnu.org/licenses/>.
+
+import sre_parse
+import sre_constants
+
+import outspline.core_api as core_api
+
+# The index stores the trigrams of the lowercase text of the items, so that
+#  substring searches, whether case sensitive or not, can be narrowed to the
+#  items that contain all the trigrams of the searched string; the candidate
+#  items must then still be verified with the actual regular expression
+TRIGRAM = 3
+
+
+def get_trigrams(text):
+    text = text.lower()
+    return set(text[i:i + TRIGRAM] for i in xrange(len(text) - TRIGRAM + 1))
+
+
+def get_required_literals(pattern, flags):
+    # Return the literal strings that every match of the regular expression
+    #  must contain; an empty list means that any item can match
+    # Only the literals at the top level of the pattern are considered,
+    #  because groups, alternatives and repetitions may not be matched at all
+    try:
+        parsed = sre_parse.parse(pattern, flags)
+    except (sre_constants.error, OverflowError, RuntimeError):
+        return []
+
+    literals = []
+    run = []
+
+    for op, av in parsed:
+        if op is sre_constants.LITERAL:
+            try:
+                run.append(unichr(av))
+            except ValueError:
+                pass
+            else:
+                continue
+
+        if len(run) >= TRIGRAM:
+            literals.append(u''.join(run))
+
+        run = []
+
+    if len(run) >= TRIGRAM:
+        literals.append(u''.join(run))
+
+    return literals
+
+
+class TextIndex(object):
+    def __init__(self, rows):
+        self.texts = {}
+        self.postings = {}
+
+        for row in rows:
+            self.add(row['I_id'], row['I_text'])
+
+    def add(self, id_, text):
+        self.texts[id_] = text
+
+        for trigram in get_trigrams(text):
+            try:
+                self.postings[trigram].add(id_)
+            except KeyError:
+                self.postings[trigram] = set((id_, ))
+
+    def remove(self, id_):
+        try:
+            text = self.texts.pop(id_)
+        except KeyError:
+            pass
+        else:
+            for trigram in get_trigrams(text):
+                postings = self.postings[trigram]
+                postings.discard(id_)
+
+                if not postings:
+                    del self.postings[trigram]
+
+    def update(self, id_, text):
+        self.remove(id_)
+        self.add(id_, text)
+
+    def get_rows(self, literals):
+        # Return the (id_, text) tuples of the items that contain all the
+        #  trigrams of the given literals, sorted by id like
+        #  core_api.get_all_items_text
+        trigrams = set()
+
+        for literal in literals:
+            trigrams.update(get_trigrams(literal))
+
+        if trigrams:
+            try:
+                postings = sorted((self.postings[trigram]
+                                    for trigram in trigrams), key=len)
+            except KeyError:
+                return []
+
+            # Start from the rarest trigram to keep the intersections small
+            ids = set(postings[0])
+
+            for posting in postings[1:]:
+                ids &= posting
+
+                if not ids:
+                    return []
+        else:
+            ids = self.texts
+
+        return [(id_, self.texts[id_]) for id_ in sorted(ids)]
+
+
+class DatabaseIndexes(object):
+    def __init__(self):
+        # The index of a database is only built when it is searched for the
+        #  first time, and then kept updated until the database is closed
+        self.indexes = {}
+
+        core_api.bind_to_close_database(self._handle_close_database)
+        core_api.bind_to_insert_items(self._handle_insert_items)
+        core_api.bind_to_update_item_text(self._handle_update_item_text)
+        core_api.bind_to_deleted_items(self._handle_deleted_items)
+        core_api.bind_to_history_insert(self._handle_history_insert)
+        core_api.bind_to_history_update_text(
+                                            self._handle_history_update_text)
+        core_api.bind_to_history_remove(self._handle_history_remove)
+
+    def get_rows(self, filename, literals):
+        # This must be called while the databases are blocked
+        try:
+            index = self.indexes[filename]
+        except KeyError:
+            index = self.indexes[filename] = TextIndex(
+                                        core_api.get_all_items_text(filename))
+
+        return index.get_rows(literals)
+
+    def _handle_close_database(self, kwargs):
+        try:
+            del self.indexes[kwargs['filename']]
+        except KeyError:
+            pass
+
+    def _handle_insert_items(self, kwargs):
+        try:
+            index = self.indexes[kwargs['filename']]
+        except KeyError:
+            pass
+        else:
+            for id_, parent, text in kwargs['items']:
+                index.add(id_, text)
+
+    def _handle_update_item_text(self, kwargs):
+        try:
+            index = self.indexes[kwargs['filename']]
+        except KeyError:
+            pass
+        else:
+            index.update(kwargs['id_'], kwargs['text'])
+
+    def _handle_deleted_items(self, kwargs):
+        try:
+            index = self.indexes[kwargs['filename']]
+        except KeyError:
+            pass
+        else:
+            for id_, parent, text in kwargs['items']:
+                index.remove(id_)
+
+    def _handle_history_insert(self, kwargs):
+        try:
+            index = self.indexes[kwargs['filename']]
+        except KeyError:
+            pass
+        else:
+            index.add(kwargs['id_'], kwargs['text'])
+
+    def _handle_history_update_text(self, kwargs):
+        try:
+            index = self.indexes[kwargs['filename']]
+        except KeyError:
+            pass
+        else:
+            index.update(kwargs['id_'], kwargs['text'])
+
+    def _handle_history_remove(self, kwargs):
+        try:
+            index = self.indexes[kwargs['filename']]
+        except KeyError:
+            pass
+        else:
+            index.remove(kwargs['id_'])
@@ -192,6 +192,10 @@ class TreeItemIcons(object):
             self.property_shift, self.property_mask = \
                                             wxgui_api.add_item_property(
                                             filename, 3, char, bits_to_colour)
+            # The tree requests the property of an item when the item is
+            # first displayed
+            wxgui_api.add_item_property_provider(filename,
+                                                        self._provide_property)
 
             links_api.bind_to_upsert_link(self._handle_upsert_link)
             links_api.bind_to_delete_link(self._handle_delete_link)
@@ -200,46 +204,17 @@ class TreeItemIcons(object):
             links_api.bind_to_history_update(self._handle_history)
             links_api.bind_to_history_delete(self._handle_history)
 
-            wxgui_api.bind_to_open_database(self._handle_open_database)
             wxgui_api.bind_to_close_database(self._handle_close_database)
 
             if wxcopypaste_api:
                 wxcopypaste_api.bind_to_items_pasted(self._handle_paste)
 
-    def _handle_open_database(self, kwargs):
-        if kwargs['filename'] == self.filename:
-            rows = links_api.get_existing_links(self.filename)
-            links = set()
-            broken_links = set()
-            targets = set()
-
-            for row in rows:
-                target = row['L_target']
-
-                if target is not None:
-                    links.add(row['L_id'])
-                    targets.add(target)
-                else:
-                    broken_links.add(row['L_id'])
-
-            shift = self.property_shift
-            mask = self.property_mask
-
-            for rbits, set_ in ((1, links - targets),
-                                (2, broken_links - targets),
-                                (3, targets - links - broken_links),
-                                (4, links & targets),
-                                (5, broken_links & targets)):
-                for id_ in set_:
-                    self._update_item(id_, rbits)
-
     def _handle_close_database(self, kwargs):
         if kwargs['filename'] == self.filename:
             links_api.bind_to_upsert_link(self._handle_upsert_link, False)
             links_api.bind_to_delete_link(self._handle_delete_link, False)
             links_api.bind_to_break_link(self._handle_break_links, False)
 
-            wxgui_api.bind_to_open_database(self._handle_open_database, False)
             wxgui_api.bind_to_close_database(self._handle_close_database,
                                                                         False)
             links_api.bind_to_history_insert(self._handle_history, False)
@@ -374,6 +349,10 @@ class TreeItemIcons(object):
 
         return rbits
 
+    def _provide_property(self, id_):
+        return (self._compute_rbits(id_) << self.property_shift,
+                                                            self.property_mask)
+
     def _reset_item_no_tree_update(self, id_):
         rbits = self._compute_rbits(id_)
         self._update_item_no_tree_update(id_, rbits)
@@ -491,22 +491,21 @@ class TreeItemIcons(object):
             self.property_shift, self.property_mask = \
                                             wxgui_api.add_item_property(
                                             filename, 1, char, bits_to_colour)
+            # The tree requests the property of an item when the item is
+            # first displayed
+            wxgui_api.add_item_property_provider(filename,
+                                                        self._provide_property)
 
             organism_api.bind_to_update_item_rules_conditional(
                                                     self._handle_update_rules)
             organism_api.bind_to_history_insert(self._handle_history)
             organism_api.bind_to_history_update(self._handle_history)
 
-            wxgui_api.bind_to_open_database(self._handle_open_database)
             wxgui_api.bind_to_close_database(self._handle_close_database)
 
             if wxcopypaste_api:
                 wxcopypaste_api.bind_to_items_pasted(self._handle_paste)
 
-    def _handle_open_database(self, kwargs):
-        if kwargs['filename'] == self.filename:
-            self._update_all_items()
-
     def _handle_close_database(self, kwargs):
         if kwargs['filename'] == self.filename:
             organism_api.bind_to_update_item_rules_conditional(
@@ -514,7 +513,6 @@ class TreeItemIcons(object):
             organism_api.bind_to_history_insert(self._handle_history, False)
             organism_api.bind_to_history_update(self._handle_history, False)
 
-            wxgui_api.bind_to_open_database(self._handle_open_database, False)
             wxgui_api.bind_to_close_database(self._handle_close_database,
                                                                         False)
 
@@ -536,20 +534,19 @@ class TreeItemIcons(object):
                 rules = organism_api.get_item_rules(self.filename, id_)
                 self._update_item(id_, rules)
 
-    def _update_all_items(self):
-        for row in organism_api.get_all_item_rules(self.filename):
-            id_ = row['R_id']
-            rules = organism_api.convert_string_to_rules(row['R_rules'])
-            self._update_item(id_, rules)
+    def _provide_property(self, id_):
+        return (self._compute_bits(organism_api.get_item_rules(self.filename,
+                                                    id_)), self.property_mask)
 
-    def _update_item_properties(self, id_, rules):
+    def _compute_bits(self, rules):
         if len(rules) > 0:
-            bits = 1 << self.property_shift
+            return 1 << self.property_shift
         else:
-            bits = 0 << self.property_shift
+            return 0 << self.property_shift
 
-        wxgui_api.update_item_properties(self.filename, id_, bits,
-                                                            self.property_mask)
+    def _update_item_properties(self, id_, rules):
+        wxgui_api.update_item_properties(self.filename, id_,
+                                self._compute_bits(rules), self.property_mask)
 
     def _update_item_no_tree_update(self, id_, rules):
         self._update_item_properties(id_, rules)
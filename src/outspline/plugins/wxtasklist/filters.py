@@ -28,8 +28,6 @@ from outspline.static.wxclasses.timectrls import DateHourCtrl, TimeSpanCtrl
 from outspline.static.wxclasses.misc import NarrowSpinCtrl
 
 import outspline.coreaux_api as coreaux_api
-import outspline.extensions.organism_api as organism_api
-import outspline.extensions.organism_timer_api as organism_timer_api
 import outspline.interfaces.wxgui_api as wxgui_api
 
 from exceptions import SearchOutOfRangeError
@@ -1091,15 +1089,21 @@ class FilterRelative(object):
             'years': FilterRelativeYears,
         }[config['unit']](low, high)
 
+        self.NEXT_OCCURRENCE = self.filter.NEXT_OCCURRENCE
+
     def compute_limits(self, now):
         return self.filter.compute_limits(now)
 
-    def compute_delay(self, occsobj, now, mint, maxt):
-        return self.filter.compute_delay(occsobj, now, mint, maxt)
+    def compute_delay(self, occsobj, nextoccs, now, mint, maxt):
+        return self.filter.compute_delay(occsobj, nextoccs, now, mint,
+                                                                        maxt)
 
 
 class FilterRelativeMinutes(object):
     def __init__(self, low, high):
+        # The delay depends on the next occurrence after maxt, which is then
+        #  searched together with the occurrences in the range
+        self.NEXT_OCCURRENCE = True
         self.CORRECTION = 1
         self.low = low * 60
         self.high = high * 60
@@ -1116,23 +1120,9 @@ class FilterRelativeMinutes(object):
         maxt = anow + self.high - self.CORRECTION
         return (mint, maxt)
 
-    def compute_delay(self, occsobj, now, mint, maxt):
+    def compute_delay(self, occsobj, nextoccs, now, mint, maxt):
         next_completion = occsobj.get_next_completion_time()
 
-        filenames = organism_api.get_supported_open_databases()
-
-        # Note that this does *not* use
-        # organism_timer_api.search_next_occurrences which would signal
-        # search_next_occurrences_event, thus making this very method recur
-        # infinitely
-        search = organism_timer_api.get_next_occurrences(base_time=maxt,
-                                                        filenames=filenames)
-        # For the moment there seems to be no need to stop the search if a
-        # database is closed, in fact the search seems to terminate cleanly
-        # and it should take a reasonable time to complete
-        search.start()
-        nextoccs = search.get_results()
-
         # Note that next_occurrence could even be a time of an occurrence
         # that's already displayed in the list (e.g. if an occurrence has a
         # start time within the queried range but an end time later than the
@@ -1182,6 +1172,7 @@ class FilterRelativeMinutes(object):
 
 class FilterRelativeHours(object):
     def __init__(self, low, high):
+        self.NEXT_OCCURRENCE = False
         self.low = low * 3600
         self.high = high * 3600
 
@@ -1194,7 +1185,7 @@ class FilterRelativeHours(object):
         maxt = anow + self.high - 1
         return (mint, maxt)
 
-    def compute_delay(self, occsobj, now, mint, maxt):
+    def compute_delay(self, occsobj, nextoccs, now, mint, maxt):
         # Note that the delay can still be further limited in
         # RefreshEngine._restart
         return 3600 - now % 3600
@@ -1202,6 +1193,7 @@ class FilterRelativeHours(object):
 
 class FilterRelativeDays(object):
     def __init__(self, low, high):
+        self.NEXT_OCCURRENCE = False
         self.utcoffset = timeaux.UTCOffset()
         self.low = low * 86400
         self.high = high * 86400
@@ -1227,7 +1219,7 @@ class FilterRelativeDays(object):
             maxt = anow + self.high - 1
             return (mint, maxt)
 
-    def compute_delay(self, occsobj, now, mint, maxt):
+    def compute_delay(self, occsobj, nextoccs, now, mint, maxt):
         # Note that the delay can still be further limited in
         # RefreshEngine._restart
         # Subtract self.nowoffset *before* modding by 86400 or negative values
@@ -1237,6 +1229,7 @@ class FilterRelativeDays(object):
 
 class FilterRelativeWeeks(object):
     def __init__(self, low, high):
+        self.NEXT_OCCURRENCE = False
         self.low = low * 604800
         self.high = high * 604800
         self.firstweekday = coreaux_api.get_plugin_configuration('wxtasklist'
@@ -1263,7 +1256,7 @@ class FilterRelativeWeeks(object):
             maxt = self.weekstart + self.high - 1
             return (mint, maxt)
 
-    def compute_delay(self, occsobj, now, mint, maxt):
+    def compute_delay(self, occsobj, nextoccs, now, mint, maxt):
         # Note that the delay can still be further limited in
         # RefreshEngine._restart
         return self.weekstart + 604800 - now
@@ -1271,6 +1264,7 @@ class FilterRelativeWeeks(object):
 
 class FilterRelativeMonths(object):
     def __init__(self, low, high):
+        self.NEXT_OCCURRENCE = False
         self.low = low
         self.high = high
 
@@ -1298,7 +1292,7 @@ class FilterRelativeMonths(object):
         else:
             return (mint, maxt)
 
-    def compute_delay(self, occsobj, now, mint, maxt):
+    def compute_delay(self, occsobj, nextoccs, now, mint, maxt):
         # I should add 1 to self.dnow.month, but I should also subtract 1
         # because I need 0-based months
         rnyear, nmonth = divmod(self.dnow.month, 12)
@@ -1311,6 +1305,7 @@ class FilterRelativeMonths(object):
 
 class FilterRelativeYears(object):
     def __init__(self, low, high):
+        self.NEXT_OCCURRENCE = False
         self.low = low
         self.high = high
 
@@ -1337,7 +1332,7 @@ class FilterRelativeYears(object):
         else:
             return (mint, maxt)
 
-    def compute_delay(self, occsobj, now, mint, maxt):
+    def compute_delay(self, occsobj, nextoccs, now, mint, maxt):
         ndate = _datetime.date(year=self.dnow.year + 1, month=1, day=1)
         # Note that the delay can still be further limited in
         # RefreshEngine._restart
@@ -1346,6 +1341,7 @@ class FilterRelativeYears(object):
 
 class FilterDate(object):
     def __init__(self, config):
+        self.NEXT_OCCURRENCE = False
         # The values are already validated in the FilterConfigurationDate
         self.low = int(_time.mktime(config['lowdate'].timetuple()))
         # Add 86400 because the stored date is included in the range, but I
@@ -1357,12 +1353,13 @@ class FilterDate(object):
     def compute_limits(self, now):
         return (self.low, self.high)
 
-    def compute_delay(self, occsobj, now, mint, maxt):
+    def compute_delay(self, occsobj, nextoccs, now, mint, maxt):
         return None
 
 
 class FilterMonth(object):
     def __init__(self, config):
+        self.NEXT_OCCURRENCE = False
         # The values are already validated in the FilterConfigurationMonth
         lowdate = _datetime.date(config['lowyear'], config['lowmonth0'] + 1, 1)
         highdate = _datetime.date(config['highyear'], config['highmonth0'] + 1,
@@ -1385,5 +1382,5 @@ class FilterMonth(object):
     def compute_limits(self, now):
         return (self.low, self.high)
 
-    def compute_delay(self, occsobj, now, mint, maxt):
+    def compute_delay(self, occsobj, nextoccs, now, mint, maxt):
         return None
@@ -22,7 +22,6 @@ import sys
 import time as _time
 import datetime as _datetime
 import os
-import string as string_
 import threading
 
 from outspline.static.pyaux.timeaux import TimeSpanFormatters
@@ -38,6 +37,7 @@ import outspline.interfaces.wxgui_api as wxgui_api
 
 import filters
 import menus
+from timealloc import TimeAllocation
 from exceptions import SearchOutOfRangeError, ResultsOutOfRangeError
 
 
@@ -704,9 +704,23 @@ class RefreshEngine(object):
                     wx.CallAfter(self._refresh_end, delay)
 
     def _refresh_continue(self):
-        self.search = organism_api.get_occurrences_range(mint=self.min_time,
-                        maxt=self.max_time,
-                        filenames=organism_api.get_supported_open_databases())
+        filenames = organism_api.get_supported_open_databases()
+
+        if self.filter_.NEXT_OCCURRENCE:
+            # The filter needs also the next occurrence after the range to
+            #  compute the refresh delay: look for it in the same pass over the
+            #  rules
+            # Note that this does *not* use
+            #  organism_timer_api.search_next_occurrences which would signal
+            #  search_next_occurrences_event, thus making the tasklist refresh
+            #  recur infinitely
+            self.search = organism_timer_api.get_occurrences_range_and_next(
+                            mint=self.min_time, maxt=self.max_time,
+                            filenames=filenames)
+        else:
+            self.search = organism_api.get_occurrences_range(
+                            mint=self.min_time, maxt=self.max_time,
+                            filenames=filenames)
 
         try:
             self.search.start()
@@ -728,11 +742,13 @@ class RefreshEngine(object):
             raise RefreshEngineStop()
 
         occsobj = self.search.get_results()
-        occurrences = occsobj.get_list()
 
-        if len(occurrences) > self.LIMIT:
+        # Check the limit before building the occurrence dictionaries
+        if occsobj.get_count() > self.LIMIT:
             raise RefreshEngineLimit()
 
+        occurrences = occsobj.get_list()
+
         # Always add active (but not snoozed) alarms if time interval includes
         # current time
         if self.occview.is_time_in_range(self.now, self.min_time,
@@ -744,6 +760,7 @@ class RefreshEngine(object):
         self.occs[:] = []
         self.activealarms.clear()
         self.pastN = 0
+        self.formatter.clear_date_caches()
 
         self.timealloc = TimeAllocation(self.min_time, self.max_time,
                                                             self.occview, self)
@@ -768,8 +785,13 @@ class RefreshEngine(object):
 
         self.timealloc.insert_gaps_and_overlappings()
 
-        delay = self.filter_.compute_delay(occsobj, self.now, self.min_time,
-                                                                self.max_time)
+        if self.filter_.NEXT_OCCURRENCE:
+            nextoccs = self.search.get_next_results()
+        else:
+            nextoccs = None
+
+        delay = self.filter_.compute_delay(occsobj, nextoccs, self.now,
+                                                self.min_time, self.max_time)
 
         return delay
 
@@ -783,15 +805,20 @@ class RefreshEngine(object):
                                                                 item.get_end())
         self._insert_item(item)
 
-    def insert_gap(self, start, end, minstart, maxend):
-        item = ListAuxiliaryItem('[gap]', start, end, minstart, maxend, 'gap',
-                                                    self.now, self.formatter)
-        self._insert_item(item)
+    def insert_gaps(self, intervals):
+        self._insert_auxiliary_items('[gap]', 'gap', intervals)
 
-    def insert_overlapping(self, start, end, minstart, maxend):
-        item = ListAuxiliaryItem('[overlapping]', start, end, minstart, maxend,
-                                    'overlapping', self.now, self.formatter)
-        self._insert_item(item)
+    def insert_overlappings(self, intervals):
+        self._insert_auxiliary_items('[overlapping]', 'overlapping', intervals)
+
+    def _insert_auxiliary_items(self, title, type_, intervals):
+        # intervals is the list of all the (start, end, minstart, maxend)
+        #  tuples of the gaps or overlappings, which are inserted at once
+        items = [ListAuxiliaryItem(title, start, end, minstart, maxend, type_,
+                                                    self.now, self.formatter)
+                                for start, end, minstart, maxend in intervals]
+        self.occs.extend(items)
+        self.pastN += sum(item.get_past_count() for item in items)
 
     def _insert_item(self, item):
         self.occs.append(item)
@@ -803,122 +830,6 @@ class RefreshEngine(object):
         #  because it would be subject to the same race conditions as self.occs
 
 
-class TimeAllocation(object):
-    def __init__(self, min_time, max_time, occview, refengine):
-        self.min_time = min_time
-        self.max_time = max_time
-        self.occview = occview
-        self.refengine = refengine
-
-        self.show_gaps, self.show_overlappings = \
-                            self.occview.get_gaps_and_overlappings_setting()
-
-        if self.show_gaps or self.show_overlappings:
-            # Bit array that stores the minutes occupied by at least an
-            # occurrence
-            self.time_allocation = 0
-
-            # Bit array that stores the minutes occupied by at least two
-            # occurrences
-            self.time_allocation_overlap = 0
-
-            self.compute_time_allocation = self._compute_time_allocation_real
-            self.insert_gaps_and_overlappings = \
-                                        self._insert_gaps_and_overlappings_real
-        else:
-            self.compute_time_allocation = self._compute_time_allocation_dummy
-            self.insert_gaps_and_overlappings = \
-                                    self._insert_gaps_and_overlappings_dummy
-
-    def compute_time_allocation(self, start, end):
-        # This method is assigned dynamically
-        pass
-
-    def _compute_time_allocation_real(self, start, end):
-        # Don't even think of using the duration calculated for the occurrence,
-        # since part of it may be out of the interval
-        # The occurrence could span outside of the interval, for example if
-        # it's been retrieved because its alarm time is in the interval instead
-        # If end is None the following test will never be True
-        # Also consider start == self.max_time, in accordance with the
-        # behaviour of the occurrence search algorithm
-        if start <= self.max_time and end > self.min_time:
-            minr = max((start - self.min_time, 0)) // 60
-            # Add 1 to self.max_time because if an occurrence is exceeding it,
-            # it *is* occupying that minute too
-            maxr = (min((end, self.max_time + 60)) - self.min_time) // 60
-            interval = maxr - minr
-            occrarr = 2 ** interval - 1
-            occarr = occrarr << minr
-            occoverlap = self.time_allocation & occarr
-            self.time_allocation |= occarr
-            self.time_allocation_overlap |= occoverlap
-
-    def _compute_time_allocation_dummy(self, start, end):
-        pass
-
-    def insert_gaps_and_overlappings(self):
-        # This method is assigned dynamically
-        pass
-
-    def _insert_gaps_and_overlappings_real(self):
-        # Don't find gaps/overlappings for occurrences out of the search
-        # interval, e.g. old active alarms
-        # Add 1 minute to self.max_time (and hence to the whole interval)
-        # because that minute is *included* in the occurrence search interval
-        interval = (self.max_time + 60 - self.min_time) // 60
-
-        if self.show_gaps:
-            gaps = '{:b}'.format(self.time_allocation).zfill(interval
-                                ).translate(string_.maketrans("10","01"))[::-1]
-            self._find_gaps_or_overlappings(gaps, self.refengine.insert_gap)
-
-        if self.show_overlappings:
-            overlappings = '{:b}'.format(self.time_allocation_overlap).zfill(
-                                                                interval)[::-1]
-            self._find_gaps_or_overlappings(overlappings,
-                                            self.refengine.insert_overlapping)
-
-    def _insert_gaps_and_overlappings_dummy(self):
-        pass
-
-    def _find_gaps_or_overlappings(self, bitstring, call):
-        maxend = False
-
-        # Find a gap/overlapping at the beginning of the interval separately
-        if bitstring[0] == '1':
-            bitstart = 0
-
-            bitend, maxend = self._find_gaps_or_overlappings_continue(
-                                    bitstring, bitstart, True, maxend, call)
-        else:
-            bitend = 0
-
-        while True:
-            try:
-                bitstart = bitstring.index('01', bitend) + 1
-            except ValueError:
-                break
-            else:
-                bitend, maxend = self._find_gaps_or_overlappings_continue(
-                                    bitstring, bitstart, False, maxend, call)
-
-    def _find_gaps_or_overlappings_continue(self, bitstring, bitstart,
-                                                    minstart, maxend, call):
-        try:
-            bitend = bitstring.index('10', bitstart) + 1
-        except ValueError:
-            bitend = len(bitstring)
-            maxend = True
-
-        start = bitstart * 60 + self.min_time
-        end = bitend * 60 + self.min_time
-
-        call(start, end, minstart, maxend)
-
-        return (bitend, maxend)
-
-
 class Formatter(object):
     def __init__(self, config, listview):
         self.config = config
@@ -933,6 +844,12 @@ class Formatter(object):
         if self.alarmformat == 'start':
             self.alarmformat = self.startformat
 
+        # The formatted dates are cached for the duration of a refresh, since
+        #  the same times are often shared by several occurrences, gaps and
+        #  overlappings; the caches of identical formats are shared
+        self.datecaches = {}
+        self.clear_date_caches()
+
         if config('Formats')['database'] == 'full':
             self.format_database = self._format_database_full
         else:
@@ -1005,6 +922,33 @@ class Formatter(object):
     def get_alarm_format(self):
         return self.alarmformat
 
+    def clear_date_caches(self):
+        # The caches are not kept between refreshes to prevent them from
+        #  growing indefinitely
+        self.datecaches.clear()
+
+        for format_ in (self.startformat, self.endformat, self.alarmformat):
+            self.datecaches[format_] = {}
+
+    def format_start_date(self, timestamp):
+        return self._format_date(self.startformat, timestamp)
+
+    def format_end_date(self, timestamp):
+        return self._format_date(self.endformat, timestamp)
+
+    def format_alarm_date(self, timestamp):
+        return self._format_date(self.alarmformat, timestamp)
+
+    def _format_date(self, format_, timestamp):
+        cache = self.datecaches[format_]
+
+        try:
+            return cache[timestamp]
+        except KeyError:
+            date = cache[timestamp] = _time.strftime(format_,
+                                                    _time.localtime(timestamp))
+            return date
+
     def get_color(self, type_):
         return self.colors[type_]
 
@@ -1257,12 +1201,10 @@ class ListRegularItem(_ListItem):
         text = core_api.get_item_text(self.filename, self.id_)
         self.title = text.partition('\n')[0]
 
-        self.startdate = _time.strftime(formatter.get_start_format(),
-                                                _time.localtime(self.start))
+        self.startdate = formatter.format_start_date(self.start)
 
         if self.end is not None:
-            self.enddate = _time.strftime(formatter.get_end_format(),
-                                                    _time.localtime(self.end))
+            self.enddate = formatter.format_end_date(self.end)
             self.duration = self.end - self.start
             self.durationstr = formatter.format_duration(self.duration)
         else:
@@ -1283,8 +1225,7 @@ class ListRegularItem(_ListItem):
         # Note that testing if isinstance(alarm, int) *before* testing if
         # alarm is False would return True also when alarm is False!
         else:
-            self.alarmdate = _time.strftime(formatter.get_alarm_format(),
-                                                _time.localtime(self.alarm))
+            self.alarmdate = formatter.format_alarm_date(self.alarm)
             self.alarmid = None
 
 
@@ -1323,8 +1264,7 @@ class ListAuxiliaryItem(_ListItem):
             # every minute
             self.startdate = ''
         else:
-            self.startdate = _time.strftime(formatter.get_start_format(),
-                                                _time.localtime(self.start))
+            self.startdate = formatter.format_start_date(self.start)
 
         # Do *not* merge this check with the others for minstart (above) and
         # maxend (below)
@@ -1343,7 +1283,6 @@ class ListAuxiliaryItem(_ListItem):
             # the search interval, otherwise it should be updated every minute
             self.enddate = ''
         else:
-            self.enddate = _time.strftime(formatter.get_end_format(),
-                                                    _time.localtime(self.end))
+            self.enddate = formatter.format_end_date(self.end)
 
         self.alarmdate = ''
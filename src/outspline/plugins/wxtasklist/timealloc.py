@@ -0,0 +1,162 @@
+# Outspline - A highly modular and extensible outliner.
+# Copyright (C) 2011 Dario Giovannetti <dev@dariogiovannetti.net>
+#
+# This file is part of Outspline.
+#
+# Outspline is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# Outspline is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with Outspline.  If not, see <http://www.gnu.org/licenses/>.
+
+# This module must not import wx, so that it can also be benchmarked without
+#  starting the interface (see dev/benchmark_timealloc.py)
+
+
+class TimeAllocation(object):
+    def __init__(self, min_time, max_time, occview, refengine):
+        self.min_time = min_time
+        self.max_time = max_time
+        self.occview = occview
+        self.refengine = refengine
+
+        self.show_gaps, self.show_overlappings = \
+                            self.occview.get_gaps_and_overlappings_setting()
+
+        if self.show_gaps or self.show_overlappings:
+            # The minutes occupied by the occurrences are stored as the
+            # [start, end) intervals of minute indices from the beginning of
+            # the search interval; the gaps and overlappings are then found
+            # by sweeping the sorted start and end indices, so that the cost
+            # only depends on the number of occurrences, and not on the length
+            # of the search interval
+            self.starts = []
+            self.ends = []
+
+            self.compute_time_allocation = self._compute_time_allocation_real
+            self.insert_gaps_and_overlappings = \
+                                        self._insert_gaps_and_overlappings_real
+        else:
+            self.compute_time_allocation = self._compute_time_allocation_dummy
+            self.insert_gaps_and_overlappings = \
+                                    self._insert_gaps_and_overlappings_dummy
+
+    def compute_time_allocation(self, start, end):
+        # This method is assigned dynamically
+        pass
+
+    def _compute_time_allocation_real(self, start, end):
+        # Don't even think of using the duration calculated for the occurrence,
+        # since part of it may be out of the interval
+        # The occurrence could span outside of the interval, for example if
+        # it's been retrieved because its alarm time is in the interval instead
+        # If end is None the following test will never be True
+        # Also consider start == self.max_time, in accordance with the
+        # behaviour of the occurrence search algorithm
+        if start <= self.max_time and end > self.min_time:
+            minr = max((start - self.min_time, 0)) // 60
+            # Add 1 to self.max_time because if an occurrence is exceeding it,
+            # it *is* occupying that minute too
+            maxr = (min((end, self.max_time + 60)) - self.min_time) // 60
+
+            # An occurrence shorter than a minute may not occupy any minute
+            if maxr > minr:
+                self.starts.append(minr)
+                self.ends.append(maxr)
+
+    def _compute_time_allocation_dummy(self, start, end):
+        pass
+
+    def insert_gaps_and_overlappings(self):
+        # This method is assigned dynamically
+        pass
+
+    def _insert_gaps_and_overlappings_real(self):
+        # Don't find gaps/overlappings for occurrences out of the search
+        # interval, e.g. old active alarms
+        # Add 1 minute to self.max_time (and hence to the whole interval)
+        # because that minute is *included* in the occurrence search interval
+        interval = (self.max_time + 60 - self.min_time) // 60
+
+        allocated, overlappings = self._find_allocation()
+
+        if self.show_gaps:
+            gaps = []
+            gapstart = 0
+
+            for start, end in allocated:
+                if start > gapstart:
+                    gaps.append((gapstart, start))
+
+                gapstart = end
+
+            if interval > gapstart:
+                gaps.append((gapstart, interval))
+
+            self._insert_intervals(gaps, interval, self.refengine.insert_gaps)
+
+        if self.show_overlappings:
+            self._insert_intervals(overlappings, interval,
+                                            self.refengine.insert_overlappings)
+
+    def _insert_gaps_and_overlappings_dummy(self):
+        pass
+
+    def _find_allocation(self):
+        # Return the sorted, non-adjacent [start, end) intervals of the minutes
+        # occupied by at least one occurrence, and by at least two occurrences
+        starts = sorted(self.starts)
+        ends = sorted(self.ends)
+        count = len(starts)
+        allocated = []
+        overlappings = []
+        # The number of occurrences occupying the current minute
+        depth = 0
+        s = 0
+        e = 0
+
+        # Every start index is lower than the corresponding end index, so the
+        # last event is always an end
+        while e < count:
+            if s < count and starts[s] < ends[e]:
+                index = starts[s]
+            else:
+                index = ends[e]
+
+            previous = depth
+
+            # Process all the events at the same index together, so that
+            # adjacent intervals are merged
+            while s < count and starts[s] == index:
+                depth += 1
+                s += 1
+
+            while e < count and ends[e] == index:
+                depth -= 1
+                e += 1
+
+            if previous < 1 <= depth:
+                allocstart = index
+            elif depth < 1 <= previous:
+                allocated.append((allocstart, index))
+
+            if previous < 2 <= depth:
+                overlapstart = index
+            elif depth < 2 <= previous:
+                overlappings.append((overlapstart, index))
+
+        return (allocated, overlappings)
+
+    def _insert_intervals(self, intervals, interval, call):
+        # Pass all the intervals at once, converted to times, also telling if
+        # they are at the beginning or at the end of the search interval
+        call([(start * 60 + self.min_time, end * 60 + self.min_time,
+                                                start == 0, end == interval)
+                                                for start, end in intervals])
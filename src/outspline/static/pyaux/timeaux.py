@@ -17,6 +17,7 @@
 # along with pyaux.  If not, see <http://www.gnu.org/licenses/>.
 
 import time as time_
+import bisect
 
 
 class UTCOffset(object):
@@ -76,6 +77,133 @@ class UTCOffset(object):
         return cls._compute_variable(time_.time())
 
 
+class UTCOffsetTable(UTCOffset):
+    """
+    UTCOffset variant for computing the offsets of many timestamps around a
+    time range: the DST transitions in the range are looked for only once, and
+    the offsets are then read from the table of transitions.
+    """
+    # The DST transitions are looked for by sampling the offsets at this step,
+    # so two transitions must never be closer than this
+    STEP = 86400
+
+    def __init__(self, mint, maxt):
+        """
+        The table is initialized for the timestamps between mint and maxt, and
+        it is extended automatically when computing sequences outside of that
+        range.
+        """
+        UTCOffset.__init__(self)
+
+        if time_.daylight != 0:
+            self.tmin = int(mint)
+            self.tmax = self.tmin
+            # self.offsets[i] is the offset from self.transitions[i - 1]
+            # (included) to self.transitions[i] (excluded)
+            self.transitions = []
+            self.offsets = [self._compute_variable(self.tmin)]
+            self._extend(mint, maxt)
+            self.compute = self._compute_table
+
+    def _compute_table(self, timestamp):
+        if self.tmin <= timestamp <= self.tmax:
+            return self.offsets[bisect.bisect_right(self.transitions,
+                                                                    timestamp)]
+        else:
+            return self._compute_variable(timestamp)
+
+    def _extend(self, mint, maxt):
+        mint = int(mint)
+        maxt = int(maxt)
+
+        if mint < self.tmin:
+            offset, transitions = self._scan(mint, self.tmin)
+            self.transitions[:0] = [tstamp for tstamp, o in transitions]
+            # The last scanned offset is the one at the old self.tmin
+            self.offsets[:1] = [offset] + [o for tstamp, o in transitions]
+            self.tmin = mint
+
+        if maxt > self.tmax:
+            offset, transitions = self._scan(self.tmax, maxt)
+            self.transitions.extend(tstamp for tstamp, o in transitions)
+            self.offsets.extend(o for tstamp, o in transitions)
+            self.tmax = maxt
+
+    def _scan(self, mint, maxt):
+        # Return the offset at mint and the list of the (timestamp, offset)
+        # transitions in (mint, maxt], where timestamp is the first second
+        # with the new offset
+        offset = self._compute_variable(mint)
+        current = offset
+        transitions = []
+        tstamp = mint
+
+        while tstamp < maxt:
+            next_ = min((tstamp + self.STEP, maxt))
+            next_offset = self._compute_variable(next_)
+
+            if next_offset != current:
+                low = tstamp
+                high = next_
+
+                while high - low > 1:
+                    middle = (low + high) // 2
+
+                    if self._compute_variable(middle) == current:
+                        low = middle
+                    else:
+                        high = middle
+
+                transitions.append((high, next_offset))
+                current = next_offset
+
+            tstamp = next_
+
+        return (offset, transitions)
+
+    def compute_sequence(self, first, interval, maxt):
+        """
+        Return the list of the local times (timestamp + offset) of the
+        timestamps first, first + interval, first + 2 * interval... stopping
+        before the first one whose local time is greater than maxt.
+
+        The result is the same as computing the offset of every timestamp with
+        'compute', but the local times are generated in batches between two
+        consecutive DST transitions.
+        """
+        if time_.daylight == 0:
+            ends = [None]
+            offsets = [time_.timezone]
+        else:
+            # The timestamps after maxt - min(offsets) have a local time greater
+            # than maxt whatever their offset
+            self._extend(first, maxt - min((time_.timezone, time_.altzone)))
+            i = bisect.bisect_right(self.transitions, first)
+            ends = self.transitions[i:] + [None]
+            offsets = self.offsets[i:]
+
+        times = []
+        start = first
+
+        for end, offset in zip(ends, offsets):
+            # The timestamps with a local time not greater than maxt
+            count = int((maxt - offset - start) // interval) + 1
+
+            if end is not None:
+                # The timestamps before the next transition
+                count = min((count, int((end - start - 1) // interval) + 1))
+
+            if count > 0:
+                lstart = start + offset
+                times.extend(lstart + k * interval for k in xrange(count))
+                start += count * interval
+
+            if end is None or start < end:
+                break
+
+        return times
+
+
 class TimeSpanFormatters(object):
     @staticmethod
     def format_compact(seconds):